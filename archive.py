@@ -0,0 +1,259 @@
+import glob
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from collections import namedtuple
+from typing import IO, Iterator, Sequence, Set, Tuple
+
+import numpy as np
+
+import config
+import foam_dict
+import results
+from log_monitor import SUMMARY_FILE
+from mixing import METRICS_FILE, analyze_case
+from openfoam_writer import iter_dir
+
+MANIFEST = "manifest.json"
+
+COMPRESSION = dict(
+    stored=zipfile.ZIP_STORED,
+    deflated=zipfile.ZIP_DEFLATED,
+    bzip2=zipfile.ZIP_BZIP2,
+    lzma=zipfile.ZIP_LZMA,
+)
+
+RetentionPolicy = namedtuple(
+    typename="RetentionPolicy",
+    field_names=("times", "processors", "compression"),
+)
+
+ArchiveEntry = namedtuple(
+    typename="ArchiveEntry",
+    field_names=("name", "size", "compressed_size"),
+)
+
+CompactionReport = namedtuple(
+    typename="CompactionReport",
+    field_names=(
+        "archive",
+        "removed",
+        "archived",
+        "bytes_before",
+        "bytes_after",
+    ),
+)
+
+
+def default_policy() -> RetentionPolicy:
+    return RetentionPolicy(
+        times=config.RETAIN_TIMES,
+        processors=config.RETAIN_PROCESSORS,
+        compression=config.ARCHIVE_COMPRESSION,
+    )
+
+
+def archive_path(case_path: str) -> str:
+    return os.path.join(case_path, config.ARCHIVE_NAME)
+
+
+def extracted_files() -> Tuple[str, ...]:
+    return (
+        METRICS_FILE,
+        SUMMARY_FILE,
+        results.SAMPLES_FILE,
+        config.ARCHIVE_NAME,
+    )
+
+
+def directory_size(path: str) -> int:
+    return sum(
+        os.lstat(os.path.join(root, name)).st_size
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+
+def remove_path(path: str):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    elif os.path.lexists(path):
+        os.remove(path)
+
+
+def retained_times(times: Sequence[float], keep: int) -> Set[float]:
+    if len(times) <= keep:
+        return set(times)
+    indices = np.linspace(len(times) - 1, 0, keep).round().astype(int)
+    return {times[i] for i in indices}
+
+
+def processor_directories(case_path: str) -> Tuple[str, ...]:
+    return tuple(sorted(glob.glob(os.path.join(case_path, "processor*"))))
+
+
+def is_reconstructed(case_path: str) -> bool:
+    times = results.time_directories(case_path)
+    latest = times[-1][0] if times else None
+    for path in processor_directories(case_path):
+        processor_times = results.time_directories(path)
+        if processor_times and (
+            latest is None or processor_times[-1][0] > latest
+        ):
+            return False
+    return True
+
+
+def decimate(case_path: str, policy: RetentionPolicy) -> Tuple[str, ...]:
+    times = results.time_directories(case_path)
+    keep = retained_times(tuple(t for t, _ in times), policy.times)
+    removed = [path for time, path in times if time not in keep]
+    if not policy.processors and is_reconstructed(case_path):
+        removed.extend(processor_directories(case_path))
+    for path in removed:
+        remove_path(path)
+    return tuple(os.path.relpath(path, case_path) for path in removed)
+
+
+def archive_members(case_path: str) -> Iterator[Tuple[str, str]]:
+    extracted = extracted_files()
+    for name in sorted(os.listdir(case_path)):
+        if name in extracted:
+            continue
+        path = os.path.join(case_path, name)
+        if not os.path.isdir(path):
+            yield path, name
+            continue
+        for filename in sorted(iter_dir(path)):
+            relative = os.path.relpath(filename, case_path)
+            yield filename, relative.replace(os.sep, "/")
+
+
+def pack(
+    case_path: str, policy: RetentionPolicy, manifest: dict
+) -> Tuple[str, ...]:
+    filename = archive_path(case_path)
+    fd, staging = tempfile.mkstemp(
+        suffix=".zip.tmp", dir=os.path.dirname(os.path.abspath(case_path))
+    )
+    names = []
+    try:
+        with os.fdopen(fd, "wb") as f, zipfile.ZipFile(
+            f, "w", COMPRESSION[policy.compression]
+        ) as archive:
+            for path, name in archive_members(case_path):
+                archive.write(path, name)
+                names.append(name)
+            archive.writestr(MANIFEST, json.dumps(manifest, indent=2))
+        os.replace(staging, filename)
+    except BaseException:
+        remove_path(staging)
+        raise
+    return tuple(names)
+
+
+def remove_archived(case_path: str):
+    extracted = extracted_files()
+    for name in os.listdir(case_path):
+        if name not in extracted:
+            remove_path(os.path.join(case_path, name))
+
+
+def compact_case(
+    case_path: str, policy: RetentionPolicy = None
+) -> CompactionReport:
+    policy = policy or default_policy()
+    filename = archive_path(case_path)
+    if os.path.exists(filename):
+        remove_archived(case_path)
+        with CaseArchive(filename) as archive:
+            manifest = archive.manifest()
+            archived = archive.names()
+        return CompactionReport(
+            archive=filename,
+            removed=tuple(manifest["removed"]),
+            archived=len(archived),
+            bytes_before=manifest["bytes_before"],
+            bytes_after=directory_size(case_path),
+        )
+    bytes_before = directory_size(case_path)
+    if not os.path.exists(os.path.join(case_path, METRICS_FILE)):
+        analyze_case(case_path)
+    results.write_samples(case_path)
+    removed = decimate(case_path, policy)
+    manifest = dict(
+        policy=policy._asdict(),
+        removed=removed,
+        bytes_before=bytes_before,
+    )
+    archived = pack(case_path, policy, manifest)
+    remove_archived(case_path)
+    return CompactionReport(
+        archive=filename,
+        removed=removed,
+        archived=len(archived),
+        bytes_before=bytes_before,
+        bytes_after=directory_size(case_path),
+    )
+
+
+class CaseArchive:
+    path: str
+
+    def __init__(self, path: str):
+        if os.path.isdir(path):
+            path = archive_path(path)
+        self.path = path
+        self.zip_file = zipfile.ZipFile(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self.zip_file.close()
+
+    def index(self) -> Tuple[ArchiveEntry, ...]:
+        return tuple(
+            ArchiveEntry(info.filename, info.file_size, info.compress_size)
+            for info in self.zip_file.infolist()
+            if info.filename != MANIFEST
+        )
+
+    def names(self) -> Tuple[str, ...]:
+        return tuple(entry.name for entry in self.index())
+
+    def manifest(self) -> dict:
+        return json.loads(self.zip_file.read(MANIFEST))
+
+    def times(self) -> Tuple[str, ...]:
+        def time_gen() -> Iterator[Tuple[float, str]]:
+            for name in {n.split("/")[0] for n in self.names() if "/" in n}:
+                try:
+                    yield float(name), name
+                except ValueError:
+                    continue
+
+        return tuple(name for _, name in sorted(time_gen()))
+
+    def open(self, name: str) -> IO[bytes]:
+        return self.zip_file.open(name)
+
+    def read(self, name: str) -> bytes:
+        return self.zip_file.read(name)
+
+    def load(self, name: str) -> foam_dict.FoamFile:
+        return foam_dict.parse_buffer(self.read(name))
+
+    def read_field(self, name: str, time: str) -> results.FieldData:
+        filename = f"{time}/{name}"
+        return results.field_data(self.load(filename), filename, float(time))
+
+
+def read_archived(case_path: str, name: str) -> bytes:
+    with CaseArchive(case_path) as archive:
+        return archive.read(name)
@@ -5,5 +5,60 @@ PATH_NAME = os.path.dirname(__file__)
 TEMPLATE_PATH = os.path.join(PATH_NAME, "templates")
 TEMP_DIR_PATH = os.path.join(PATH_NAME, "tmp")
 MESH_PATH = os.path.join(PATH_NAME, "meshes")
-SALOME_SCRIPT_PATH = os.path.join(TEMP_DIR_PATH, "script.py")
 CASES_PATH = os.path.join(PATH_NAME, "cases")
+SALOME_COMMAND = ("run_salome.bat", "-t")
+SALOME_TIMEOUT = 3600
+SCRATCH_PATH = None
+KEEP_SCRATCH = "on_failure"
+MESH_SCALE = 0.001
+POLYMESH_EXPORT = True
+FOAM_TIMEOUT = None
+KILL_GRACE = 10.0
+MESH_STORE_QUOTA = 50 * 1024**3
+MESH_PIN_SECONDS = 2 * 24 * 3600
+LEDGER_PATH = os.path.join(PATH_NAME, "ledger.sqlite")
+LEDGER_STALE_SECONDS = 600
+STUDY_PATH = os.path.join(PATH_NAME, "study.sqlite")
+STUDY_REPORT_INTERVAL = 0.001
+FIDELITY_BUDGETS = dict(estimate=None, coarse=64, fine=256)
+CASE_LINK = "copy"
+SCHEDULER_CORES = None
+SCHEDULER_MEMORY = None
+MESH_CORES = 1
+MESH_MEMORY = 4 * 1024**3
+SOLVE_CORES = 8
+CELLS_PER_CORE = 50000
+PYTHON_FIELDS = False
+SOLVE_MEMORY_PER_CORE = 1024**3
+OUTLET_PATCH = "outlet"
+ANALYSIS_WORKERS = 4
+MONITOR_INTERVAL = 5.0
+MONITOR_CAPACITY = 1000
+MONITOR_MAX_COURANT = 50.0
+MONITOR_MIN_DELTA_T = 1e-12
+MONITOR_DELTA_T_COLLAPSE = 1e-4
+MONITOR_MAX_RESIDUAL = 1e3
+MONITOR_STEADY_RESIDUAL = None
+MONITOR_STEADY_STEPS = 20
+STEADY_STOP = False
+STEADY_WINDOW = 0.01
+STEADY_TOLERANCE = 1e-3
+STEADY_MIN_TIME = 0.01
+STEADY_RESIDENCE_TIMES = 1.0
+REDUCED_OUTPUT = False
+PIPELINE_REDUCED_OUTPUT = True
+FIELD_WRITES = 1
+SAMPLE_INTERVAL = 0.0005
+SAMPLE_FORMAT = "raw"
+ARCHIVE_NAME = "case.zip"
+ARCHIVE_COMPRESSION = "deflated"
+RETAIN_TIMES = 2
+RETAIN_PROCESSORS = False
+MESH_QUALITY_CHECK = True
+MESH_MIN_VOLUME_RATIO = 1e-3
+MESH_MAX_ASPECT_RATIO = 1000.0
+MESH_MAX_SKEWNESS = 4.0
+MESH_MAX_NON_ORTHOGONALITY = 70.0
+MESH_QUALITY_BINS = 10
+MESH_WORST_CELLS = 10
+MESH_REMESH_ATTEMPTS = 1
@@ -0,0 +1,104 @@
+import json
+import os
+from collections import namedtuple
+from math import log, sqrt
+from typing import Tuple
+
+import config
+import openfoam_writer
+from design import Design, MeshSettings, channel_volume, design_lattice
+from geometry import lattice_point_set
+
+Decomposition = namedtuple(
+    typename="Decomposition",
+    field_names=(
+        "subdomains",
+        "method",
+        "n",
+        "cells",
+        "cells_per_core",
+        "extent",
+    ),
+)
+
+ASPECT_TOLERANCE = log(2)
+
+
+def lattice_extent(design: Design) -> Tuple[float, float, float]:
+    points = lattice_point_set(design_lattice(design))
+    xs = tuple(p.x for p in points)
+    ys = tuple(p.y for p in points)
+    return (
+        round(float(max(xs) - min(xs)), 6),
+        round(float(max(ys) - min(ys)), 6),
+        design.channel_height,
+    )
+
+
+def estimate_cells(design: Design, settings: MeshSettings = None) -> int:
+    settings = settings or MeshSettings()
+    size = (settings.max_size + settings.min_size) / 2
+    tet_volume = size**3 / (6 * sqrt(2))
+    return max(1, round(channel_volume(design) / tet_volume))
+
+
+def aspect_error(n: Tuple[int, int, int], extent: Tuple[float, ...]) -> float:
+    lx, ly = extent[:2]
+    target = log(lx / ly) if lx > 0 and ly > 0 else 0
+    return abs(log(n[0] / n[1]) - target)
+
+
+def split_counts(
+    subdomains: int, extent: Tuple[float, ...]
+) -> Tuple[int, int, int]:
+    pairs = (
+        (nx, subdomains // nx, 1)
+        for nx in range(1, subdomains + 1)
+        if subdomains % nx == 0
+    )
+    return min(pairs, key=lambda n: aspect_error(n, extent))
+
+
+def choose_decomposition(
+    design: Design,
+    cells: int = None,
+    max_cores: int = None,
+    cells_per_core: int = None,
+    settings: MeshSettings = None,
+) -> Decomposition:
+    cells = cells or estimate_cells(design, settings)
+    cells_per_core = cells_per_core or config.CELLS_PER_CORE
+    max_cores = max_cores or config.SOLVE_CORES
+    subdomains = max(1, min(max_cores, cells // cells_per_core))
+    extent = lattice_extent(design)
+    n = split_counts(subdomains, extent)
+    method = "simple"
+    if subdomains > 1 and aspect_error(n, extent) > ASPECT_TOLERANCE:
+        method = "scotch"
+    return Decomposition(
+        subdomains=subdomains,
+        method=method,
+        n=n,
+        cells=cells,
+        cells_per_core=cells_per_core,
+        extent=extent,
+    )
+
+
+def apply_decomposition(case_path: str, decomposition: Decomposition):
+    openfoam_writer.write_decomposition(
+        case_path,
+        decomposition.subdomains,
+        decomposition.n,
+        decomposition.method,
+    )
+    with open(os.path.join(case_path, "decomposition.json"), "w") as f:
+        json.dump(decomposition._asdict(), f, indent=2)
+
+
+def read_decomposition(case_path: str) -> Decomposition:
+    with open(os.path.join(case_path, "decomposition.json")) as f:
+        fields = json.load(f)
+    fields["n"] = tuple(fields["n"])
+    fields["extent"] = tuple(fields["extent"])
+    return Decomposition(**fields)
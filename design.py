@@ -0,0 +1,229 @@
+import os
+from collections import namedtuple
+from typing import Mapping, Sequence, Tuple
+
+import config
+import foam_dict
+from design_interface import DesignInterface
+from geometry import (
+    ChannelLayer,
+    Lattice,
+    NamedLine,
+    create_lattice,
+    lattice_channel_gen,
+    line_degrees,
+    line_length,
+)
+from openfoam_writer import (
+    BoundingBox,
+    Case,
+    ChannelVelocity,
+    ExperimentVariable,
+    SamplePlane,
+    VariableFields,
+    field_write_controls,
+    outlet_functions,
+    sample_functions,
+)
+
+MILLIMETERS = 0.001
+
+
+Design = namedtuple(
+    typename="Design",
+    field_names=(
+        "lattice_structure",
+        "channel_spacing",
+        "channel_width",
+        "channel_height",
+        "aqueous_flow_rate",
+        "organic_flow_rate",
+    ),
+)
+
+
+MeshSettings = namedtuple(
+    typename="MeshSettings",
+    field_names=("fineness", "max_size", "min_size", "optimize"),
+    defaults=(3, 0.2, 0.1, 1),
+)
+
+
+Fluid = namedtuple(typename="Fluid", field_names=("alpha", "nu", "rho"))
+
+AQUEOUS = Fluid(alpha=1, nu=8.926e-07, rho=1000)
+ORGANIC = Fluid(alpha=0, nu=1.796e-06, rho=1095)
+
+
+def design_name(design: Design) -> str:
+    structure = "-".join(str(layer) for layer in design.lattice_structure)
+    return (
+        f"{structure}"
+        f"_{design.channel_spacing}"
+        f"_{design.channel_width}"
+        f"_{design.channel_height}"
+        f"_{design.aqueous_flow_rate}"
+        f"_{design.organic_flow_rate}"
+    )
+
+
+def design_lattice(design: Design) -> Lattice:
+    return create_lattice(
+        tuple(design.lattice_structure),
+        design.channel_spacing,
+        design.channel_width,
+    )
+
+
+def channel_volume(design: Design, lattice: Lattice = None) -> float:
+    lattice = lattice or design_lattice(design)
+    length = sum(
+        line_length(channel.center_line)
+        for channel in lattice_channel_gen(lattice)
+    )
+    return length * design.channel_width * design.channel_height
+
+
+def residence_time(design: Design, lattice: Lattice = None) -> float:
+    flow = (design.aqueous_flow_rate + design.organic_flow_rate) * 1000 / 60
+    return channel_volume(design, lattice) / flow
+
+
+def empty_fields() -> VariableFields:
+    return VariableFields(
+        U=None, alpha=None, p_rgh=None, field_box=None, nu=None, rho=None
+    )
+
+
+def inlet_box(design: Design, lattice: Lattice, index: int) -> BoundingBox:
+    channel = lattice.channel_layers[0].channels[index]
+    points = tuple(p for wall in channel.walls for p in wall)
+    xs = tuple(p.x for p in points)
+    ys = tuple(p.y for p in points)
+    return BoundingBox(
+        x1=round(min(xs) * MILLIMETERS, 7),
+        y1=round((min(ys) - design.channel_width) * MILLIMETERS, 7),
+        z1=0,
+        x2=round(max(xs) * MILLIMETERS, 7),
+        y2=round(max(ys) * MILLIMETERS, 7),
+        z2=round(design.channel_height * MILLIMETERS, 7),
+    )
+
+
+def inlet_variable(
+    design: Design, lattice: Lattice, index: int, face: NamedLine
+) -> ExperimentVariable:
+    channel = lattice.channel_layers[0].channels[index]
+    organic = face.name == "organic_inlet"
+    fluid = ORGANIC if organic else AQUEOUS
+    flow_rate = (
+        design.organic_flow_rate if organic else design.aqueous_flow_rate
+    )
+    return ExperimentVariable(
+        type="$inlet",
+        name=face.name,
+        fields=VariableFields(
+            U=ChannelVelocity(
+                flow_rate=flow_rate,
+                height=design.channel_height,
+                width=design.channel_width,
+                channel_angle=line_degrees(channel.center_line),
+            ),
+            alpha=fluid.alpha,
+            p_rgh=None,
+            field_box=inlet_box(design, lattice, index) if organic else None,
+            nu=fluid.nu,
+            rho=fluid.rho,
+        ),
+    )
+
+
+def design_variables(
+    design: Design, lattice: Lattice = None
+) -> Tuple[ExperimentVariable, ...]:
+    lattice = lattice or design_lattice(design)
+    faces = DesignInterface.named_faces(lattice)
+    inlets = tuple(
+        inlet_variable(design, lattice, i, face)
+        for i, face in enumerate(faces[:-1])
+    )
+    walls = ExperimentVariable(
+        type="$walls", name="walls", fields=empty_fields()
+    )
+    outlet = ExperimentVariable(
+        type="$outlet", name=faces[-1].name, fields=empty_fields()
+    )
+    return (walls,) + inlets + (outlet,)
+
+
+def sample_planes(
+    design: Design, lattice: Lattice = None
+) -> Tuple[SamplePlane, ...]:
+    lattice = lattice or design_lattice(design)
+    z = round(design.channel_height / 2 * MILLIMETERS, 7)
+
+    def plane(index: int, layer: ChannelLayer) -> SamplePlane:
+        y = sum(nodes[0].y for nodes in layer.node_layers) / 2
+        return SamplePlane(
+            name=f"layer{index}",
+            point=(0, round(y * MILLIMETERS, 7), z),
+            normal=(0, 1, 0),
+        )
+
+    return tuple(plane(i, layer) for i, layer in enumerate(lattice))
+
+
+def template_end_time(solver: str = "interFoam") -> float:
+    return foam_dict.load(
+        os.path.join(config.TEMPLATE_PATH, solver, "system", "controlDict")
+    ).entries["endTime"]
+
+
+def case_controls(
+    controls: Mapping[str, object] = None,
+    steady: bool = None,
+    reduced: bool = None,
+    planes: Sequence[SamplePlane] = (),
+    solver: str = "interFoam",
+) -> Mapping[str, object]:
+    if steady is None:
+        steady = config.STEADY_STOP
+    if reduced is None:
+        reduced = config.REDUCED_OUTPUT
+    merged = {}
+    if steady or reduced:
+        merged.update(outlet_functions(config.OUTLET_PATCH))
+    if reduced:
+        end_time = (controls or {}).get("endTime") or template_end_time(solver)
+        merged.update(field_write_controls(end_time, config.FIELD_WRITES))
+        merged.update(
+            sample_functions(
+                planes,
+                config.OUTLET_PATCH,
+                interval=config.SAMPLE_INTERVAL,
+                surface_format=config.SAMPLE_FORMAT,
+            )
+        )
+    if not merged:
+        return controls
+    return dict(merged, **(controls or {}))
+
+
+def design_case(
+    design: Design,
+    solver: str = "interFoam",
+    controls: Mapping[str, object] = None,
+    prefix: str = "",
+    reduced: bool = None,
+) -> Case:
+    return Case(
+        case_name=f"{prefix}{design_name(design)}",
+        solver=solver,
+        variables=design_variables(design),
+        controls=case_controls(
+            controls,
+            reduced=reduced,
+            planes=sample_planes(design),
+            solver=solver,
+        ),
+    )
@@ -0,0 +1,334 @@
+import asyncio
+import json
+from collections import namedtuple
+from math import floor
+from time import perf_counter
+from typing import (
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Sequence,
+    Tuple,
+)
+
+import config
+import openfoam_runner
+import openfoam_writer
+from design import (
+    Design,
+    MeshSettings,
+    design_case,
+    design_lattice,
+    design_name,
+    residence_time,
+)
+from geometry import lattice_channel_gen
+from mesh_store import MeshStore
+from pipeline import design_geometry
+
+Fidelity = namedtuple(
+    typename="Fidelity",
+    field_names=(
+        "name",
+        "evaluate",
+        "core_hours",
+        "cores",
+        "promote",
+        "concurrency",
+        "direction",
+    ),
+    defaults=(1, 0.5, 4, "maximize"),
+)
+
+FidelityResult = namedtuple(
+    typename="FidelityResult",
+    field_names=(
+        "design_id",
+        "fidelity",
+        "score",
+        "core_hours",
+        "seconds",
+        "error",
+    ),
+)
+
+LadderReport = namedtuple(
+    typename="LadderReport",
+    field_names=("ranked", "results", "core_hours", "correlations"),
+)
+
+COARSE_MESH = MeshSettings(fineness=1, max_size=0.4, min_size=0.2)
+COARSE_RESIDENCE_TIMES = 2
+
+
+def network_estimate(design: Design) -> float:
+    lattice = design_lattice(design)
+    junctions = {
+        p
+        for channel in lattice_channel_gen(lattice)
+        for p in channel.center_line
+    }
+    return len(junctions) * residence_time(design, lattice)
+
+
+async def estimate(design: Design) -> float:
+    return network_estimate(design)
+
+
+def simulation_case(
+    design: Design,
+    name: str,
+    controls: Mapping[str, object] = None,
+    cores: int = None,
+    cases_path: str = None,
+) -> str:
+    case = design_case(design, controls=controls, prefix=f"{name}_")
+    case_path = openfoam_writer.create_case(case, True, cases_path)
+    if cores:
+        openfoam_writer.write_decomposition(case_path, cores)
+    return case_path
+
+
+def simulation_controls(
+    design: Design,
+    controls: Mapping[str, object] = None,
+    residence_times: float = None,
+) -> Dict[str, object]:
+    controls = dict(controls or {})
+    if residence_times:
+        controls["endTime"] = residence_times * residence_time(design)
+    return controls
+
+
+def simulation(
+    name: str,
+    settings: MeshSettings,
+    objective: Callable[[str], float],
+    controls: Mapping[str, object] = None,
+    cores: int = None,
+    residence_times: float = None,
+) -> Callable[[Design], Awaitable[float]]:
+    async def evaluate(design: Design) -> float:
+        mesh = await MeshStore().get_or_create_async(
+            design_geometry(design), settings
+        )
+        case_controls = simulation_controls(design, controls, residence_times)
+        case_path = await asyncio.to_thread(
+            simulation_case, design, name, case_controls, cores
+        )
+        await openfoam_runner.solve_case(case_path, mesh, cores)
+        return objective(case_path)
+
+    return evaluate
+
+
+def default_ladder(
+    objective: Callable[[str], float],
+    cores: Mapping[str, int] = None,
+    direction: str = "minimize",
+) -> Tuple[Fidelity, ...]:
+    cores = dict(dict(coarse=2, fine=8), **(cores or {}))
+    return (
+        Fidelity(
+            name="estimate",
+            evaluate=estimate,
+            core_hours=0,
+            promote=0.25,
+            concurrency=32,
+        ),
+        Fidelity(
+            name="coarse",
+            evaluate=simulation(
+                "coarse",
+                COARSE_MESH,
+                objective,
+                cores=cores["coarse"],
+                residence_times=COARSE_RESIDENCE_TIMES,
+            ),
+            core_hours=0.5,
+            cores=cores["coarse"],
+            direction=direction,
+        ),
+        Fidelity(
+            name="fine",
+            evaluate=simulation(
+                "fine", MeshSettings(), objective, cores=cores["fine"]
+            ),
+            core_hours=16,
+            cores=cores["fine"],
+            direction=direction,
+        ),
+    )
+
+
+def affordable(fidelity: Fidelity, budget: float = None) -> float:
+    if budget is None or fidelity.core_hours <= 0:
+        return float("inf")
+    return floor(budget / fidelity.core_hours)
+
+
+def promoted(n: int, fraction: float) -> int:
+    return max(1, round(n * fraction)) if n else 0
+
+
+async def evaluate_one(
+    fidelity: Fidelity, design: Design, limit: asyncio.Semaphore
+) -> FidelityResult:
+    async with limit:
+        start = perf_counter()
+        try:
+            score, error = float(await fidelity.evaluate(design)), None
+        except Exception as e:
+            score, error = None, repr(e)
+        seconds = perf_counter() - start
+    return FidelityResult(
+        design_id=design_name(design),
+        fidelity=fidelity.name,
+        score=score,
+        core_hours=round(seconds * fidelity.cores / 3600, 6),
+        seconds=round(seconds, 6),
+        error=error,
+    )
+
+
+async def evaluate_level(
+    fidelity: Fidelity, designs: Sequence[Design]
+) -> Tuple[FidelityResult, ...]:
+    limit = asyncio.Semaphore(fidelity.concurrency)
+    return tuple(
+        await asyncio.gather(
+            *(evaluate_one(fidelity, d, limit) for d in designs)
+        )
+    )
+
+
+def rank_designs(
+    designs: Sequence[Design],
+    results: Iterable[FidelityResult],
+    direction: str = "maximize",
+) -> List[Design]:
+    scores = {r.design_id: r.score for r in results if r.score is not None}
+    scored = [d for d in designs if design_name(d) in scores]
+    return sorted(
+        scored,
+        key=lambda d: scores[design_name(d)],
+        reverse=direction == "maximize",
+    )
+
+
+def ranks(values: Sequence[float]) -> List[float]:
+    order = sorted(range(len(values)), key=lambda i: values[i])
+    ret = [0.0] * len(values)
+    i = 0
+    while i < len(order):
+        j = i
+        while j + 1 < len(order) and values[order[j + 1]] == values[order[i]]:
+            j += 1
+        for k in order[i : j + 1]:
+            ret[k] = (i + j) / 2 + 1
+        i = j + 1
+    return ret
+
+
+def spearman(a: Sequence[float], b: Sequence[float]) -> float:
+    if len(a) != len(b):
+        raise ValueError("Sequences must have the same length")
+    if len(a) < 2:
+        return float("nan")
+    ra, rb = ranks(a), ranks(b)
+    mean = (len(a) + 1) / 2
+    cov = sum((x - mean) * (y - mean) for x, y in zip(ra, rb))
+    var_a = sum((x - mean) ** 2 for x in ra)
+    var_b = sum((y - mean) ** 2 for y in rb)
+    if var_a == 0 or var_b == 0:
+        return float("nan")
+    return cov / (var_a * var_b) ** 0.5
+
+
+def fidelity_scores(
+    results: Iterable[FidelityResult], fidelity: str
+) -> Dict[str, float]:
+    return {
+        r.design_id: r.score
+        for r in results
+        if r.fidelity == fidelity and r.score is not None
+    }
+
+
+def rank_correlation(
+    results: Iterable[FidelityResult], low: str, high: str
+) -> float:
+    results = tuple(results)
+    low_scores = fidelity_scores(results, low)
+    high_scores = fidelity_scores(results, high)
+    common = sorted(set(low_scores) & set(high_scores))
+    return spearman(
+        tuple(low_scores[k] for k in common),
+        tuple(high_scores[k] for k in common),
+    )
+
+
+def direction_sign(fidelity: Fidelity) -> int:
+    return 1 if fidelity.direction == "maximize" else -1
+
+
+def level_correlations(
+    results: Sequence[FidelityResult], fidelities: Sequence[Fidelity]
+) -> Dict[str, float]:
+    return {
+        f"{low.name}:{high.name}": direction_sign(low)
+        * direction_sign(high)
+        * rank_correlation(results, low.name, high.name)
+        for i, low in enumerate(fidelities)
+        for high in fidelities[i + 1 :]
+    }
+
+
+async def run_ladder(
+    designs: Iterable[Design],
+    fidelities: Sequence[Fidelity],
+    budgets: Mapping[str, float] = None,
+) -> LadderReport:
+    budgets = dict(config.FIDELITY_BUDGETS, **(budgets or {}))
+    candidates = list(designs)
+    results = []
+    for level, fidelity in enumerate(fidelities):
+        limit = affordable(fidelity, budgets.get(fidelity.name))
+        candidates = candidates[: min(len(candidates), limit)]
+        level_results = await evaluate_level(fidelity, candidates)
+        results.extend(level_results)
+        candidates = rank_designs(
+            candidates, level_results, fidelity.direction
+        )
+        if level < len(fidelities) - 1:
+            candidates = candidates[
+                : promoted(len(candidates), fidelity.promote)
+            ]
+    return LadderReport(
+        ranked=tuple(candidates),
+        results=tuple(results),
+        core_hours={
+            f.name: round(
+                sum(r.core_hours for r in results if r.fidelity == f.name), 6
+            )
+            for f in fidelities
+        },
+        correlations=level_correlations(results, fidelities),
+    )
+
+
+def write_results(report: LadderReport, filename: str):
+    with open(filename, "w") as f:
+        json.dump(
+            dict(
+                ranked=[design_name(d) for d in report.ranked],
+                results=[r._asdict() for r in report.results],
+                core_hours=report.core_hours,
+                correlations=report.correlations,
+            ),
+            f,
+            indent=2,
+        )
@@ -0,0 +1,106 @@
+import os
+from collections import namedtuple
+from typing import Iterable, Sequence, Tuple
+
+import numpy as np
+
+import foam_dict
+from openfoam_writer import BoundingBox
+from polymesh import cell_centres
+
+SetFields = namedtuple(
+    typename="SetFields", field_names=("default", "value", "boxes")
+)
+
+ARCH = foam_dict.Quoted("LSB;label=32;scalar=64")
+
+
+def field_value(values: Sequence[object]) -> float:
+    return next(
+        float(value)
+        for kind, name, value in zip(values[::3], values[1::3], values[2::3])
+        if kind == "volScalarFieldValue" and name == "alpha.organic"
+    )
+
+
+def region_boxes(regions: Iterable[object]) -> Iterable[BoundingBox]:
+    for region in regions:
+        if not isinstance(region, dict) or "box" not in region:
+            continue
+        low, high = region["box"]
+        x1, y1, z1 = (float(v) for v in low)
+        x2, y2, z2 = (float(v) for v in high)
+        yield BoundingBox(x1=x1, y1=y1, z1=z1, x2=x2, y2=y2, z2=z2)
+
+
+def read_set_fields(case_path: str) -> SetFields:
+    entries = foam_dict.load(
+        os.path.join(case_path, "system", "setFieldsDict")
+    ).entries
+    regions = entries.get("regions", [])
+    return SetFields(
+        default=field_value(entries["defaultFieldValues"]),
+        value=next(
+            field_value(region["fieldValues"])
+            for region in regions
+            if isinstance(region, dict)
+        ),
+        boxes=tuple(region_boxes(regions)),
+    )
+
+
+def box_bounds(box: BoundingBox) -> Tuple[np.ndarray, np.ndarray]:
+    return (
+        np.array((box.x1, box.y1, box.z1)),
+        np.array((box.x2, box.y2, box.z2)),
+    )
+
+
+def box_mask(centres: np.ndarray, boxes: Iterable[BoundingBox]) -> np.ndarray:
+    mask = np.zeros(len(centres), dtype=bool)
+    for box in boxes:
+        low, high = box_bounds(box)
+        mask |= np.all((centres >= low) & (centres <= high), axis=1)
+    return mask
+
+
+def alpha_values(centres: np.ndarray, set_fields: SetFields) -> np.ndarray:
+    return np.where(
+        box_mask(centres, set_fields.boxes),
+        set_fields.value,
+        set_fields.default,
+    )
+
+
+def case_write_format(case_path: str) -> str:
+    entries = foam_dict.load(
+        os.path.join(case_path, "system", "controlDict")
+    ).entries
+    return entries.get("writeFormat", "ascii")
+
+
+def write_internal_field(
+    source: str, target: str, values: np.ndarray, binary: bool = False
+):
+    foam_file = foam_dict.load(source)
+    header = dict(foam_file.header, format="binary" if binary else "ascii")
+    if binary:
+        header["arch"] = ARCH
+    foam_file.entries["internalField"] = foam_dict.Field(
+        "nonuniform", np.asarray(values, dtype=np.float64), "List<scalar>"
+    )
+    foam_dict.dump(foam_dict.FoamFile(header, foam_file.entries), target)
+
+
+def paint_alpha(case_path: str, binary: bool = None) -> np.ndarray:
+    if binary is None:
+        binary = case_write_format(case_path) == "binary"
+    values = alpha_values(cell_centres(case_path), read_set_fields(case_path))
+    initial = os.path.join(case_path, "0")
+    write_internal_field(
+        os.path.join(initial, "alpha.organic.orig"),
+        os.path.join(initial, "alpha.organic"),
+        values,
+        binary,
+    )
+    return values
@@ -0,0 +1,554 @@
+import io
+import mmap
+import os
+import re
+from collections import namedtuple
+from typing import BinaryIO, Dict, Iterator, List, Mapping, Tuple, Union
+
+import numpy as np
+
+CHUNK_SIZE = 1 << 16
+
+Buffer = Union[bytes, mmap.mmap]
+
+BANNER = (
+    "/*--------------------------------*- C++ -*------------------------------"
+    "----*\\\n"
+    "  =========                 |\n"
+    "  \\\\      /  F ield         | OpenFOAM: The Open Source CFD Toolbox\n"
+    "   \\\\    /   O peration     | Website:  https://openfoam.org\n"
+    "    \\\\  /    A nd           | Version:  9\n"
+    "     \\\\/     M anipulation  |\n"
+    "\\*----------------------------------------------------------------------"
+    "-----*/\n"
+)
+SEPARATOR = "// " + "* " * 37 + "//\n"
+FOOTER = "// " + "*" * 73 + " //\n"
+
+PUNCTUATION = b"{}()[];"
+WORD = re.compile(rb'[^\s{}()\[\];"]*')
+SPACE = re.compile(rb"\s+")
+NUMBER = re.compile(r"[-+]?(\d+\.?\d*([eE][-+]?\d+)?|\.\d+([eE][-+]?\d+)?)$")
+INTEGER = re.compile(r"[-+]?\d+$")
+
+FIELD_WIDTHS = dict(
+    scalar=1, vector=3, symmTensor=6, tensor=9, label=1, sphericalTensor=1
+)
+
+Token = namedtuple(typename="Token", field_names=("kind", "value"))
+
+Field = namedtuple(
+    typename="Field",
+    field_names=("kind", "value", "type"),
+    defaults=(None,),
+)
+
+FoamFile = namedtuple(typename="FoamFile", field_names=("header", "entries"))
+
+
+class FoamDictError(Exception):
+    pass
+
+
+class Quoted(str):
+    pass
+
+
+class Macro(str):
+    pass
+
+
+class Dimensions(tuple):
+    pass
+
+
+def header_dtypes(header: Mapping[str, str]) -> Tuple[np.dtype, np.dtype]:
+    arch = header.get("arch", "")
+    label = np.int64 if "label=64" in arch else np.int32
+    scalar = np.float32 if "scalar=32" in arch else np.float64
+    return np.dtype(label), np.dtype(scalar)
+
+
+class Reader:
+    stream: BinaryIO
+    binary: bool
+
+    def __init__(
+        self,
+        stream: BinaryIO = None,
+        chunk_size: int = CHUNK_SIZE,
+        buffer: Buffer = b"",
+    ):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.buffer = bytearray(buffer) if stream else buffer
+        self.pos = 0
+        self.binary = False
+        self.dtypes = header_dtypes({})
+        self.pushed = []
+
+    def more(self) -> bool:
+        chunk = self.stream.read(self.chunk_size) if self.stream else b""
+        if not chunk:
+            return False
+        del self.buffer[: self.pos]
+        self.buffer += chunk
+        self.pos = 0
+        return True
+
+    def fill(self, n: int = 1) -> bool:
+        while len(self.buffer) - self.pos < n:
+            if not self.more():
+                return False
+        return True
+
+    def peek(self) -> bytes:
+        return self.buffer[self.pos : self.pos + 1] if self.fill() else b""
+
+    def skip(self):
+        while self.fill(1):
+            match = SPACE.match(self.buffer, self.pos)
+            if match:
+                self.pos = match.end()
+                continue
+            if not self.fill(2) or self.buffer[self.pos] != ord("/"):
+                return
+            following = self.buffer[self.pos + 1 : self.pos + 2]
+            if following == b"/":
+                self.pos = self.find(b"\n") + 1
+            elif following == b"*":
+                self.pos = self.find(b"*/", self.pos + 2) + 2
+            else:
+                return
+
+    def find(self, delimiter: bytes, start: int = None) -> int:
+        offset = (self.pos if start is None else start) - self.pos
+        while True:
+            index = self.buffer.find(delimiter, self.pos + offset)
+            if index >= 0:
+                return index
+            offset = max(0, len(self.buffer) - self.pos - len(delimiter))
+            if not self.more():
+                return len(self.buffer)
+
+    def read_word(self) -> bytes:
+        while True:
+            match = WORD.match(self.buffer, self.pos)
+            if match.end() < len(self.buffer) or not self.more():
+                break
+        word = match.group()
+        self.pos = match.end()
+        if word and not INTEGER.match(word.decode()) and self.peek() == b"(":
+            word += self.read_balanced(keep=True)
+            word += self.read_word()
+        return word
+
+    def read_balanced(self, keep: bool = False) -> bytes:
+        self.pos += 1
+        depth = 1
+        start = self.pos
+        while True:
+            if start >= len(self.buffer):
+                consumed = start - self.pos
+                if not self.more():
+                    raise FoamDictError("Unbalanced parentheses")
+                start = consumed
+            end = min(len(self.buffer), start + self.chunk_size)
+            window = np.frombuffer(self.buffer, np.uint8, end - start, start)
+            steps = (window == ord("(")).astype(np.int64) - (
+                window == ord(")")
+            )
+            del window
+            levels = depth + np.cumsum(steps)
+            closed = np.flatnonzero(levels == 0)
+            if len(closed):
+                close = start + int(closed[0])
+                content = bytes(self.buffer[self.pos : close])
+                self.pos = close + 1
+                return b"(" + content + b")" if keep else content
+            depth = int(levels[-1])
+            start = end
+
+    def read_array(self, dtype: np.dtype, count: int) -> np.ndarray:
+        size = count * dtype.itemsize
+        if self.stream is None:
+            if len(self.buffer) - self.pos < size:
+                raise FoamDictError("Unexpected end of binary data")
+            values = np.frombuffer(self.buffer, dtype, count, self.pos)
+            self.pos += size
+            return values
+        values = np.empty(count, dtype)
+        target = memoryview(values).cast("B")
+        filled = min(size, len(self.buffer) - self.pos)
+        target[:filled] = self.buffer[self.pos : self.pos + filled]
+        self.pos += filled
+        while filled < size:
+            n = self.stream.readinto(target[filled:])
+            if not n:
+                raise FoamDictError("Unexpected end of binary data")
+            filled += n
+        return values
+
+    def read_string(self) -> bytes:
+        self.pos += 1
+        start = self.pos
+        while True:
+            end = self.find(b'"', start)
+            if end >= len(self.buffer):
+                raise FoamDictError("Unterminated string")
+            if self.buffer[end - 1] != ord("\\"):
+                break
+            start = end + 1
+        value = self.buffer[self.pos : end]
+        self.pos = end + 1
+        return value
+
+    def push(self, token: Token):
+        self.pushed.append(token)
+
+    def token(self) -> Union[Token, None]:
+        if self.pushed:
+            return self.pushed.pop()
+        self.skip()
+        char = self.peek()
+        if not char:
+            return None
+        if char in PUNCTUATION:
+            self.pos += 1
+            return Token("punct", char.decode())
+        if char == b'"':
+            return Token("string", self.read_string().decode())
+        return Token("word", self.read_word().decode())
+
+    def expect(self, value: str):
+        token = self.token()
+        if token is None or token.value != value:
+            raise FoamDictError(f"Expected {value!r}, found {token!r}")
+
+
+def word_value(word: str):
+    if INTEGER.match(word):
+        return int(word)
+    if NUMBER.match(word):
+        return float(word)
+    if word.startswith("$"):
+        return Macro(word)
+    return word
+
+
+def field_array(text: bytes, n: int, width: int, integer: bool) -> np.ndarray:
+    values = np.array(
+        text.replace(b"(", b" ").replace(b")", b" ").split(),
+        dtype=np.int64 if integer else np.float64,
+    )
+    return values.reshape(n, width) if width > 1 else values
+
+
+def parse_nonuniform(reader: Reader) -> Field:
+    field_type = reader.token().value
+    element = field_type[field_type.find("<") + 1 : -1]
+    width = FIELD_WIDTHS.get(element, 1)
+    integer = element == "label"
+    n = int(reader.token().value)
+    reader.skip()
+    if reader.peek() != b"(":
+        raise FoamDictError(f"Expected list of {n} values")
+    if reader.binary:
+        reader.pos += 1
+        label, scalar = reader.dtypes
+        values = reader.read_array(label if integer else scalar, n * width)
+        reader.expect(")")
+        values = values.reshape(n, width) if width > 1 else values
+    else:
+        values = field_array(reader.read_balanced(), n, width, integer)
+    return Field("nonuniform", values, field_type)
+
+
+def parse_value(reader: Reader, token: Token):
+    match token:
+        case Token("punct", "("):
+            return parse_list(reader)
+        case Token("punct", "["):
+            return Dimensions(parse_items(reader, "]"))
+        case Token("punct", "{"):
+            return parse_entries(reader, "}")
+        case Token("string", value):
+            return Quoted(value)
+        case Token("word", "uniform"):
+            return Field("uniform", parse_value(reader, reader.token()))
+        case Token("word", "nonuniform"):
+            return parse_nonuniform(reader)
+        case Token("word", value):
+            return word_value(value)
+    raise FoamDictError(f"Unexpected token {token!r}")
+
+
+def parse_items(reader: Reader, end: str) -> List[object]:
+    items = []
+    token = reader.token()
+    while token is not None and token != Token("punct", end):
+        items.append(parse_value(reader, token))
+        token = reader.token()
+    if token is None:
+        raise FoamDictError(f"Expected {end!r} before end of file")
+    return items
+
+
+def parse_list(reader: Reader) -> list:
+    return parse_items(reader, ")")
+
+
+def parse_entry_value(reader: Reader):
+    values = parse_items(reader, ";")
+    if len(values) == 1:
+        return values[0]
+    return tuple(values)
+
+
+def parse_entries(reader: Reader, end: str = None) -> Dict[str, object]:
+    entries = {}
+    while True:
+        token = reader.token()
+        if token is None:
+            if end is not None:
+                raise FoamDictError(f"Expected {end!r} before end of file")
+            return entries
+        if token == Token("punct", end):
+            return entries
+        if token.kind == "punct":
+            raise FoamDictError(f"Unexpected {token.value!r}")
+        key = token.value
+        if token.kind == "string":
+            key = Quoted(key)
+        elif key.startswith("$"):
+            key = Macro(key)
+        if key.startswith("#"):
+            entries[key] = parse_value(reader, reader.token())
+            continue
+        following = reader.token()
+        if following == Token("punct", ";"):
+            entries[key] = None
+        elif following == Token("punct", "{"):
+            entries[key] = parse_entries(reader, "}")
+        else:
+            reader.push(following)
+            entries[key] = parse_entry_value(reader)
+
+
+def parse(stream: BinaryIO, chunk_size: int = CHUNK_SIZE) -> FoamFile:
+    return parse_reader(Reader(stream, chunk_size))
+
+
+def parse_buffer(buffer: Buffer) -> FoamFile:
+    return parse_reader(Reader(buffer=buffer))
+
+
+def parse_reader(reader: Reader) -> FoamFile:
+    header = {}
+    token = reader.token()
+    if token == Token("word", "FoamFile"):
+        reader.expect("{")
+        header = parse_entries(reader, "}")
+        reader.binary = header.get("format") == "binary"
+        reader.dtypes = header_dtypes(header)
+    elif token is not None:
+        reader.push(token)
+    return FoamFile(header=header, entries=parse_body(reader))
+
+
+def parse_body(reader: Reader) -> Union[Dict[str, object], list]:
+    token = reader.token()
+    if (
+        token is not None
+        and token.kind == "word"
+        and INTEGER.match(token.value)
+    ):
+        following = reader.token()
+        if following == Token("punct", "("):
+            return parse_list(reader)
+        reader.push(following)
+    if token is not None:
+        reader.push(token)
+    return parse_entries(reader)
+
+
+def load(filename: str) -> FoamFile:
+    with open(filename, "rb") as f:
+        return parse(f)
+
+
+def loads(data: Union[str, bytes]) -> FoamFile:
+    if isinstance(data, str):
+        data = data.encode()
+    return parse(io.BytesIO(data))
+
+
+def format_inline(value) -> str:
+    match value:
+        case Quoted():
+            return f'"{value}"'
+        case bool():
+            return "true" if value else "false"
+        case int() | float() | np.integer() | np.floating():
+            return repr(
+                value.item() if isinstance(value, np.generic) else value
+            )
+        case Dimensions():
+            return f"[{' '.join(format_inline(v) for v in value)}]"
+        case list() | np.ndarray():
+            return f"({' '.join(format_inline(v) for v in value)})"
+        case Field("uniform", v):
+            return f"uniform {format_inline(v)}"
+        case tuple():
+            return " ".join(format_inline(v) for v in value)
+        case str():
+            return value
+    raise FoamDictError(f"Cannot inline {value!r}")
+
+
+def is_block(value) -> bool:
+    match value:
+        case dict():
+            return True
+        case Field("nonuniform", _):
+            return True
+        case list():
+            return any(is_block(v) for v in value)
+        case tuple():
+            return any(is_block(v) for v in value)
+    return False
+
+
+def indent(level: int) -> str:
+    return "    " * level
+
+
+def field_lines(field: Field, binary: bool) -> Iterator[bytes]:
+    values = np.asarray(field.value)
+    yield f"nonuniform {field.type} {len(values)}".encode()
+    if binary:
+        integer = np.issubdtype(values.dtype, np.integer)
+        dtype = np.int32 if integer else np.float64
+        data = np.ascontiguousarray(values, dtype=dtype).tobytes()
+        yield b"\n(" + data + b")"
+        return
+    if values.ndim > 1:
+        rows = (f"({' '.join(map(repr, row))})" for row in values.tolist())
+    else:
+        rows = map(repr, values.tolist())
+    yield b"\n(\n"
+    yield "".join(f"{row}\n" for row in rows).encode()
+    yield b")"
+
+
+def block_lines(value, level: int, binary: bool) -> Iterator[bytes]:
+    if isinstance(value, dict):
+        yield f"{indent(level)}{{\n".encode()
+        yield from entry_lines(value, level + 1, binary)
+        yield f"{indent(level)}}}".encode()
+        return
+    yield f"{indent(level)}(\n".encode()
+    for item in value:
+        if is_block(item):
+            yield from block_lines(item, level + 1, binary)
+        else:
+            yield f"{indent(level + 1)}{format_inline(item)}".encode()
+        yield b"\n"
+    yield f"{indent(level)})".encode()
+
+
+def value_lines(value, binary: bool) -> Iterator[bytes]:
+    match value:
+        case Field("nonuniform", _):
+            yield from field_lines(value, binary)
+        case tuple() if type(value) is tuple:
+            for i, item in enumerate(value):
+                if i:
+                    yield b" "
+                yield from value_lines(item, binary)
+        case _:
+            yield format_inline(value).encode()
+
+
+def entry_lines(
+    entries: Dict[str, object], level: int = 0, binary: bool = False
+) -> Iterator[bytes]:
+    for key, value in entries.items():
+        key = f'"{key}"' if isinstance(key, Quoted) else key
+        if key.startswith("#"):
+            yield f"{indent(level)}{key} {format_inline(value)}\n".encode()
+        elif value is None:
+            yield f"{indent(level)}{key};\n".encode()
+        elif isinstance(value, (dict, list)) and is_block(value):
+            yield f"{indent(level)}{key}\n".encode()
+            yield from block_lines(value, level, binary)
+            yield b"\n" if isinstance(value, dict) else b";\n"
+        else:
+            yield f"{indent(level)}{key.ljust(15)} ".encode()
+            yield from value_lines(value, binary)
+            yield b";\n"
+        if level == 0:
+            yield b"\n"
+
+
+def header_lines(header: Dict[str, object]) -> Iterator[bytes]:
+    yield BANNER.encode()
+    yield b"FoamFile\n{\n"
+    for key, value in header.items():
+        yield f"    {key.ljust(11)} {format_inline(value)};\n".encode()
+    yield b"}\n"
+    yield SEPARATOR.encode()
+    yield b"\n"
+
+
+def list_size(items: list) -> int:
+    return sum(isinstance(item, dict) for item in items) or len(items)
+
+
+def serialize(foam_file: FoamFile) -> Iterator[bytes]:
+    binary = foam_file.header.get("format") == "binary"
+    if foam_file.header:
+        yield from header_lines(foam_file.header)
+    if isinstance(foam_file.entries, list):
+        yield f"{list_size(foam_file.entries)}\n".encode()
+        yield from block_lines(foam_file.entries, 0, binary)
+        yield b"\n\n"
+    else:
+        yield from entry_lines(foam_file.entries, binary=binary)
+    if foam_file.header:
+        yield FOOTER.encode()
+
+
+def dumps(foam_file: FoamFile) -> bytes:
+    return b"".join(serialize(foam_file))
+
+
+def dump(foam_file: FoamFile, filename: str):
+    staging = f"{filename}.tmp"
+    with open(staging, "wb") as f:
+        f.writelines(serialize(foam_file))
+    os.replace(staging, filename)
+
+
+def get_path(entries: Dict[str, object], path: str, default=None):
+    value = entries
+    for key in path.split("/"):
+        if not isinstance(value, dict) or key not in value:
+            return default
+        value = value[key]
+    return value
+
+
+def set_path(entries: Dict[str, object], path: str, value):
+    *parents, key = path.split("/")
+    for parent in parents:
+        entries = entries.setdefault(parent, {})
+    entries[key] = value
+
+
+def update_file(filename: str, values: Dict[str, object]) -> FoamFile:
+    foam_file = load(filename)
+    for path, value in values.items():
+        set_path(foam_file.entries, path, value)
+    dump(foam_file, filename)
+    return foam_file
@@ -519,14 +519,15 @@ def triple_inlet(channel_spacing: float, channel_width: float):
     )
 
 
-def random_layer_sequence(n_layers, max_width, max_layer_difference):
+def random_layer_sequence(n_layers, max_width, max_layer_difference, rng=None):
+    _randint = rng.randint if rng is not None else randint
     layers = [1, 1]
     prev_int = 1
     for _ in range(n_layers - 2):
         layers.insert(
             prev_int,
             layers[prev_int - 1]
-            + randint(-max_layer_difference, max_layer_difference),
+            + _randint(-max_layer_difference, max_layer_difference),
         )
         prev_int += 1
 
@@ -545,6 +546,8 @@ def random_layer_sequence(n_layers, max_width, max_layer_difference):
                 return True
 
     if not is_valid():
-        return random_layer_sequence(n_layers, max_width, max_layer_difference)
+        return random_layer_sequence(
+            n_layers, max_width, max_layer_difference, rng
+        )
     else:
         return tuple(layers)
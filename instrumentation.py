@@ -0,0 +1,115 @@
+import json
+import os
+from collections import namedtuple
+from time import perf_counter
+from typing import Dict, Mapping
+
+CallStats = namedtuple(typename="CallStats", field_names=("calls", "seconds"))
+
+
+class CallRecorder:
+    stats: Dict[str, CallStats]
+
+    def __init__(self):
+        self.stats = {}
+        self.started = perf_counter()
+
+    def record(self, name: str, seconds: float):
+        calls, total = self.stats.get(name, CallStats(0, 0.0))
+        self.stats[name] = CallStats(calls + 1, total + seconds)
+
+    def calls(self, name: str) -> int:
+        return self.stats.get(name, CallStats(0, 0.0)).calls
+
+    def seconds(self, name: str) -> float:
+        return self.stats.get(name, CallStats(0, 0.0)).seconds
+
+    @property
+    def total_calls(self) -> int:
+        return sum(s.calls for s in self.stats.values())
+
+    def reset(self):
+        self.stats = {}
+        self.started = perf_counter()
+
+    def report(self) -> dict:
+        ordered = sorted(
+            self.stats.items(), key=lambda x: x[1].seconds, reverse=True
+        )
+        return dict(
+            wall_seconds=round(perf_counter() - self.started, 6),
+            total_calls=self.total_calls,
+            calls={
+                name: dict(calls=s.calls, seconds=round(s.seconds, 6))
+                for name, s in ordered
+            },
+        )
+
+    def write_report(self, filename: str, **extra) -> str:
+        report = self.report()
+        report.update(extra)
+        with open(filename, "w") as f:
+            json.dump(report, f, indent=4)
+        return filename
+
+
+def report_name(mesh_filename: str) -> str:
+    return f"{os.path.splitext(mesh_filename)[0]}.profile.json"
+
+
+def over_budget(
+    recorder: CallRecorder, budgets: Mapping[str, int]
+) -> Dict[str, int]:
+    return {
+        name: recorder.calls(name)
+        for name, budget in budgets.items()
+        if recorder.calls(name) > budget
+    }
+
+
+def unwrap(obj: object) -> object:
+    if isinstance(obj, InstrumentedBuilder):
+        return obj.wrapped
+    return obj
+
+
+class InstrumentedBuilder:
+    wrapped: object
+    recorder: CallRecorder
+    prefix: str
+    wrap_results: Mapping[str, str]
+
+    def __init__(
+        self,
+        wrapped: object,
+        recorder: CallRecorder,
+        prefix: str,
+        wrap_results: Mapping[str, str] = None,
+    ):
+        self.wrapped = wrapped
+        self.recorder = recorder
+        self.prefix = prefix
+        self.wrap_results = wrap_results or {}
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.wrapped, name)
+        if not callable(attr):
+            return attr
+
+        def timed(*args, **kwargs):
+            args = tuple(map(unwrap, args))
+            kwargs = {k: unwrap(v) for k, v in kwargs.items()}
+            start = perf_counter()
+            try:
+                result = attr(*args, **kwargs)
+            finally:
+                self.recorder.record(
+                    f"{self.prefix}.{name}", perf_counter() - start
+                )
+            if name in self.wrap_results:
+                return InstrumentedBuilder(
+                    result, self.recorder, self.wrap_results[name]
+                )
+            return result
+
+        return timed
@@ -0,0 +1,275 @@
+import json
+import os
+import socket
+import sqlite3
+from collections import namedtuple
+from contextlib import closing, contextmanager
+from enum import Enum
+from time import time
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+import config
+from design import Design, design_name
+
+
+class JobStatus(str, Enum):
+    PENDING = "pending"
+    CLAIMED = "claimed"
+    DONE = "done"
+    FAILED = "failed"
+
+    def __str__(self):
+        return str.__str__(self)
+
+
+LedgerJob = namedtuple(
+    typename="LedgerJob",
+    field_names=("design_id", "design", "completed_stages", "artifacts"),
+)
+
+Transition = namedtuple(
+    typename="Transition",
+    field_names=("design_id", "stage", "started", "seconds", "artifacts"),
+)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    design_id TEXT PRIMARY KEY,
+    design TEXT NOT NULL,
+    status TEXT NOT NULL,
+    stage TEXT,
+    worker TEXT,
+    heartbeat REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, heartbeat);
+CREATE INDEX IF NOT EXISTS jobs_stage ON jobs (stage);
+CREATE TABLE IF NOT EXISTS transitions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    design_id TEXT NOT NULL REFERENCES jobs (design_id),
+    stage TEXT NOT NULL,
+    worker TEXT NOT NULL,
+    started REAL NOT NULL,
+    seconds REAL NOT NULL,
+    artifacts TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transitions_design ON transitions (design_id);
+"""
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def encode_design(design: Design) -> str:
+    return json.dumps(design._asdict())
+
+
+def decode_design(encoded: str) -> Design:
+    fields = json.loads(encoded)
+    fields["lattice_structure"] = tuple(fields["lattice_structure"])
+    return Design(**fields)
+
+
+def serializable(artifacts: Dict[str, object]) -> Dict[str, object]:
+    return {
+        k: v
+        for k, v in artifacts.items()
+        if isinstance(v, (str, int, float, bool, list, dict))
+    }
+
+
+class Ledger:
+    path: str
+    stale_after: float
+
+    def __init__(self, path: str = None, stale_after: float = None):
+        self.path = path or config.LEDGER_PATH
+        self.stale_after = stale_after or config.LEDGER_STALE_SECONDS
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self.connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        with closing(conn):
+            yield conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        with self.connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def add(self, designs: Iterable[Design]) -> int:
+        now = time()
+        with self.transaction() as conn:
+            cursor = conn.executemany(
+                "INSERT OR IGNORE INTO jobs "
+                "(design_id, design, status, created, updated) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (
+                    (
+                        design_name(d),
+                        encode_design(d),
+                        JobStatus.PENDING,
+                        now,
+                        now,
+                    )
+                    for d in designs
+                ),
+            )
+        return cursor.rowcount
+
+    def claim(self, worker: str) -> Optional[LedgerJob]:
+        now = time()
+        with self.transaction() as conn:
+            row = conn.execute(
+                "SELECT design_id, design FROM jobs "
+                "WHERE status = ? OR (status = ? AND heartbeat < ?) "
+                "ORDER BY created, design_id LIMIT 1",
+                (JobStatus.PENDING, JobStatus.CLAIMED, now - self.stale_after),
+            ).fetchone()
+            if row is None:
+                return None
+            design_id, design = row
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker = ?, heartbeat = ?, "
+                "attempts = attempts + 1, updated = ? WHERE design_id = ?",
+                (JobStatus.CLAIMED, worker, now, now, design_id),
+            )
+        transitions = self.transitions(design_id)
+        artifacts = {}
+        for t in transitions:
+            artifacts.update(t.artifacts)
+        return LedgerJob(
+            design_id=design_id,
+            design=decode_design(design),
+            completed_stages=tuple(t.stage for t in transitions),
+            artifacts=artifacts,
+        )
+
+    @staticmethod
+    def owned_update(
+        conn: sqlite3.Connection, design_id: str, owner: str, **fields
+    ) -> bool:
+        fields["updated"] = time()
+        assignments = ", ".join(f"{k} = ?" for k in fields)
+        cursor = conn.execute(
+            f"UPDATE jobs SET {assignments} "
+            "WHERE design_id = ? AND worker = ? AND status = ?",
+            tuple(fields.values()) + (design_id, owner, JobStatus.CLAIMED),
+        )
+        return cursor.rowcount == 1
+
+    def heartbeat(self, design_ids: Iterable[str], worker: str) -> int:
+        now = time()
+        with self.transaction() as conn:
+            return sum(
+                self.owned_update(conn, design_id, worker, heartbeat=now)
+                for design_id in design_ids
+            )
+
+    def complete_stage(
+        self,
+        design_id: str,
+        worker: str,
+        stage: str,
+        started: float,
+        seconds: float,
+        artifacts: Dict[str, object] = None,
+    ) -> bool:
+        with self.transaction() as conn:
+            owned = self.owned_update(
+                conn, design_id, worker, stage=stage, heartbeat=time()
+            )
+            if owned:
+                conn.execute(
+                    "INSERT INTO transitions "
+                    "(design_id, stage, worker, started, seconds, artifacts) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        design_id,
+                        stage,
+                        worker,
+                        started,
+                        seconds,
+                        json.dumps(serializable(artifacts or {})),
+                    ),
+                )
+        return owned
+
+    def finish(self, design_id: str, worker: str) -> bool:
+        with self.transaction() as conn:
+            return self.owned_update(
+                conn, design_id, worker, status=JobStatus.DONE, worker=None
+            )
+
+    def fail(self, design_id: str, worker: str, error: str) -> bool:
+        with self.transaction() as conn:
+            return self.owned_update(
+                conn,
+                design_id,
+                worker,
+                status=JobStatus.FAILED,
+                error=error,
+                worker=None,
+            )
+
+    def release(self, design_id: str, worker: str) -> bool:
+        with self.transaction() as conn:
+            return self.owned_update(
+                conn, design_id, worker, status=JobStatus.PENDING, worker=None
+            )
+
+    def retry_failed(self) -> int:
+        with self.transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, error = NULL, updated = ? "
+                "WHERE status = ?",
+                (JobStatus.PENDING, time(), JobStatus.FAILED),
+            )
+        return cursor.rowcount
+
+    def transitions(self, design_id: str) -> Tuple[Transition, ...]:
+        with self.connect() as conn:
+            rows = conn.execute(
+                "SELECT design_id, stage, started, seconds, artifacts "
+                "FROM transitions WHERE design_id = ? ORDER BY id",
+                (design_id,),
+            ).fetchall()
+        return tuple(
+            Transition(*row[:4], artifacts=json.loads(row[4])) for row in rows
+        )
+
+    def status(self, design_id: str) -> Optional[str]:
+        with self.connect() as conn:
+            row = conn.execute(
+                "SELECT status FROM jobs WHERE design_id = ?", (design_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def status_counts(self) -> Dict[str, int]:
+        with self.connect() as conn:
+            rows = conn.execute(
+                "SELECT status, COUNT(*) FROM jobs GROUP BY status"
+            ).fetchall()
+        return dict(rows)
+
+    def stage_counts(self) -> Dict[Optional[str], int]:
+        with self.connect() as conn:
+            rows = conn.execute(
+                "SELECT stage, COUNT(*) FROM jobs GROUP BY stage"
+            ).fetchall()
+        return dict(rows)
@@ -0,0 +1,464 @@
+import asyncio
+import glob
+import json
+import math
+import os
+import re
+from collections import deque, namedtuple
+from enum import Enum
+from typing import (
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+import config
+import foam_dict
+from openfoam_writer import OUTLET_FUNCTIONS
+from runner import terminate
+
+SolverSample = namedtuple(
+    typename="SolverSample",
+    field_names=(
+        "time",
+        "delta_t",
+        "courant_mean",
+        "courant_max",
+        "interface_courant_mean",
+        "interface_courant_max",
+        "residuals",
+        "execution_time",
+    ),
+    defaults=(None, None, None, None, None, None, None, None),
+)
+
+MonitorRules = namedtuple(
+    typename="MonitorRules",
+    field_names=(
+        "max_courant",
+        "min_delta_t",
+        "delta_t_collapse",
+        "max_residual",
+        "steady_residual",
+        "steady_steps",
+    ),
+)
+
+COURANT = re.compile(r"Courant Number mean: (\S+) max: (\S+)")
+INTERFACE_COURANT = re.compile(
+    r"Interface Courant Number mean: (\S+) max: (\S+)"
+)
+DELTA_T = re.compile(r"deltaT = (\S+)")
+TIME = re.compile(r"Time = (\S+)")
+RESIDUAL = re.compile(
+    r"Solving for (\S+), Initial residual = (\S+), "
+    r"Final residual = (\S+), No Iterations (\d+)"
+)
+EXECUTION_TIME = re.compile(r"ExecutionTime = (\S+) s")
+
+SUMMARY_FILE = "monitor.json"
+
+
+class MonitorAction(str, Enum):
+    ABORT = "abort"
+    STOP = "stop"
+
+    def __str__(self):
+        return str.__str__(self)
+
+
+Verdict = namedtuple(
+    typename="Verdict",
+    field_names=("action", "reason", "time"),
+    defaults=(None,),
+)
+
+OutletSample = namedtuple(
+    typename="OutletSample", field_names=("time", "mean", "variance")
+)
+
+SteadyCriterion = namedtuple(
+    typename="SteadyCriterion", field_names=("window", "tolerance", "min_time")
+)
+
+
+def default_rules() -> MonitorRules:
+    return MonitorRules(
+        max_courant=config.MONITOR_MAX_COURANT,
+        min_delta_t=config.MONITOR_MIN_DELTA_T,
+        delta_t_collapse=config.MONITOR_DELTA_T_COLLAPSE,
+        max_residual=config.MONITOR_MAX_RESIDUAL,
+        steady_residual=config.MONITOR_STEADY_RESIDUAL,
+        steady_steps=config.MONITOR_STEADY_STEPS,
+    )
+
+
+def default_criterion() -> SteadyCriterion:
+    return SteadyCriterion(
+        window=config.STEADY_WINDOW,
+        tolerance=config.STEADY_TOLERANCE,
+        min_time=config.STEADY_MIN_TIME,
+    )
+
+
+class FileTail:
+    path: str
+    offset: int
+
+    def __init__(self, path: str):
+        self.path = path
+        self.offset = 0
+        self.partial = b""
+
+    def read(self) -> bytes:
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(self.offset)
+                data = f.read()
+        except FileNotFoundError:
+            return b""
+        self.offset += len(data)
+        return data
+
+    def lines(self) -> List[str]:
+        lines = (self.partial + self.read()).split(b"\n")
+        self.partial = lines.pop()
+        return [line.decode(errors="replace") for line in lines]
+
+
+class LogParser:
+    partial: bytes
+    current: Dict[str, object]
+
+    def __init__(self):
+        self.partial = b""
+        self.current = {}
+
+    def feed(self, data: bytes) -> List[SolverSample]:
+        lines = (self.partial + data).split(b"\n")
+        self.partial = lines.pop()
+        samples = (
+            self.parse_line(line.decode(errors="replace")) for line in lines
+        )
+        return [sample for sample in samples if sample is not None]
+
+    def parse_line(self, line: str) -> Optional[SolverSample]:
+        line = line.strip()
+        if match := INTERFACE_COURANT.match(line):
+            self.current["interface_courant_mean"] = float(match.group(1))
+            self.current["interface_courant_max"] = float(match.group(2))
+        elif match := COURANT.match(line):
+            self.current["courant_mean"] = float(match.group(1))
+            self.current["courant_max"] = float(match.group(2))
+        elif match := DELTA_T.match(line):
+            self.current["delta_t"] = float(match.group(1))
+        elif match := TIME.match(line):
+            self.current["time"] = float(match.group(1))
+        elif match := RESIDUAL.search(line):
+            residuals = self.current.setdefault("residuals", {})
+            field, initial = match.group(1), float(match.group(2))
+            if not initial <= residuals.get(field, -math.inf):
+                residuals[field] = initial
+        elif match := EXECUTION_TIME.match(line):
+            if "time" in self.current:
+                sample = SolverSample(
+                    execution_time=float(match.group(1)), **self.current
+                )
+                self.current = {}
+                return sample
+        return None
+
+
+def finite(values: Iterable[float]) -> bool:
+    return all(math.isfinite(v) for v in values if v is not None)
+
+
+def sample_residual(sample: SolverSample) -> float:
+    return max((sample.residuals or {}).values(), default=0.0)
+
+
+def check_sample(
+    sample: SolverSample,
+    history: Deque[SolverSample],
+    peak_delta_t: float,
+    rules: MonitorRules,
+) -> Optional[Verdict]:
+    values = (
+        sample.courant_max,
+        sample.interface_courant_max,
+        sample.delta_t,
+        *(sample.residuals or {}).values(),
+    )
+    if not finite(values):
+        return Verdict(
+            MonitorAction.ABORT, f"non-finite value at t={sample.time}"
+        )
+    if (sample.courant_max or 0) > rules.max_courant:
+        return Verdict(
+            MonitorAction.ABORT,
+            f"Courant number {sample.courant_max} "
+            f"exceeds {rules.max_courant}",
+        )
+    if sample.delta_t is not None and (
+        sample.delta_t < rules.min_delta_t
+        or sample.delta_t < rules.delta_t_collapse * peak_delta_t
+    ):
+        return Verdict(
+            MonitorAction.ABORT,
+            f"deltaT collapsed to {sample.delta_t} (peak {peak_delta_t})",
+        )
+    if sample_residual(sample) > rules.max_residual:
+        return Verdict(
+            MonitorAction.ABORT,
+            f"residual {sample_residual(sample)} "
+            f"exceeds {rules.max_residual}",
+        )
+    if rules.steady_residual is None or len(history) < rules.steady_steps:
+        return None
+    recent = tuple(history)[-rules.steady_steps :]
+    if all(
+        s.residuals and sample_residual(s) < rules.steady_residual
+        for s in recent
+    ):
+        return Verdict(
+            MonitorAction.STOP,
+            f"residuals below {rules.steady_residual} "
+            f"for {rules.steady_steps} steps",
+        )
+    return None
+
+
+def request_stop(case_path: str):
+    foam_dict.update_file(
+        os.path.join(case_path, "system", "controlDict"),
+        dict(stopAt="writeNow"),
+    )
+
+
+def outlet_values(lines: Iterable[str]) -> Iterator[Tuple[float, float]]:
+    for line in lines:
+        fields = line.split()
+        if len(fields) < 2 or fields[0].startswith("#"):
+            continue
+        yield float(fields[0]), float(fields[1])
+
+
+def departed(
+    sample: OutletSample, initial: OutletSample, tolerance: float
+) -> bool:
+    return (
+        abs(sample.mean - initial.mean) > tolerance
+        or abs(
+            math.sqrt(max(sample.variance, 0.0))
+            - math.sqrt(max(initial.variance, 0.0))
+        )
+        > tolerance
+    )
+
+
+def is_steady(
+    samples: Sequence[OutletSample], criterion: SteadyCriterion
+) -> bool:
+    latest = samples[-1].time
+    start = latest - criterion.window
+    if latest < criterion.min_time or samples[0].time > start:
+        return False
+    window = [s for s in samples if s.time >= start]
+    means = [s.mean for s in window]
+    deviations = [math.sqrt(max(s.variance, 0.0)) for s in window]
+    return (
+        max(means) - min(means) <= criterion.tolerance
+        and max(deviations) - min(deviations) <= criterion.tolerance
+    )
+
+
+class OutletTracker:
+    case_path: str
+    criterion: SteadyCriterion
+    samples: Deque[OutletSample]
+
+    def __init__(
+        self,
+        case_path: str,
+        criterion: SteadyCriterion = None,
+        names: Tuple[str, str] = None,
+    ):
+        self.case_path = case_path
+        self.criterion = criterion or default_criterion()
+        self.names = names or tuple(OUTLET_FUNCTIONS)
+        self.tails = {}
+        self.pending = {name: {} for name in self.names}
+        self.samples = deque()
+        self.initial = None
+        self.armed = False
+
+    def tail(self, name: str) -> Optional[FileTail]:
+        if name not in self.tails:
+            pattern = os.path.join(
+                self.case_path, "postProcessing", name, "*", "*.dat"
+            )
+            found = sorted(glob.glob(pattern))
+            if not found:
+                return None
+            self.tails[name] = FileTail(found[0])
+        return self.tails[name]
+
+    def add(self, sample: OutletSample):
+        if self.initial is None:
+            self.initial = sample
+        if not self.armed and departed(
+            sample, self.initial, self.criterion.tolerance
+        ):
+            self.armed = True
+            self.samples.clear()
+        self.samples.append(sample)
+
+    def poll(self) -> Optional[Verdict]:
+        for name in self.names:
+            tail = self.tail(name)
+            if tail is not None:
+                self.pending[name].update(outlet_values(tail.lines()))
+        average, deviation = (self.pending[name] for name in self.names)
+        for time in sorted(set(average) & set(deviation)):
+            mean = average.pop(time)
+            variance = (deviation.pop(time) * mean) ** 2
+            self.add(OutletSample(time, mean, variance))
+        if not self.armed or not self.samples:
+            return None
+        while (
+            len(self.samples) > 1
+            and self.samples[1].time
+            <= self.samples[-1].time - self.criterion.window
+        ):
+            self.samples.popleft()
+        if is_steady(self.samples, self.criterion):
+            return Verdict(
+                MonitorAction.STOP,
+                f"outlet steady within {self.criterion.tolerance} "
+                f"over {self.criterion.window}",
+                self.samples[-1].time,
+            )
+        return None
+
+
+class LogMonitor:
+    path: str
+    rules: MonitorRules
+    interval: float
+    grace: Optional[float]
+    samples: Deque[SolverSample]
+    steps: int
+    peak_delta_t: float
+    verdict: Optional[Verdict]
+
+    def __init__(
+        self,
+        path: str,
+        rules: MonitorRules = None,
+        capacity: int = None,
+        interval: float = None,
+        trackers: Sequence[OutletTracker] = (),
+        grace: float = None,
+    ):
+        self.path = path
+        self.grace = grace
+        self.trackers = tuple(trackers)
+        self.interval = interval or config.MONITOR_INTERVAL
+        self.rules = rules or default_rules()
+        self.samples = deque(maxlen=capacity or config.MONITOR_CAPACITY)
+        self.steps = 0
+        self.peak_delta_t = 0.0
+        self.verdict = None
+        self.tail = FileTail(path)
+        self.parser = LogParser()
+
+    @property
+    def latest(self) -> Optional[SolverSample]:
+        return self.samples[-1] if self.samples else None
+
+    def add(self, sample: SolverSample):
+        self.samples.append(sample)
+        self.steps += 1
+        self.peak_delta_t = max(self.peak_delta_t, sample.delta_t or 0.0)
+        if self.verdict is None:
+            verdict = check_sample(
+                sample, self.samples, self.peak_delta_t, self.rules
+            )
+            if verdict is not None:
+                self.verdict = verdict._replace(time=sample.time)
+
+    def poll(self) -> List[SolverSample]:
+        samples = self.parser.feed(self.tail.read())
+        for sample in samples:
+            self.add(sample)
+        for tracker in self.trackers:
+            verdict = tracker.poll()
+            if self.verdict is None:
+                self.verdict = verdict
+        return samples
+
+    async def watch(
+        self, process: asyncio.subprocess.Process, case_path: str
+    ) -> int:
+        stopping = False
+        while process.returncode is None:
+            try:
+                await asyncio.wait_for(process.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self.poll()
+            if self.verdict is None or process.returncode is not None:
+                continue
+            if self.verdict.action == MonitorAction.ABORT:
+                await terminate(process, self.grace)
+            elif not stopping:
+                stopping = True
+                await asyncio.to_thread(request_stop, case_path)
+        self.poll()
+        return process.returncode
+
+    def summary(self) -> Dict[str, object]:
+        latest = self.latest or SolverSample()
+        return dict(
+            steps=self.steps,
+            time=latest.time,
+            delta_t=latest.delta_t,
+            courant_max=latest.courant_max,
+            action=str(self.verdict.action) if self.verdict else None,
+            reason=self.verdict.reason if self.verdict else None,
+            stop_time=self.verdict.time if self.verdict else None,
+        )
+
+
+def case_monitor(
+    case_path: str,
+    steady: bool = None,
+    min_time: float = None,
+    trackers: Sequence[OutletTracker] = (),
+) -> LogMonitor:
+    if steady is None:
+        steady = config.STEADY_STOP
+    criterion = default_criterion()
+    if min_time is not None:
+        criterion = criterion._replace(
+            min_time=max(criterion.min_time, min_time)
+        )
+    return LogMonitor(
+        os.path.join(case_path, "log.interFoam"),
+        trackers=(
+            ((OutletTracker(case_path, criterion),) if steady else ())
+            + tuple(trackers)
+        ),
+    )
+
+
+def write_summary(case_path: str, monitor: LogMonitor) -> str:
+    filename = os.path.join(case_path, SUMMARY_FILE)
+    with open(filename, "w") as f:
+        json.dump(monitor.summary(), f, indent=2)
+    return filename
@@ -0,0 +1,327 @@
+from collections import namedtuple
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+import config
+import polymesh
+import unv
+from design import MeshSettings
+
+METRICS = ("volume", "aspect_ratio", "skewness", "non_orthogonality")
+
+ROOT_VSMALL = 1e-150
+
+MAX_FINENESS = 4
+
+QualityThresholds = namedtuple(
+    typename="QualityThresholds",
+    field_names=(
+        "min_volume_ratio",
+        "max_aspect_ratio",
+        "max_skewness",
+        "max_non_orthogonality",
+    ),
+)
+
+CellQuality = namedtuple(typename="CellQuality", field_names=METRICS)
+
+MetricSummary = namedtuple(
+    typename="MetricSummary",
+    field_names=("min", "max", "mean", "counts", "edges", "worst", "failed"),
+)
+
+QualityReport = namedtuple(
+    typename="QualityReport", field_names=("cells", "passed", "metrics")
+)
+
+
+class MeshQualityError(Exception):
+    pass
+
+
+def default_thresholds() -> QualityThresholds:
+    return QualityThresholds(
+        min_volume_ratio=config.MESH_MIN_VOLUME_RATIO,
+        max_aspect_ratio=config.MESH_MAX_ASPECT_RATIO,
+        max_skewness=config.MESH_MAX_SKEWNESS,
+        max_non_orthogonality=config.MESH_MAX_NON_ORTHOGONALITY,
+    )
+
+
+def dot(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return np.einsum("ij,ij->i", a, b)
+
+
+def cell_maximum(
+    values: np.ndarray, owner: np.ndarray, neighbour: np.ndarray, n: int
+) -> np.ndarray:
+    result = np.zeros(n)
+    np.maximum.at(result, owner[: len(values)], values[: len(owner)])
+    np.maximum.at(result, neighbour, values[: len(neighbour)])
+    return result
+
+
+def aspect_ratios(
+    areas: np.ndarray,
+    volumes: np.ndarray,
+    owner: np.ndarray,
+    neighbour: np.ndarray,
+) -> np.ndarray:
+    magnitudes = np.abs(areas)
+    n_cells = len(volumes)
+    sums = np.stack(
+        [
+            np.bincount(owner, magnitudes[:, i], n_cells)
+            + np.bincount(neighbour, magnitudes[: len(neighbour), i], n_cells)
+            for i in range(3)
+        ],
+        axis=1,
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratios = np.maximum(
+            sums.max(axis=1) / sums.min(axis=1),
+            sums.sum(axis=1) / (6 * np.cbrt(volumes) ** 2),
+        )
+    return np.where(volumes > 0, ratios, np.inf)
+
+
+def face_skewness(
+    points: np.ndarray,
+    offsets: np.ndarray,
+    values: np.ndarray,
+    centres: np.ndarray,
+    areas: np.ndarray,
+    cell_centres: np.ndarray,
+    owner: np.ndarray,
+    neighbour: np.ndarray,
+) -> np.ndarray:
+    n_internal = len(neighbour)
+    relative = centres - cell_centres[owner]
+    deltas = np.empty_like(relative)
+    deltas[:n_internal] = (
+        cell_centres[neighbour] - cell_centres[owner][:n_internal]
+    )
+    boundary = areas[n_internal:]
+    normals = (
+        boundary / (np.linalg.norm(boundary, axis=1) + ROOT_VSMALL)[:, None]
+    )
+    deltas[n_internal:] = (
+        normals * dot(normals, relative[n_internal:])[:, None]
+    )
+    projection = dot(areas, relative) / (dot(areas, deltas) + ROOT_VSMALL)
+    skew = relative - projection[:, None] * deltas
+    magnitudes = np.linalg.norm(skew, axis=1)
+    directions = skew / (magnitudes + ROOT_VSMALL)[:, None]
+    sizes = np.diff(offsets)
+    spread = np.abs(
+        dot(
+            np.repeat(directions, sizes, axis=0),
+            points[values] - np.repeat(centres, sizes, axis=0),
+        )
+    )
+    distances = np.maximum(
+        0.2 * np.linalg.norm(deltas, axis=1) + ROOT_VSMALL,
+        np.maximum.reduceat(spread, offsets[:-1]),
+    )
+    return magnitudes / distances
+
+
+def face_non_orthogonality(
+    areas: np.ndarray,
+    cell_centres: np.ndarray,
+    owner: np.ndarray,
+    neighbour: np.ndarray,
+) -> np.ndarray:
+    deltas = cell_centres[neighbour] - cell_centres[owner[: len(neighbour)]]
+    internal = areas[: len(neighbour)]
+    cosines = dot(deltas, internal) / (
+        np.linalg.norm(deltas, axis=1) * np.linalg.norm(internal, axis=1)
+        + ROOT_VSMALL
+    )
+    return np.degrees(np.arccos(np.clip(cosines, -1, 1)))
+
+
+def cell_quality(
+    points: np.ndarray,
+    offsets: np.ndarray,
+    values: np.ndarray,
+    owner: np.ndarray,
+    neighbour: np.ndarray,
+) -> CellQuality:
+    centres = polymesh.face_centres(points, offsets, values)
+    areas = polymesh.face_area_vectors(points, offsets, values)
+    volumes = polymesh.cell_volumes(centres, areas, owner, neighbour)
+    cell_centres = polymesh.face_average(centres, owner, neighbour)
+    n_cells = len(volumes)
+    skewness = face_skewness(
+        points,
+        offsets,
+        values,
+        centres,
+        areas,
+        cell_centres,
+        owner,
+        neighbour,
+    )
+    non_orthogonality = face_non_orthogonality(
+        areas, cell_centres, owner, neighbour
+    )
+    return CellQuality(
+        volume=volumes,
+        aspect_ratio=aspect_ratios(areas, volumes, owner, neighbour),
+        skewness=cell_maximum(skewness, owner, neighbour, n_cells),
+        non_orthogonality=cell_maximum(
+            non_orthogonality, owner, neighbour, n_cells
+        ),
+    )
+
+
+def polymesh_quality(mesh: polymesh.PolyMesh) -> CellQuality:
+    faces = np.asarray(mesh.faces)
+    return cell_quality(
+        mesh.points,
+        np.arange(0, faces.size + 1, faces.shape[1]),
+        faces.reshape(-1),
+        mesh.owner,
+        mesh.neighbour,
+    )
+
+
+def tet_quality(points: np.ndarray, tets: np.ndarray) -> CellQuality:
+    return polymesh_quality(polymesh.build_polymesh(points, tets))
+
+
+def unv_quality(mesh_file: str, scale: float = None) -> CellQuality:
+    mesh = unv.load(mesh_file)
+    scale = config.MESH_SCALE if scale is None else scale
+    return tet_quality(mesh.points * scale, unv.tetrahedra(mesh))
+
+
+def case_quality(case_path: str) -> CellQuality:
+    return cell_quality(
+        polymesh.read_points(case_path),
+        *polymesh.read_faces(case_path),
+        polymesh.read_labels(case_path, "owner"),
+        polymesh.read_labels(case_path, "neighbour"),
+    )
+
+
+def failed_cells(
+    quality: CellQuality, thresholds: QualityThresholds
+) -> Dict[str, np.ndarray]:
+    volumes = quality.volume
+    min_volume = thresholds.min_volume_ratio * np.median(volumes)
+    return dict(
+        volume=~(volumes > max(min_volume, 0)),
+        aspect_ratio=~(quality.aspect_ratio <= thresholds.max_aspect_ratio),
+        skewness=~(quality.skewness <= thresholds.max_skewness),
+        non_orthogonality=~(
+            quality.non_orthogonality <= thresholds.max_non_orthogonality
+        ),
+    )
+
+
+def worst_cells(
+    values: np.ndarray, count: int, smallest: bool = False
+) -> Tuple[int, ...]:
+    keys = np.where(np.isnan(values), -np.inf, values if smallest else -values)
+    count = min(count, len(keys))
+    if count == 0:
+        return ()
+    candidates = np.argpartition(keys, count - 1)[:count]
+    return tuple(candidates[np.argsort(keys[candidates], kind="stable")])
+
+
+def summarize_metric(
+    values: np.ndarray,
+    failed: np.ndarray,
+    bins: int,
+    worst: int,
+    smallest: bool = False,
+) -> MetricSummary:
+    finite = values[np.isfinite(values)]
+    if len(finite):
+        low, high = finite.min(), finite.max()
+        span = max(high - low, abs(high) * 1e-6, ROOT_VSMALL)
+        counts, edges = np.histogram(finite, bins, range=(low, low + span))
+    else:
+        counts, edges = np.zeros(bins, dtype=int), np.zeros(bins + 1)
+    return MetricSummary(
+        min=float(low) if len(finite) else None,
+        max=float(high) if len(finite) else None,
+        mean=float(finite.mean()) if len(finite) else None,
+        counts=tuple(counts.tolist()),
+        edges=tuple(edges.tolist()),
+        worst=tuple(int(i) for i in worst_cells(values, worst, smallest)),
+        failed=int(failed.sum()),
+    )
+
+
+def quality_report(
+    quality: CellQuality,
+    thresholds: QualityThresholds = None,
+    bins: int = None,
+    worst: int = None,
+) -> QualityReport:
+    thresholds = thresholds or default_thresholds()
+    failed = failed_cells(quality, thresholds)
+    metrics = {
+        name: summarize_metric(
+            getattr(quality, name),
+            failed[name],
+            bins or config.MESH_QUALITY_BINS,
+            config.MESH_WORST_CELLS if worst is None else worst,
+            smallest=name == "volume",
+        )
+        for name in METRICS
+    }
+    return QualityReport(
+        cells=len(quality.volume),
+        passed=not any(summary.failed for summary in metrics.values()),
+        metrics=metrics,
+    )
+
+
+def check_mesh(
+    mesh_file: str, thresholds: QualityThresholds = None
+) -> QualityReport:
+    return quality_report(unv_quality(mesh_file), thresholds)
+
+
+def check_case(
+    case_path: str, thresholds: QualityThresholds = None
+) -> QualityReport:
+    return quality_report(case_quality(case_path), thresholds)
+
+
+def failures(report: QualityReport) -> Dict[str, int]:
+    return {
+        name: summary.failed
+        for name, summary in report.metrics.items()
+        if summary.failed
+    }
+
+
+def failure_message(report: QualityReport) -> str:
+    counts = ", ".join(
+        f"{count} {name}" for name, count in failures(report).items()
+    )
+    return f"Mesh quality check failed for {report.cells} cells: {counts}"
+
+
+def report_dict(report: QualityReport) -> dict:
+    return dict(
+        cells=report.cells,
+        passed=report.passed,
+        metrics={
+            name: summary._asdict() for name, summary in report.metrics.items()
+        },
+    )
+
+
+def remesh_settings(settings: MeshSettings) -> Optional[MeshSettings]:
+    refined = settings._replace(
+        fineness=min(settings.fineness + 1, MAX_FINENESS), optimize=1
+    )
+    return refined if refined != settings else None
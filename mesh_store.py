@@ -0,0 +1,320 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from collections import namedtuple
+from contextlib import closing, contextmanager
+from time import time
+from typing import Dict, Iterator, Optional, Set, Tuple
+
+import config
+import runner
+import unv
+from archive import directory_size, remove_path
+from design import MeshSettings
+from instrumentation import report_name
+from polymesh import polymesh_name, unv_polymesh
+from scratch import move_into_place
+
+MeshGeometry = namedtuple(
+    typename="MeshGeometry",
+    field_names=(
+        "lattice_structure",
+        "channel_spacing",
+        "channel_width",
+        "channel_height",
+    ),
+)
+
+MeshRecord = namedtuple(
+    typename="MeshRecord",
+    field_names=(
+        "key",
+        "filename",
+        "size",
+        "cells",
+        "created",
+        "accessed",
+        "params",
+    ),
+)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meshes (
+    key TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    cells INTEGER,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL,
+    params TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS meshes_accessed ON meshes (accessed);
+CREATE TABLE IF NOT EXISTS pins (
+    key TEXT NOT NULL,
+    holder TEXT NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (key, holder)
+);
+"""
+
+_CREATING: Dict[Tuple[str, str], asyncio.Future] = {}
+_LOCKS: Dict[Tuple[str, str], threading.Lock] = {}
+_LOCKS_GUARD = threading.Lock()
+
+
+def mesh_params(geometry: MeshGeometry, settings: MeshSettings) -> dict:
+    return dict(
+        lattice_structure=list(geometry.lattice_structure),
+        channel_spacing=geometry.channel_spacing,
+        channel_width=geometry.channel_width,
+        channel_height=geometry.channel_height,
+        settings=settings._asdict(),
+    )
+
+
+def mesh_key(geometry: MeshGeometry, settings: MeshSettings = None) -> str:
+    params = mesh_params(geometry, settings or MeshSettings())
+    encoded = json.dumps(params, sort_keys=True).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def report_cells(mesh_file: str) -> Optional[int]:
+    try:
+        with open(report_name(mesh_file)) as f:
+            cells = json.load(f).get("cells")
+    except (FileNotFoundError, json.JSONDecodeError):
+        cells = None
+    if cells is None and os.path.exists(mesh_file):
+        try:
+            cells = unv.load_metadata(mesh_file).cells or None
+        except (unv.UnvError, ValueError):
+            return None
+    return cells
+
+
+class MeshStore:
+    root: str
+    quota_bytes: int
+    polymesh: bool
+
+    def __init__(
+        self,
+        root: str = None,
+        quota_bytes: int = None,
+        polymesh: bool = None,
+    ):
+        self.root = root or config.MESH_PATH
+        self.quota_bytes = quota_bytes or config.MESH_STORE_QUOTA
+        self.polymesh = (
+            config.POLYMESH_EXPORT if polymesh is None else polymesh
+        )
+        os.makedirs(self.root, exist_ok=True)
+        self.index_path = os.path.join(self.root, "index.sqlite")
+        with self.connect() as conn:
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        with closing(sqlite3.connect(self.index_path, timeout=30)) as conn:
+            with conn:
+                yield conn
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.unv")
+
+    def record(self, key: str) -> Optional[MeshRecord]:
+        with self.connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM meshes WHERE key = ?", (key,)
+            ).fetchone()
+        return MeshRecord(*row) if row else None
+
+    def records(self) -> Tuple[MeshRecord, ...]:
+        with self.connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM meshes ORDER BY accessed"
+            ).fetchall()
+        return tuple(MeshRecord(*row) for row in rows)
+
+    @property
+    def total_size(self) -> int:
+        with self.connect() as conn:
+            (size,) = conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM meshes"
+            ).fetchone()
+        return size
+
+    def get(self, key: str) -> Optional[str]:
+        filename = self.path(key)
+        with self.connect() as conn:
+            row = conn.execute(
+                "SELECT key FROM meshes WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if not os.path.exists(filename):
+                conn.execute("DELETE FROM meshes WHERE key = ?", (key,))
+                return None
+            conn.execute(
+                "UPDATE meshes SET accessed = ? WHERE key = ?", (time(), key)
+            )
+        return filename
+
+    def put(
+        self,
+        key: str,
+        mesh_file: str,
+        params: dict = None,
+        cells: int = None,
+    ) -> str:
+        filename = self.path(key)
+        cells = cells if cells is not None else report_cells(mesh_file)
+        if os.path.exists(report_name(mesh_file)):
+            move_into_place(report_name(mesh_file), report_name(filename))
+        remove_path(polymesh_name(filename))
+        if os.path.exists(polymesh_name(mesh_file)):
+            move_into_place(polymesh_name(mesh_file), polymesh_name(filename))
+        elif self.polymesh:
+            unv_polymesh(mesh_file, polymesh_name(filename), config.MESH_SCALE)
+        move_into_place(mesh_file, filename)
+        now = time()
+        with self.connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO meshes VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    os.path.basename(filename),
+                    os.path.getsize(filename)
+                    + directory_size(polymesh_name(filename)),
+                    cells,
+                    now,
+                    now,
+                    json.dumps(params or {}, sort_keys=True),
+                ),
+            )
+        self.evict(keep=key)
+        return filename
+
+    def remove(self, key: str):
+        filename = self.path(key)
+        for path in filename, report_name(filename), polymesh_name(filename):
+            remove_path(path)
+        with self.connect() as conn:
+            conn.execute("DELETE FROM meshes WHERE key = ?", (key,))
+
+    def pin(self, key: str, holder: str):
+        with self.connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO pins VALUES (?, ?, ?)",
+                (key, holder, time()),
+            )
+
+    def release(self, holder: str):
+        with self.connect() as conn:
+            conn.execute("DELETE FROM pins WHERE holder = ?", (holder,))
+
+    def pinned(self) -> Set[str]:
+        with self.connect() as conn:
+            rows = conn.execute(
+                "SELECT DISTINCT key FROM pins WHERE created >= ?",
+                (time() - config.MESH_PIN_SECONDS,),
+            ).fetchall()
+        return {key for (key,) in rows}
+
+    def evict(self, keep: str = None) -> Tuple[str, ...]:
+        evicted = []
+        total = self.total_size
+        pinned = self.pinned()
+        for record in self.records():
+            if total <= self.quota_bytes:
+                break
+            if record.key == keep or record.key in pinned:
+                continue
+            self.remove(record.key)
+            total -= record.size
+            evicted.append(record.key)
+        return tuple(evicted)
+
+    def lock(self, key: str) -> threading.Lock:
+        with _LOCKS_GUARD:
+            return _LOCKS.setdefault((self.index_path, key), threading.Lock())
+
+    def get_or_create(
+        self,
+        geometry: MeshGeometry,
+        settings: MeshSettings = None,
+        holder: str = None,
+        **kwargs,
+    ) -> str:
+        settings = settings or MeshSettings()
+        key = mesh_key(geometry, settings)
+        if holder is not None:
+            self.pin(key, holder)
+        with self.lock(key):
+            hit = self.get(key)
+            if hit is not None:
+                return hit
+            with tempfile.TemporaryDirectory(dir=self.root) as incoming:
+                mesh_file = runner.create_mesh(
+                    *geometry,
+                    mesh_path=incoming,
+                    settings=settings,
+                    polymesh=self.polymesh,
+                    **kwargs,
+                )
+                return self.put(
+                    key, mesh_file, mesh_params(geometry, settings)
+                )
+
+    async def get_or_create_async(
+        self,
+        geometry: MeshGeometry,
+        settings: MeshSettings = None,
+        holder: str = None,
+        **kwargs,
+    ) -> str:
+        settings = settings or MeshSettings()
+        key = mesh_key(geometry, settings)
+        if holder is not None:
+            self.pin(key, holder)
+        hit = self.get(key)
+        if hit is not None:
+            return hit
+        token = (self.index_path, key)
+
+        def forget(done: asyncio.Future):
+            if _CREATING.get(token) is done:
+                del _CREATING[token]
+
+        creating = _CREATING.get(token)
+        if creating is None:
+            creating = asyncio.ensure_future(
+                self.create_async(key, geometry, settings, **kwargs)
+            )
+            _CREATING[token] = creating
+            creating.add_done_callback(forget)
+        return await asyncio.shield(creating)
+
+    async def create_async(
+        self,
+        key: str,
+        geometry: MeshGeometry,
+        settings: MeshSettings,
+        **kwargs,
+    ) -> str:
+        with tempfile.TemporaryDirectory(dir=self.root) as incoming:
+            mesh_file = await runner.create_mesh_async(
+                *geometry,
+                mesh_path=incoming,
+                settings=settings,
+                polymesh=self.polymesh,
+                **kwargs,
+            )
+            return await asyncio.to_thread(
+                self.put, key, mesh_file, mesh_params(geometry, settings)
+            )
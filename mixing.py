@@ -0,0 +1,193 @@
+import csv
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Sequence, Tuple
+
+import numpy as np
+
+import config
+import foam_dict
+import results
+from polymesh import (
+    cell_volumes,
+    face_area_vectors,
+    face_centres,
+    read_faces,
+    read_labels,
+    read_points,
+)
+
+CaseMesh = namedtuple(
+    typename="CaseMesh",
+    field_names=("volumes", "owner", "neighbour", "areas", "patches"),
+)
+
+MixingMetrics = namedtuple(
+    typename="MixingMetrics",
+    field_names=(
+        "time",
+        "mean",
+        "variance",
+        "segregation",
+        "mixing_index",
+        "interface_area",
+        "outlet_mean",
+        "outlet_segregation",
+    ),
+)
+
+METRICS_FILE = "mixing.csv"
+
+
+def read_patches(case_path: str) -> Dict[str, slice]:
+    entries = foam_dict.load(
+        os.path.join(case_path, "constant", "polyMesh", "boundary")
+    ).entries
+    return {
+        name: slice(patch["startFace"], patch["startFace"] + patch["nFaces"])
+        for name, patch in zip(entries[::2], entries[1::2])
+    }
+
+
+def read_case_mesh(case_path: str) -> CaseMesh:
+    points = read_points(case_path)
+    offsets, values = read_faces(case_path)
+    areas = face_area_vectors(points, offsets, values)
+    owner = read_labels(case_path, "owner")
+    neighbour = read_labels(case_path, "neighbour")
+    return CaseMesh(
+        volumes=cell_volumes(
+            face_centres(points, offsets, values), areas, owner, neighbour
+        ),
+        owner=owner,
+        neighbour=neighbour,
+        areas=areas,
+        patches=read_patches(case_path),
+    )
+
+
+def weighted_moments(
+    values: np.ndarray, weights: np.ndarray
+) -> Tuple[float, float]:
+    total = weights.sum()
+    if total <= 0:
+        return float("nan"), float("nan")
+    mean = float(np.dot(values, weights) / total)
+    variance = float(np.dot((values - mean) ** 2, weights) / total)
+    return mean, variance
+
+
+def segregation(mean: float, variance: float) -> float:
+    limit = mean * (1 - mean)
+    if np.isnan(limit):
+        return float("nan")
+    return variance / limit if limit > 0 else 1.0
+
+
+def mixing_index(intensity: float) -> float:
+    return 1 - float(np.sqrt(intensity))
+
+
+def interface_area(mesh: CaseMesh, alpha: np.ndarray) -> float:
+    internal = len(mesh.neighbour)
+    face_alpha = alpha[mesh.owner]
+    face_alpha[:internal] = 0.5 * (
+        face_alpha[:internal] + alpha[mesh.neighbour]
+    )
+    flux = mesh.areas * face_alpha[:, None]
+    n_cells = len(mesh.volumes)
+    gradients = np.stack(
+        [
+            np.bincount(mesh.owner, flux[:, i], n_cells)
+            - np.bincount(mesh.neighbour, flux[:internal, i], n_cells)
+            for i in range(3)
+        ],
+        axis=1,
+    )
+    return float(np.linalg.norm(gradients, axis=1).sum())
+
+
+def outlet_values(
+    mesh: CaseMesh, field: results.FieldData, alpha: np.ndarray, patch: str
+) -> Tuple[np.ndarray, np.ndarray]:
+    faces = mesh.patches[patch]
+    weights = np.linalg.norm(mesh.areas[faces], axis=1)
+    values = field.boundary.get(patch)
+    if values is None or np.ndim(values) == 0 or len(values) != len(weights):
+        values = alpha[mesh.owner[faces]]
+    return values, weights
+
+
+def field_metrics(
+    mesh: CaseMesh, field: results.FieldData, patch: str = None
+) -> MixingMetrics:
+    alpha = np.clip(field.internal, 0, 1)
+    if alpha.ndim == 0:
+        alpha = np.full(len(mesh.volumes), float(alpha))
+    mean, variance = weighted_moments(alpha, mesh.volumes)
+    intensity = segregation(mean, variance)
+    patch = patch or config.OUTLET_PATCH
+    outlet_mean = outlet_segregation = float("nan")
+    if patch in mesh.patches:
+        outlet_mean, outlet_variance = weighted_moments(
+            *outlet_values(mesh, field, alpha, patch)
+        )
+        outlet_segregation = segregation(outlet_mean, outlet_variance)
+    return MixingMetrics(
+        time=field.time,
+        mean=mean,
+        variance=variance,
+        segregation=intensity,
+        mixing_index=mixing_index(intensity),
+        interface_area=interface_area(mesh, alpha),
+        outlet_mean=outlet_mean,
+        outlet_segregation=outlet_segregation,
+    )
+
+
+def case_metrics(
+    case_path: str, field: str = "alpha.organic", start: float = None
+) -> Tuple[MixingMetrics, ...]:
+    mesh = read_case_mesh(case_path)
+    return tuple(
+        field_metrics(mesh, data)
+        for data in results.iter_field(case_path, field, start)
+    )
+
+
+def write_metrics(case_path: str, metrics: Iterable[MixingMetrics]) -> str:
+    filename = os.path.join(case_path, METRICS_FILE)
+    with open(filename, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(MixingMetrics._fields)
+        writer.writerows(metrics)
+    return filename
+
+
+def read_metrics(case_path: str) -> Tuple[MixingMetrics, ...]:
+    with open(os.path.join(case_path, METRICS_FILE), newline="") as f:
+        rows = csv.reader(f)
+        next(rows)
+        return tuple(MixingMetrics(*map(float, row)) for row in rows)
+
+
+def analyze_case(case_path: str) -> Tuple[MixingMetrics, ...]:
+    metrics = case_metrics(case_path)
+    write_metrics(case_path, metrics)
+    return metrics
+
+
+def analyze_cases(
+    case_paths: Sequence[str], workers: int = None
+) -> Dict[str, Tuple[MixingMetrics, ...]]:
+    with ThreadPoolExecutor(workers or config.ANALYSIS_WORKERS) as executor:
+        return dict(zip(case_paths, executor.map(analyze_case, case_paths)))
+
+
+def mixing_objective(case_path: str) -> float:
+    final = analyze_case(case_path)[-1]
+    for value in (final.outlet_segregation, final.segregation):
+        if not np.isnan(value):
+            return value
+    return 1.0
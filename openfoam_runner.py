@@ -1,7 +1,202 @@
+import asyncio
 import os
 import platform
-import sys
+import shutil
 import subprocess
+import sys
+from typing import Sequence, Tuple
+
+import config
+import foam_dict
+from fields import paint_alpha
+from log_monitor import (
+    LogMonitor,
+    MonitorAction,
+    case_monitor,
+    write_summary,
+)
+from polymesh import polymesh_name
+from runner import run_async, terminate
+
+
+class FoamError(Exception):
+    command: Tuple[str, ...]
+    returncode: int
+    log_path: str
+
+    def __init__(
+        self,
+        message: str,
+        command: Sequence[str] = (),
+        returncode: int = None,
+        log_path: str = None,
+    ):
+        super().__init__(message)
+        self.command = tuple(command)
+        self.returncode = returncode
+        self.log_path = log_path
+
+
+class SolverAborted(FoamError):
+    pass
+
+
+def case_subdomains(case_path: str) -> int:
+    entries = foam_dict.load(
+        os.path.join(case_path, "system", "decomposeParDict")
+    ).entries
+    return int(entries.get("numberOfSubdomains", 1))
+
+
+def mesh_commands(mesh_file: str) -> Tuple[Tuple[str, Tuple[str, ...]], ...]:
+    scale = " ".join(str(config.MESH_SCALE) for _ in range(3))
+    return (
+        ("ideasUnvToFoam", ("ideasUnvToFoam", mesh_file)),
+        ("transformPoints", ("transformPoints", f"scale=({scale})")),
+    )
+
+
+def solver_commands(cores: int) -> Tuple[Tuple[str, Tuple[str, ...]], ...]:
+    if cores > 1:
+        return (
+            ("decomposePar", ("decomposePar", "-force")),
+            (
+                "interFoam",
+                ("mpirun", "-np", str(cores), "interFoam", "-parallel"),
+            ),
+            ("reconstructPar", ("reconstructPar",)),
+        )
+    return (("interFoam", ("interFoam",)),)
+
+
+def solve_commands(
+    mesh_file: str, cores: int
+) -> Tuple[Tuple[str, Tuple[str, ...]], ...]:
+    return (
+        mesh_commands(mesh_file)
+        + (("setFields", ("setFields",)),)
+        + solver_commands(cores)
+    )
+
+
+def copy_polymesh(mesh_file: str, case_path: str) -> bool:
+    source = os.path.join(polymesh_name(mesh_file), "constant", "polyMesh")
+    if not os.path.isdir(source):
+        return False
+    shutil.copytree(
+        source,
+        os.path.join(case_path, "constant", "polyMesh"),
+        dirs_exist_ok=True,
+    )
+    return True
+
+
+def prepare_fields(case_path: str):
+    initial = os.path.join(case_path, "0")
+    shutil.copyfile(
+        os.path.join(initial, "alpha.organic.orig"),
+        os.path.join(initial, "alpha.organic"),
+    )
+
+
+async def run_foam(
+    name: str, args: Sequence[str], case_path: str, timeout: float = None
+) -> str:
+    log_path = os.path.join(case_path, f"log.{name}")
+    try:
+        result = await run_async(args, cwd=case_path, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        raise FoamError(f"{name} timed out", args, log_path=log_path)
+    except OSError as e:
+        raise FoamError(f"Could not start {name}: {e}", args)
+    with open(log_path, "w") as f:
+        f.write(result.stdout)
+        f.write(result.stderr)
+    if result.returncode != 0:
+        raise FoamError(
+            f"{name} exited with status {result.returncode}",
+            args,
+            result.returncode,
+            log_path,
+        )
+    return log_path
+
+
+async def run_monitored(
+    name: str,
+    args: Sequence[str],
+    case_path: str,
+    monitor: LogMonitor,
+    timeout: float = None,
+) -> str:
+    log_path = monitor.path
+    with open(log_path, "wb") as log:
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *args,
+                cwd=case_path,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+                start_new_session=True,
+            )
+        except OSError as e:
+            raise FoamError(f"Could not start {name}: {e}", args)
+        try:
+            returncode = await asyncio.wait_for(
+                monitor.watch(process, case_path), timeout
+            )
+        except asyncio.TimeoutError:
+            await terminate(process, monitor.grace)
+            raise FoamError(f"{name} timed out", args, log_path=log_path)
+        except BaseException:
+            await terminate(process, monitor.grace)
+            raise
+    verdict = monitor.verdict
+    if verdict is not None and verdict.action == MonitorAction.ABORT:
+        raise SolverAborted(
+            f"{name} aborted: {verdict.reason}", args, returncode, log_path
+        )
+    if returncode != 0:
+        raise FoamError(
+            f"{name} exited with status {returncode}",
+            args,
+            returncode,
+            log_path,
+        )
+    return log_path
+
+
+async def solve_case(
+    case_path: str,
+    mesh_file: str,
+    cores: int = None,
+    timeout: float = None,
+    python_fields: bool = None,
+    monitor: LogMonitor = None,
+) -> str:
+    cores = cores or case_subdomains(case_path)
+    timeout = timeout or config.FOAM_TIMEOUT
+    if python_fields is None:
+        python_fields = config.PYTHON_FIELDS
+    prepare_fields(case_path)
+    if not await asyncio.to_thread(copy_polymesh, mesh_file, case_path):
+        for name, args in mesh_commands(mesh_file):
+            await run_foam(name, args, case_path, timeout)
+    if python_fields:
+        await asyncio.to_thread(paint_alpha, case_path)
+    else:
+        await run_foam("setFields", ("setFields",), case_path, timeout)
+    monitor = monitor or case_monitor(case_path)
+    for name, args in solver_commands(cores):
+        if name == "interFoam":
+            try:
+                await run_monitored(name, args, case_path, monitor, timeout)
+            finally:
+                write_summary(case_path, monitor)
+        else:
+            await run_foam(name, args, case_path, timeout)
+    return case_path
+
 
 if __name__ == "__main__":
     home = os.environ["HOME"]
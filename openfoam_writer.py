@@ -1,10 +1,14 @@
 import os
 import shutil
+import tempfile
+import threading
 from collections import namedtuple
-from math import sin, cos, radians
+from concurrent.futures import ThreadPoolExecutor
+from math import sin, cos, radians, ceil, sqrt
 from enum import Enum
-from typing import List, Iterator, Union, Iterable
-from config import TEMPLATE_PATH, CASES_PATH
+from typing import List, Iterator, Union, Iterable, Mapping, Tuple, Dict
+from config import TEMPLATE_PATH, CASES_PATH, CASE_LINK
+import foam_dict
 
 
 class OpenFoamObject(str, Enum):
@@ -18,6 +22,25 @@ class OpenFoamObject(str, Enum):
         return str.__str__(self)
 
 
+class CaseLink(str, Enum):
+    COPY = "copy"
+    HARDLINK = "hardlink"
+    SYMLINK = "symlink"
+
+    def __str__(self):
+        return str.__str__(self)
+
+
+OUTLET_FUNCTIONS = dict(outletAverage="areaAverage", outletCoV="CoV")
+SAMPLE_FUNCTION = "samples"
+
+MUTABLE_PATHS = (
+    "0",
+    os.path.join("system", "controlDict"),
+    os.path.join("system", "decomposeParDict"),
+)
+
+
 Velocity = namedtuple(
     typename="Velocity",
     field_names=("x", "y", "z"),
@@ -25,7 +48,25 @@ Velocity = namedtuple(
 
 
 TemplateComponent = namedtuple(
-    typename="TemplateComponent", field_names=("component_name", "lines")
+    typename="TemplateComponent",
+    field_names=("component_name", "entries", "variables"),
+    defaults=(None,),
+)
+
+
+SamplePlane = namedtuple(
+    typename="SamplePlane", field_names=("name", "point", "normal")
+)
+
+
+CaseResult = namedtuple(
+    typename="CaseResult", field_names=("case_name", "path", "error")
+)
+
+
+CompiledTemplate = namedtuple(
+    typename="CompiledTemplate",
+    field_names=("lines", "start", "components", "by_name", "mtimes"),
 )
 
 
@@ -58,14 +99,12 @@ ChannelVelocity = namedtuple(
 
 
 Case = namedtuple(
-    typename="Case", field_names=("case_name", "solver", "variables")
+    typename="Case",
+    field_names=("case_name", "solver", "variables", "controls"),
+    defaults=(None,),
 )
 
 
-def indent_lines(lines: List[str]):
-    return list(map(lambda x: "    " + x, lines))
-
-
 def foam_string(item: Union[BoundingBox, Velocity]) -> str:
     match type(item).__name__:
         case "BoundingBox":
@@ -93,138 +132,180 @@ def calculate_velocity(
     )
 
 
-def get_template(obj: Union[str, OpenFoamObject]) -> List[str]:
-    template_file = os.path.join(TEMPLATE_PATH, f"{obj}.template")
-    with open(template_file, "r") as f:
+def read_lines(filename: str) -> List[str]:
+    with open(filename, "r") as f:
         return f.readlines()
 
 
-def parse_component(lines: List[str], name: str):
-    ret = None
-    start = lines.index(name)
-    for i, line in enumerate(lines[start:]):
-        if line == "}\n":
-            ret = lines[start:start + i + 1]
-            break
-    return ret
+def read_template_components(
+    template_component_file: str,
+) -> Iterator[TemplateComponent]:
+    entries = foam_dict.load(template_component_file).entries
+    for name, value in entries.items():
+        c = TemplateComponent(str(name), value)
+        yield c._replace(variables=tuple(parse_component_variables(c)))
+
+
+def template_files(
+    obj: Union[str, OpenFoamObject], path: str = TEMPLATE_PATH
+) -> Tuple[str, str]:
+    return (
+        os.path.join(path, f"{obj}.template"),
+        os.path.join(path, f"{obj}_components.template"),
+    )
+
+
+def file_mtime(filename: str):
+    try:
+        return os.stat(filename).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def compile_template(
+    obj: Union[str, OpenFoamObject], path: str = TEMPLATE_PATH
+) -> CompiledTemplate:
+    template_file, component_file = template_files(obj, path)
+    mtimes = (file_mtime(template_file), file_mtime(component_file))
+    lines = tuple(read_lines(template_file))
+    components = ()
+    if mtimes[1] is not None:
+        components = tuple(read_template_components(component_file))
+    return CompiledTemplate(
+        lines=lines,
+        start=get_component_start(lines),
+        components=components,
+        by_name={c.component_name: c for c in components},
+        mtimes=mtimes,
+    )
+
+
+class TemplateCache:
+    path: str
+    compiled: Dict[str, CompiledTemplate]
+
+    def __init__(self, path: str = TEMPLATE_PATH):
+        self.path = path
+        self.compiled = {}
+        self.lock = threading.Lock()
+
+    def get(self, obj: Union[str, OpenFoamObject]) -> CompiledTemplate:
+        key = str(obj)
+        compiled = self.compiled.get(key)
+        mtimes = tuple(map(file_mtime, template_files(key, self.path)))
+        if compiled is None or compiled.mtimes != mtimes:
+            with self.lock:
+                compiled = compile_template(key, self.path)
+                self.compiled[key] = compiled
+        return compiled
+
+    def clear(self):
+        self.compiled.clear()
+
+
+TEMPLATES = TemplateCache()
+
+
+def get_template(obj: Union[str, OpenFoamObject]) -> List[str]:
+    return list(TEMPLATES.get(obj).lines)
 
 
 def parse_template_components(
     obj: Union[str, OpenFoamObject]
 ) -> Iterator[TemplateComponent]:
-    template_component_file = os.path.join(
-        TEMPLATE_PATH, f"{obj}_components.template"
-    )
-    with open(template_component_file, "r") as f:
-        lines = f.readlines()
-    component_names = filter(lambda line: line[0] == "$", lines)
-    for component in component_names:
-        yield TemplateComponent(
-            component.strip("\n"), parse_component(lines, component)
-        )
+    compiled = TEMPLATES.get(obj)
+    if compiled.mtimes[1] is None:
+        raise FileNotFoundError(template_files(obj)[1])
+    yield from compiled.components
+
+
+def macro_names(value) -> Iterator[str]:
+    match value:
+        case foam_dict.Macro():
+            yield value[1:]
+        case dict():
+            for item in value.values():
+                yield from macro_names(item)
+        case list() | tuple():
+            for item in value:
+                yield from macro_names(item)
+        case foam_dict.Field("uniform", item):
+            yield from macro_names(item)
+
+
+def substitute_macros(value, values: Mapping[str, object]):
+    match value:
+        case foam_dict.Macro() if value[1:] in values:
+            return values[value[1:]]
+        case dict():
+            return {k: substitute_macros(v, values) for k, v in value.items()}
+        case list():
+            return [substitute_macros(v, values) for v in value]
+        case tuple() if type(value) is tuple:
+            return tuple(substitute_macros(v, values) for v in value)
+        case foam_dict.Field("uniform", item):
+            return value._replace(value=substitute_macros(item, values))
+    return value
 
 
 def parse_component_variables(component: TemplateComponent) -> Iterator[str]:
-    for line in component.lines[1:]:
-        if "$" in line:
-            split_line = line.split(" ")
-            has_variables = filter(lambda word: len(word) > 0, split_line)
-            variable_name = next(
-                filter(lambda word: word[0] == "$", has_variables)
-            )
-            yield variable_name[1:].split(";")[0]
+    seen = set()
+    for name in macro_names(component.entries):
+        if name not in seen:
+            seen.add(name)
+            yield name
+
+
+def component_variables(component: TemplateComponent) -> Tuple[str, ...]:
+    if component.variables is None:
+        return tuple(parse_component_variables(component))
+    return component.variables
+
+
+def variable_value(obj: str, experiment_variable: ExperimentVariable):
+    value = getattr(experiment_variable.fields, obj, None)
+    if isinstance(value, ChannelVelocity):
+        return foam_dict.Field("uniform", list(calculate_velocity(*value)))
+    return value
 
 
 def replace_variable(
     obj: OpenFoamObject,
     component: TemplateComponent,
     experiment_variable: ExperimentVariable,
-):
-    if "." in str(obj):
-        obj = str(obj).split(".")[0]
-    try:
-        value = getattr(experiment_variable.fields, obj)
-    except AttributeError:
-        value = None
-    match type(value).__name__:
-        case "ChannelVelocity":
-            value = foam_string(calculate_velocity(*value))
-        case _:
-            value = str(value)
-
-    try:
-        if obj == "transportProperties" and experiment_variable.name.split(
-            "_"
-        )[0] in ("organic", "aqueous"):
-            variables = parse_component_variables(component)
-            values = dict(
-                map(
-                    lambda v: (v, getattr(experiment_variable.fields, v)),
-                    variables,
-                )
-            )
-            for i, line in enumerate(component.lines):
-                if i == 0:
-                    line = line.replace(
-                        "$fluid", experiment_variable.name.split("_")[0]
-                    )
-                if "$" in line:
-                    variable = line.split("$")[-1].split(";")[0]
-                    line = line.replace(f"${variable}", str(values[variable]))
-                yield line
-        else:
-            variable = next(parse_component_variables(component))
-
-            for i, line in enumerate(component.lines):
-                if i == 0:
-                    line = line.replace(
-                        f"{experiment_variable.type}_{obj}",
-                        experiment_variable.name,
-                    )
-                if "$" in line:
-                    line = line.replace(
-                        f"${variable}",
-                        value,
-                    )
-                yield line
-    except StopIteration:
-        for i, line in enumerate(component.lines):
-            if i == 0:
-                line = line.replace(
-                    f"{experiment_variable.type}_{obj}",
-                    experiment_variable.name,
-                )
-            yield line
+) -> TemplateComponent:
+    obj = str(obj).split(".")[0]
+    variables = component_variables(component)
+    fluid = experiment_variable.name.split("_")[0]
+    if obj == "transportProperties" and fluid in ("organic", "aqueous"):
+        name = component.component_name.replace("$fluid", fluid)
+        values = {v: getattr(experiment_variable.fields, v) for v in variables}
+    else:
+        name = component.component_name.replace(
+            f"{experiment_variable.type}_{obj}", experiment_variable.name
+        )
+        value = variable_value(obj, experiment_variable)
+        values = {v: value for v in variables[:1]}
+    return TemplateComponent(
+        component_name=name,
+        entries=substitute_macros(component.entries, values),
+        variables=variables,
+    )
 
 
 def insert_experiment_variable(
     obj: Union[str, OpenFoamObject], experiment_variable: ExperimentVariable
-):
-    components = parse_template_components(obj)
+) -> TemplateComponent:
+    compiled = TEMPLATES.get(obj)
     obj = obj.split(".")[0] if "." in obj else obj
-    try:
-        component_to_insert = next(
-            filter(
-                lambda x: x.component_name
-                == f"{experiment_variable.type}_{obj}",
-                components,
-            )
-        )
-        lines = list(
-            replace_variable(obj, component_to_insert, experiment_variable)
-        )
-    except StopIteration:
-        if obj == "transportProperties":
-            component_to_insert = next(parse_template_components(obj))
-            lines = list(
-                replace_variable(obj, component_to_insert, experiment_variable)
-            )
-        else:
-            lines = []
-    return TemplateComponent(
-        component_name=None,
-        lines=lines,
+    component_to_insert = compiled.by_name.get(
+        f"{experiment_variable.type}_{obj}"
     )
+    if component_to_insert is None and obj == "transportProperties":
+        component_to_insert = compiled.components[0]
+    if component_to_insert is None:
+        return TemplateComponent(component_name=None, entries={})
+    return replace_variable(obj, component_to_insert, experiment_variable)
 
 
 def get_component_start(template: List[str]) -> int:
@@ -233,34 +314,153 @@ def get_component_start(template: List[str]) -> int:
             return i
 
 
-def combine_lines(components: Iterable[TemplateComponent]):
-    ret = []
+def combine_entries(
+    components: Iterable[TemplateComponent],
+) -> Dict[str, object]:
+    ret = {}
     for c in components:
-        if c.lines[0] not in ret and c.lines[0][0] != "$":
-            ret += c.lines
+        name = c.component_name
+        if name is not None and name[0] != "$":
+            ret.setdefault(name, c.entries)
     return ret
 
 
+def entry_text(entries: Dict[str, object], level: int) -> List[str]:
+    text = b"".join(foam_dict.entry_lines(entries, level)).decode()
+    if level == 0:
+        text = text.rstrip("\n") + "\n"
+    return text.splitlines(keepends=True)
+
+
+def component_pieces(
+    obj: Union[str, OpenFoamObject], variables: Iterable[ExperimentVariable]
+) -> List[str]:
+    if obj == OpenFoamObject.SET_FIELDS_DICT:
+        boxes = (
+            f"        {foam_string(v.fields.field_box)};"
+            for v in variables
+            if v.fields.field_box is not None
+        )
+        return list(boxes)[::-1]
+    components = (insert_experiment_variable(obj, v) for v in variables)
+    level = 0 if obj == OpenFoamObject.TRANSPORT_PROPERTIES else 1
+    return entry_text(combine_entries(components), level)
+
+
 def replace_variables(
     obj: Union[str, OpenFoamObject], variables: Iterable[ExperimentVariable]
 ):
-    template = get_template(obj)
-    start = get_component_start(template)
-    template.pop(start)
-    if obj == OpenFoamObject.SET_FIELDS_DICT:
-        for v in variables:
-            if v.fields.field_box is not None:
-                template.insert(
-                    start, f"        {foam_string(v.fields.field_box)};"
-                )
-    else:
-        components = (insert_experiment_variable(obj, v) for v in variables)
-        component_lines = combine_lines(components)
-        if obj != OpenFoamObject.TRANSPORT_PROPERTIES:
-            component_lines = indent_lines(component_lines)
-        for i, l in enumerate(component_lines):
-            template.insert(start + i, l)
-    return template
+    compiled = TEMPLATES.get(obj)
+    start = compiled.start
+    return [
+        *compiled.lines[:start],
+        *component_pieces(obj, variables),
+        *compiled.lines[start + 1:],
+    ]
+
+
+def render(
+    obj: Union[str, OpenFoamObject], variables: Iterable[ExperimentVariable]
+) -> str:
+    return "".join(replace_variables(obj, variables))
+
+
+def outlet_functions(
+    patch: str = "outlet", field: str = "alpha.organic"
+) -> Dict[str, Dict[str, object]]:
+    def function(operation: str) -> Dict[str, object]:
+        return dict(
+            type="surfaceFieldValue",
+            libs=[foam_dict.Quoted("libfieldFunctionObjects.so")],
+            writeControl="timeStep",
+            writeInterval=1,
+            log="no",
+            writeFields="no",
+            regionType="patch",
+            name=patch,
+            operation=operation,
+            fields=[field],
+        )
+
+    return {
+        f"functions/{name}": function(operation)
+        for name, operation in OUTLET_FUNCTIONS.items()
+    }
+
+
+def sample_functions(
+    planes: Iterable[SamplePlane],
+    patch: str = "outlet",
+    field: str = "alpha.organic",
+    interval: float = 0.0005,
+    surface_format: str = "raw",
+) -> Dict[str, Dict[str, object]]:
+    surfaces = []
+    for plane in planes:
+        surfaces.extend(
+            (
+                plane.name,
+                dict(
+                    type="cuttingPlane",
+                    planeType="pointAndNormal",
+                    point=list(plane.point),
+                    normal=list(plane.normal),
+                    interpolate=False,
+                ),
+            )
+        )
+    surfaces.extend(
+        (patch, dict(type="patch", patches=[patch], interpolate=False))
+    )
+    return {
+        f"functions/{SAMPLE_FUNCTION}": dict(
+            type="surfaces",
+            libs=[foam_dict.Quoted("libsampling.so")],
+            writeControl="adjustableRunTime",
+            writeInterval=interval,
+            surfaceFormat=surface_format,
+            interpolationScheme="cellPoint",
+            fields=[field],
+            surfaces=surfaces,
+        )
+    }
+
+
+def field_write_controls(
+    end_time: float, writes: int = 1
+) -> Dict[str, object]:
+    return dict(
+        writeControl="adjustableRunTime",
+        writeInterval=end_time / writes,
+    )
+
+
+def write_controls(case_path: str, controls: Mapping[str, object]):
+    foam_dict.update_file(
+        os.path.join(case_path, "system", "controlDict"), controls
+    )
+
+
+def simple_coefficients(cores: int) -> Tuple[int, int, int]:
+    nx = next(n for n in range(ceil(sqrt(cores)), cores + 1) if cores % n == 0)
+    return nx, cores // nx, 1
+
+
+def write_decomposition(
+    case_path: str,
+    cores: int,
+    n: Tuple[int, int, int] = None,
+    method: str = "simple",
+):
+    n = n or simple_coefficients(cores)
+    foam_dict.update_file(
+        os.path.join(case_path, "system", "decomposeParDict"),
+        {
+            "numberOfSubdomains": cores,
+            "method": method,
+            "simpleCoeffs/n": list(n),
+        },
+    )
 
 
 def iter_dir(path: str):
@@ -271,23 +471,103 @@ def iter_dir(path: str):
             yield os.path.join(path, d)
 
 
-def create_case(case: Case, overwrite: bool = False):
-    case_path = os.path.join(CASES_PATH, case.case_name)
+def is_mutable(relative_path: str) -> bool:
+    return any(
+        relative_path == p or relative_path.startswith(p + os.sep)
+        for p in MUTABLE_PATHS
+    )
+
+
+def is_object(path: str) -> bool:
+    return os.path.basename(path) in tuple(OpenFoamObject)
+
+
+def link_file(src: str, dst: str, link: CaseLink):
+    match link:
+        case CaseLink.HARDLINK:
+            try:
+                return os.link(src, dst)
+            except OSError:
+                pass
+        case CaseLink.SYMLINK:
+            return os.symlink(os.path.abspath(src), dst)
+    shutil.copy2(src, dst)
+
+
+def clone_case(base: str, case_path: str, link: CaseLink = CaseLink.COPY):
+    for src in iter_dir(base):
+        relative_path = os.path.relpath(src, base)
+        if is_object(relative_path):
+            continue
+        dst = os.path.join(case_path, relative_path)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        if is_mutable(relative_path):
+            shutil.copy2(src, dst)
+        else:
+            link_file(src, dst, link)
+
+
+def render_case(case: Case, case_path: str, link: CaseLink = CaseLink.COPY):
+    base = os.path.join(TEMPLATE_PATH, case.solver)
+    clone_case(base, case_path, CaseLink(link))
+    for o in filter(is_object, iter_dir(base)):
+        object_path = os.path.join(case_path, os.path.relpath(o, base))
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        text = render(os.path.basename(o), case.variables)
+        with open(object_path, "w") as f:
+            f.write(text)
+    if case.controls:
+        write_controls(case_path, case.controls)
+
+
+def create_case(
+    case: Case,
+    overwrite: bool = False,
+    cases_path: str = None,
+    link: CaseLink = None,
+) -> str:
+    cases_path = cases_path or CASES_PATH
+    case_path = os.path.join(cases_path, case.case_name)
+    if os.path.exists(case_path) and not overwrite:
+        return case_path
+    os.makedirs(cases_path, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=f".{case.case_name}.", dir=cases_path)
     try:
-        shutil.copytree(os.path.join(TEMPLATE_PATH, case.solver), case_path)
-        objects = filter(
-            lambda file: file.split("/")[-1] in tuple(OpenFoamObject),
-            iter_dir(case_path),
+        rendered = os.path.join(staging, case.case_name)
+        render_case(case, rendered, link or CASE_LINK)
+        if os.path.exists(case_path):
+            os.rename(case_path, os.path.join(staging, "replaced"))
+        os.rename(rendered, case_path)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    return case_path
+
+
+def create_case_result(
+    case: Case, overwrite: bool, cases_path: str, link: CaseLink
+) -> CaseResult:
+    try:
+        path = create_case(case, overwrite, cases_path, link)
+    except Exception as e:
+        return CaseResult(case_name=case.case_name, path=None, error=e)
+    return CaseResult(case_name=case.case_name, path=path, error=None)
+
+
+def create_cases(
+    cases: Iterable[Case],
+    workers: int = None,
+    overwrite: bool = False,
+    cases_path: str = None,
+    link: CaseLink = None,
+) -> Tuple[CaseResult, ...]:
+    for obj in OpenFoamObject:
+        TEMPLATES.get(obj)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return tuple(
+            pool.map(
+                lambda case: create_case_result(
+                    case, overwrite, cases_path, link
+                ),
+                cases,
+            )
         )
-        for o in objects:
-            object_name = o.split("/")[-1]
-            lines = replace_variables(object_name, case.variables)
-            with open(o, "w") as f:
-                f.writelines(lines)
-
-    except FileExistsError:
-        if overwrite:
-            shutil.rmtree(case_path)
-            create_case(case)
-        else:
-            return
@@ -0,0 +1,487 @@
+import asyncio
+from collections import namedtuple
+from contextlib import nullcontext
+from functools import partial
+from time import perf_counter, time
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+import archive
+import config
+import mesh_quality
+import openfoam_runner
+import openfoam_writer
+from decomposition import apply_decomposition, choose_decomposition
+from design import (
+    Design,
+    MeshSettings,
+    design_case,
+    design_lattice,
+    design_name,
+    residence_time,
+)
+from ledger import Ledger, worker_id
+from log_monitor import OutletTracker, case_monitor
+from mesh_store import MeshGeometry, MeshStore, report_cells
+from mixing import analyze_case
+from scheduler import ResourceScheduler
+
+Stage = namedtuple(
+    typename="Stage", field_names=("name", "func", "concurrency")
+)
+
+StageStats = namedtuple(
+    typename="StageStats",
+    field_names=("name", "completed", "failed", "busy_seconds", "utilization"),
+)
+
+PipelineReport = namedtuple(
+    typename="PipelineReport",
+    field_names=(
+        "jobs",
+        "completed",
+        "failed",
+        "wall_seconds",
+        "throughput",
+        "stages",
+        "resources",
+    ),
+    defaults=(None,),
+)
+
+DEFAULT_CONCURRENCY = dict(
+    lattice=8,
+    mesh=4,
+    quality=4,
+    case=8,
+    solve=2,
+    analysis=4,
+    compaction=2,
+)
+
+
+class Job:
+    design: Design
+    design_id: str
+    artifacts: Dict[str, object]
+    timings: Dict[str, float]
+    completed_stages: Set[str]
+    error: Exception
+    failed_stage: str
+
+    def __init__(
+        self,
+        design: Design,
+        artifacts: Dict[str, object] = None,
+        completed_stages: Iterable[str] = (),
+    ):
+        self.design = design
+        self.design_id = design_name(design)
+        self.artifacts = dict(artifacts or {})
+        self.timings = {}
+        self.completed_stages = set(completed_stages)
+        self.error = None
+        self.failed_stage = None
+
+    @property
+    def failed(self) -> bool:
+        return self.error is not None
+
+
+class PipelineListener:
+    def stage_completed(
+        self, job: Job, stage: Stage, started: float, seconds: float
+    ):
+        pass
+
+    def job_finished(self, job: Job):
+        pass
+
+
+_DONE = object()
+
+
+class StageCounter:
+    def __init__(self, stage: Stage):
+        self.stage = stage
+        self.completed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+
+    def stats(self, wall_seconds: float) -> StageStats:
+        capacity = wall_seconds * self.stage.concurrency
+        return StageStats(
+            name=self.stage.name,
+            completed=self.completed,
+            failed=self.failed,
+            busy_seconds=round(self.busy_seconds, 6),
+            utilization=(
+                round(self.busy_seconds / capacity, 4) if capacity > 0 else 0.0
+            ),
+        )
+
+
+async def run_stage_job(
+    stage: Stage, job: Job, counter: StageCounter, listener: PipelineListener
+):
+    started = time()
+    start = perf_counter()
+    try:
+        await stage.func(job)
+    except Exception as e:
+        job.error = e
+        job.failed_stage = stage.name
+        counter.failed += 1
+    else:
+        counter.completed += 1
+        job.completed_stages.add(stage.name)
+    finally:
+        elapsed = perf_counter() - start
+        job.timings[stage.name] = elapsed
+        counter.busy_seconds += elapsed
+    if not job.failed:
+        listener.stage_completed(job, stage, started, elapsed)
+
+
+async def stage_worker(
+    stage: Stage,
+    inbox: asyncio.Queue,
+    outbox: asyncio.Queue,
+    counter: StageCounter,
+    listener: PipelineListener,
+):
+    while True:
+        job = await inbox.get()
+        if job is _DONE:
+            return
+        if not job.failed and stage.name not in job.completed_stages:
+            await run_stage_job(stage, job, counter, listener)
+        await outbox.put(job)
+
+
+async def run_stage(
+    stage: Stage,
+    inbox: asyncio.Queue,
+    outbox: asyncio.Queue,
+    counter: StageCounter,
+    downstream_workers: int,
+    listener: PipelineListener,
+):
+    await asyncio.gather(
+        *(
+            stage_worker(stage, inbox, outbox, counter, listener)
+            for _ in range(stage.concurrency)
+        )
+    )
+    for _ in range(downstream_workers):
+        await outbox.put(_DONE)
+
+
+async def feed(jobs: Iterable[Job], outbox: asyncio.Queue, workers: int):
+    for job in jobs:
+        await outbox.put(job)
+    for _ in range(workers):
+        await outbox.put(_DONE)
+
+
+async def collect(
+    inbox: asyncio.Queue,
+    listener: PipelineListener,
+    store: MeshStore = None,
+) -> List[Job]:
+    finished = []
+    item = await inbox.get()
+    while item is not _DONE:
+        if store is not None and "mesh" in item.artifacts:
+            await asyncio.to_thread(store.release, item.design_id)
+        listener.job_finished(item)
+        finished.append(item)
+        item = await inbox.get()
+    return finished
+
+
+async def run_jobs(
+    jobs: Iterable[Job],
+    stages: Iterable[Stage],
+    listener: PipelineListener = None,
+    store: MeshStore = None,
+) -> Tuple[List[Job], PipelineReport]:
+    stages = tuple(stages)
+    listener = listener or PipelineListener()
+    counters = tuple(StageCounter(stage) for stage in stages)
+    queues = [asyncio.Queue(maxsize=stage.concurrency) for stage in stages]
+    queues.append(asyncio.Queue())
+    downstream = tuple(stage.concurrency for stage in stages[1:]) + (1,)
+    start = perf_counter()
+    *_, finished = await asyncio.gather(
+        feed(jobs, queues[0], stages[0].concurrency),
+        *(
+            run_stage(
+                stage, queues[i], queues[i + 1], counters[i], n, listener
+            )
+            for i, (stage, n) in enumerate(zip(stages, downstream))
+        ),
+        collect(queues[-1], listener, store),
+    )
+    wall_seconds = perf_counter() - start
+    completed = sum(not job.failed for job in finished)
+    return finished, PipelineReport(
+        jobs=len(finished),
+        completed=completed,
+        failed=len(finished) - completed,
+        wall_seconds=round(wall_seconds, 6),
+        throughput=(
+            round(completed / wall_seconds, 6) if wall_seconds > 0 else 0.0
+        ),
+        stages=tuple(c.stats(wall_seconds) for c in counters),
+    )
+
+
+async def run_pipeline(
+    designs: Iterable[Design],
+    stages: Iterable[Stage],
+    listener: PipelineListener = None,
+    store: MeshStore = None,
+) -> Tuple[List[Job], PipelineReport]:
+    return await run_jobs((Job(d) for d in designs), stages, listener, store)
+
+
+class LedgerListener(PipelineListener):
+    ledger: Ledger
+    worker: str
+    active: Set[str]
+
+    def __init__(self, ledger: Ledger, worker: str = None):
+        self.ledger = ledger
+        self.worker = worker or worker_id()
+        self.active = set()
+
+    def claimed_jobs(self) -> Iterator[Job]:
+        claimed = self.ledger.claim(self.worker)
+        while claimed is not None:
+            self.active.add(claimed.design_id)
+            yield Job(
+                claimed.design,
+                artifacts=claimed.artifacts,
+                completed_stages=claimed.completed_stages,
+            )
+            claimed = self.ledger.claim(self.worker)
+
+    def stage_completed(
+        self, job: Job, stage: Stage, started: float, seconds: float
+    ):
+        self.ledger.complete_stage(
+            job.design_id,
+            self.worker,
+            stage.name,
+            started,
+            seconds,
+            job.artifacts,
+        )
+
+    def job_finished(self, job: Job):
+        if job.failed:
+            self.ledger.fail(
+                job.design_id,
+                self.worker,
+                f"{job.failed_stage}: {job.error!r}",
+            )
+        else:
+            self.ledger.finish(job.design_id, self.worker)
+        self.active.discard(job.design_id)
+
+    async def heartbeat(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            self.ledger.heartbeat(tuple(self.active), self.worker)
+
+
+async def run_ledger(
+    ledger: Ledger,
+    stages: Iterable[Stage],
+    worker: str = None,
+    heartbeat_interval: float = None,
+    store: MeshStore = None,
+) -> Tuple[List[Job], PipelineReport]:
+    listener = LedgerListener(ledger, worker)
+    interval = heartbeat_interval or ledger.stale_after / 4
+    heartbeat = asyncio.create_task(listener.heartbeat(interval))
+    try:
+        return await run_jobs(listener.claimed_jobs(), stages, listener, store)
+    finally:
+        heartbeat.cancel()
+
+
+async def lattice_stage(job: Job):
+    job.artifacts["lattice"] = design_lattice(job.design)
+
+
+def design_geometry(design: Design) -> MeshGeometry:
+    return MeshGeometry(
+        lattice_structure=tuple(design.lattice_structure),
+        channel_spacing=design.channel_spacing,
+        channel_width=design.channel_width,
+        channel_height=design.channel_height,
+    )
+
+
+def reservation(scheduler: ResourceScheduler, cores: int, memory: int):
+    if scheduler is None:
+        return nullcontext()
+    return scheduler.reserve(cores, memory)
+
+
+async def mesh_stage(
+    job: Job,
+    scheduler: ResourceScheduler = None,
+    store: MeshStore = None,
+    command: Sequence[str] = None,
+):
+    store = store or MeshStore()
+    async with reservation(scheduler, config.MESH_CORES, config.MESH_MEMORY):
+        job.artifacts["mesh"] = await store.get_or_create_async(
+            design_geometry(job.design), holder=job.design_id, command=command
+        )
+
+
+async def quality_stage(
+    job: Job,
+    scheduler: ResourceScheduler = None,
+    store: MeshStore = None,
+    command: Sequence[str] = None,
+):
+    if not config.MESH_QUALITY_CHECK:
+        return
+    settings = MeshSettings()
+    for attempt in range(config.MESH_REMESH_ATTEMPTS + 1):
+        report = await asyncio.to_thread(
+            mesh_quality.check_mesh, job.artifacts["mesh"]
+        )
+        job.artifacts["quality"] = mesh_quality.report_dict(report)
+        if report.passed:
+            return
+        settings = mesh_quality.remesh_settings(settings)
+        if settings is None or attempt == config.MESH_REMESH_ATTEMPTS:
+            break
+        store = store or MeshStore()
+        async with reservation(
+            scheduler, config.MESH_CORES, config.MESH_MEMORY
+        ):
+            job.artifacts["mesh"] = await store.get_or_create_async(
+                design_geometry(job.design),
+                settings,
+                holder=job.design_id,
+                command=command,
+            )
+        job.artifacts["mesh_settings"] = settings._asdict()
+    raise mesh_quality.MeshQualityError(mesh_quality.failure_message(report))
+
+
+async def case_stage(job: Job, scheduler: ResourceScheduler = None):
+    case_path = await asyncio.to_thread(
+        openfoam_writer.create_case,
+        design_case(job.design, reduced=config.PIPELINE_REDUCED_OUTPUT),
+        True,
+    )
+    mesh = job.artifacts.get("mesh")
+    decomposition = choose_decomposition(
+        job.design,
+        cells=report_cells(mesh) if mesh else None,
+        max_cores=scheduler.solve_cores() if scheduler else None,
+    )
+    apply_decomposition(case_path, decomposition)
+    job.artifacts["case"] = case_path
+    job.artifacts["decomposition"] = decomposition._asdict()
+
+
+async def solve_stage(
+    job: Job,
+    scheduler: ResourceScheduler = None,
+    trackers: Callable[[Job], Sequence[OutletTracker]] = None,
+):
+    case_path = job.artifacts["case"]
+    cores = openfoam_runner.case_subdomains(case_path)
+    memory = cores * config.SOLVE_MEMORY_PER_CORE
+    monitor = case_monitor(
+        case_path,
+        min_time=config.STEADY_RESIDENCE_TIMES * residence_time(job.design),
+        trackers=trackers(job) if trackers else (),
+    )
+    async with reservation(scheduler, cores, memory):
+        job.artifacts["cores"] = cores
+        try:
+            job.artifacts["solution"] = await openfoam_runner.solve_case(
+                case_path, job.artifacts["mesh"], cores, monitor=monitor
+            )
+        finally:
+            job.artifacts["monitor"] = monitor.summary()
+
+
+async def analysis_stage(job: Job):
+    metrics = await asyncio.to_thread(analyze_case, job.artifacts["case"])
+    job.artifacts["mixing"] = metrics[-1]._asdict() if metrics else None
+
+
+async def compaction_stage(job: Job):
+    report = await asyncio.to_thread(
+        archive.compact_case, job.artifacts["case"]
+    )
+    job.artifacts["archive"] = report._asdict()
+
+
+def default_stages(
+    concurrency: Mapping[str, int] = None,
+    scheduler: ResourceScheduler = None,
+    trackers: Callable[[Job], Sequence[OutletTracker]] = None,
+    store: MeshStore = None,
+) -> Tuple[Stage]:
+    limits = dict(DEFAULT_CONCURRENCY, **(concurrency or {}))
+    funcs = dict(
+        lattice=lattice_stage,
+        mesh=partial(mesh_stage, scheduler=scheduler, store=store),
+        quality=partial(quality_stage, scheduler=scheduler, store=store),
+        case=partial(case_stage, scheduler=scheduler),
+        solve=partial(solve_stage, scheduler=scheduler, trackers=trackers),
+        analysis=analysis_stage,
+        compaction=compaction_stage,
+    )
+    return tuple(
+        Stage(name=name, func=func, concurrency=limits[name])
+        for name, func in funcs.items()
+    )
+
+
+def run_designs(
+    designs: Iterable[Design],
+    concurrency: Mapping[str, int] = None,
+    scheduler: ResourceScheduler = None,
+) -> Tuple[List[Job], PipelineReport]:
+    scheduler = scheduler or ResourceScheduler()
+    store = MeshStore()
+    stages = default_stages(concurrency, scheduler, store=store)
+    jobs, report = asyncio.run(run_pipeline(designs, stages, store=store))
+    return jobs, report._replace(resources=scheduler.stats())
+
+
+def resume_designs(
+    designs: Iterable[Design] = (),
+    concurrency: Mapping[str, int] = None,
+    ledger_path: str = None,
+    scheduler: ResourceScheduler = None,
+) -> Tuple[List[Job], PipelineReport]:
+    ledger = Ledger(ledger_path)
+    ledger.add(designs)
+    scheduler = scheduler or ResourceScheduler()
+    store = MeshStore()
+    stages = default_stages(concurrency, scheduler, store=store)
+    jobs, report = asyncio.run(run_ledger(ledger, stages, store=store))
+    return jobs, report._replace(resources=scheduler.stats())
@@ -0,0 +1,396 @@
+import os
+import re
+from collections import namedtuple
+from typing import Dict, Iterable, Mapping, Tuple
+
+import numpy as np
+
+import unv
+from foam_dict import header_dtypes
+
+TET_FACES = np.array(((1, 2, 3), (0, 3, 2), (0, 1, 3), (0, 2, 1)))
+
+DEFAULT_PATCH = "defaultFaces"
+
+WALL_PATCHES = ("walls",)
+
+
+PolyMesh = namedtuple(
+    typename="PolyMesh",
+    field_names=("points", "faces", "owner", "neighbour", "patches"),
+)
+
+Patch = namedtuple(
+    typename="Patch", field_names=("name", "type", "n_faces", "start_face")
+)
+
+
+class PolyMeshError(Exception):
+    pass
+
+
+FOAM_HEADER = re.compile(rb"FoamFile\s*\{(.*?)\}", re.S)
+HEADER_ENTRY = re.compile(rb"(\w+)\s+([^;]*);")
+LIST_START = re.compile(rb"(\d+)\s*\(")
+
+
+def foam_header(cls: str, obj: str, note: str = None) -> str:
+    lines = [
+        "FoamFile\n",
+        "{\n",
+        "    format      ascii;\n",
+        f"    class       {cls};\n",
+    ]
+    if note is not None:
+        lines.append(f'    note        "{note}";\n')
+    lines += [
+        '    location    "constant/polyMesh";\n',
+        f"    object      {obj};\n",
+        "}\n\n",
+    ]
+    return "".join(lines)
+
+
+def face_keys(faces: np.ndarray) -> np.ndarray:
+    return np.sort(faces, axis=1)
+
+
+def orient_outward(
+    points: np.ndarray, faces: np.ndarray, cell_centres: np.ndarray
+) -> np.ndarray:
+    corners = points[faces]
+    normals = np.cross(
+        corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0]
+    )
+    outward = corners.mean(axis=1) - cell_centres
+    flip = np.einsum("ij,ij->i", normals, outward) < 0
+    faces = faces.copy()
+    faces[flip] = faces[flip][:, ::-1]
+    return faces
+
+
+def unique_faces(
+    keys: np.ndarray, n_points: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    if n_points**3 < np.iinfo(np.int64).max:
+        codes = (keys[:, 0] * n_points + keys[:, 1]) * n_points + keys[:, 2]
+        _, inverse, counts = np.unique(
+            codes, return_inverse=True, return_counts=True
+        )
+        return inverse, counts
+    _, inverse, counts = np.unique(
+        keys, axis=0, return_inverse=True, return_counts=True
+    )
+    return inverse.reshape(-1), counts
+
+
+def tet_faces(points: np.ndarray, tets: np.ndarray):
+    faces = tets[:, TET_FACES].reshape(-1, 3)
+    cells = np.repeat(np.arange(len(tets)), len(TET_FACES))
+    cell_centres = points[tets].mean(axis=1)
+    return orient_outward(points, faces, cell_centres[cells]), cells
+
+
+def patch_type(name: str) -> str:
+    return "wall" if name in WALL_PATCHES else "patch"
+
+
+def assign_patches(
+    boundary_keys: np.ndarray, groups: Mapping[str, np.ndarray]
+) -> np.ndarray:
+    names = tuple(groups)
+    patch_ids = np.full(len(boundary_keys), len(names), dtype=np.int64)
+    if len(names) == 0:
+        return patch_ids
+    group_keys = [face_keys(np.asarray(groups[n])) for n in names]
+    group_ids = np.concatenate(
+        [np.full(len(k), i) for i, k in enumerate(group_keys)]
+    )
+    all_keys = np.concatenate([boundary_keys] + group_keys)
+    _, inverse = np.unique(all_keys, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    lookup = np.full(inverse.max() + 1, -1, dtype=np.int64)
+    lookup[inverse[: len(boundary_keys)]] = np.arange(len(boundary_keys))
+    matched = lookup[inverse[len(boundary_keys) :]]
+    if np.any(matched < 0):
+        raise PolyMeshError("Group face is not on the mesh boundary")
+    patch_ids[matched] = group_ids
+    return patch_ids
+
+
+def build_polymesh(
+    points: np.ndarray,
+    tets: np.ndarray,
+    groups: Mapping[str, np.ndarray] = None,
+) -> PolyMesh:
+    groups = groups or {}
+    points = np.asarray(points, dtype=np.float64)
+    tets = np.asarray(tets, dtype=np.int64)
+    faces, cells = tet_faces(points, tets)
+    inverse, counts = unique_faces(face_keys(faces), len(points))
+    if np.any(counts > 2):
+        raise PolyMeshError("Face shared by more than two cells")
+
+    order = np.argsort(inverse, kind="stable")
+    first = order[np.concatenate(([0], np.cumsum(counts)[:-1]))]
+    internal = counts == 2
+    second = np.full(len(counts), -1, dtype=np.int64)
+    second[internal] = order[np.cumsum(counts)[internal] - 1]
+
+    internal_first = first[internal]
+    internal_second = second[internal]
+    swap = cells[internal_first] > cells[internal_second]
+    owner_faces = np.where(swap, internal_second, internal_first)
+    neighbour_faces = np.where(swap, internal_first, internal_second)
+    owner = cells[owner_faces]
+    neighbour = cells[neighbour_faces]
+    internal_order = np.lexsort((neighbour, owner))
+    owner = owner[internal_order]
+    neighbour = neighbour[internal_order]
+    internal_faces = faces[owner_faces[internal_order]]
+
+    boundary_faces_index = first[~internal]
+    boundary_faces = faces[boundary_faces_index]
+    boundary_owner = cells[boundary_faces_index]
+    names = tuple(groups) + (DEFAULT_PATCH,)
+    patch_ids = assign_patches(face_keys(boundary_faces), groups)
+    boundary_order = np.lexsort((boundary_owner, patch_ids))
+    patch_counts = np.bincount(patch_ids, minlength=len(names))
+
+    def patch_gen() -> Iterable[Patch]:
+        start = len(owner)
+        for name, count in zip(names, patch_counts):
+            if count == 0 and name == DEFAULT_PATCH:
+                continue
+            yield Patch(name, patch_type(name), int(count), start)
+            start += int(count)
+
+    return PolyMesh(
+        points=points,
+        faces=np.concatenate((internal_faces, boundary_faces[boundary_order])),
+        owner=np.concatenate((owner, boundary_owner[boundary_order])),
+        neighbour=neighbour,
+        patches=tuple(patch_gen()),
+    )
+
+
+def write_list(f, values: np.ndarray, fmt: str):
+    f.write(f"{len(values)}\n(\n")
+    np.savetxt(f, values, fmt=fmt)
+    f.write(")\n")
+
+
+def mesh_note(mesh: PolyMesh) -> str:
+    return (
+        f"nPoints:{len(mesh.points)} "
+        f"nCells:{int(mesh.owner.max()) + 1} "
+        f"nFaces:{len(mesh.faces)} "
+        f"nInternalFaces:{len(mesh.neighbour)}"
+    )
+
+
+def boundary_string(patches: Iterable[Patch]) -> str:
+    patches = tuple(patches)
+    lines = [f"{len(patches)}\n(\n"]
+    for p in patches:
+        lines += [
+            f"    {p.name}\n",
+            "    {\n",
+            f"        type            {p.type};\n",
+            f"        nFaces          {p.n_faces};\n",
+            f"        startFace       {p.start_face};\n",
+            "    }\n",
+        ]
+    lines.append(")\n")
+    return "".join(lines)
+
+
+def write_polymesh(mesh: PolyMesh, case_path: str, scale: float = 1) -> str:
+    mesh_path = os.path.join(case_path, "constant", "polyMesh")
+    os.makedirs(mesh_path, exist_ok=True)
+    note = mesh_note(mesh)
+    with open(os.path.join(mesh_path, "points"), "w") as f:
+        f.write(foam_header("vectorField", "points"))
+        write_list(f, mesh.points * scale, "(%.10g %.10g %.10g)")
+    with open(os.path.join(mesh_path, "faces"), "w") as f:
+        f.write(foam_header("faceList", "faces"))
+        write_list(f, mesh.faces, "3(%d %d %d)")
+    with open(os.path.join(mesh_path, "owner"), "w") as f:
+        f.write(foam_header("labelList", "owner", note))
+        write_list(f, mesh.owner, "%d")
+    with open(os.path.join(mesh_path, "neighbour"), "w") as f:
+        f.write(foam_header("labelList", "neighbour", note))
+        write_list(f, mesh.neighbour, "%d")
+    with open(os.path.join(mesh_path, "boundary"), "w") as f:
+        f.write(foam_header("polyBoundaryMesh", "boundary"))
+        f.write(boundary_string(mesh.patches))
+    return mesh_path
+
+
+def export_polymesh(
+    points: np.ndarray,
+    tets: np.ndarray,
+    groups: Dict[str, np.ndarray],
+    case_path: str,
+    scale: float = 1,
+) -> PolyMesh:
+    mesh = build_polymesh(points, tets, groups)
+    write_polymesh(mesh, case_path, scale)
+    return mesh
+
+
+def polymesh_name(mesh_filename: str) -> str:
+    return f"{os.path.splitext(mesh_filename)[0]}.polyMesh"
+
+
+def unv_polymesh(mesh_file: str, case_path: str, scale: float = 1) -> PolyMesh:
+    mesh = unv.load(mesh_file)
+    return export_polymesh(
+        points=mesh.points,
+        tets=unv.tetrahedra(mesh),
+        groups=unv.face_groups(mesh),
+        case_path=case_path,
+        scale=scale,
+    )
+
+
+def binary_list(values: np.ndarray) -> bytes:
+    values = np.ascontiguousarray(values)
+    return f"{len(values)}\n(".encode() + values.tobytes() + b")\n"
+
+
+def read_header(data: bytes) -> Tuple[Dict[str, str], int]:
+    match = FOAM_HEADER.search(data)
+    if match is None:
+        raise PolyMeshError("Missing FoamFile header")
+    header = {
+        k.decode(): v.decode().strip().strip('"')
+        for k, v in HEADER_ENTRY.findall(match.group(1))
+    }
+    return header, match.end()
+
+
+def ascii_numbers(data: bytes, dtype) -> np.ndarray:
+    text = data.replace(b"(", b" ").replace(b")", b" ")
+    return np.array(text.split(), dtype=dtype)
+
+
+def read_list_at(
+    data: bytes, pos: int, binary: bool, dtype, width: int = 1
+) -> Tuple[np.ndarray, int]:
+    match = LIST_START.search(data, pos)
+    if match is None:
+        raise PolyMeshError("Missing list")
+    n, start = int(match.group(1)), match.end()
+    if binary:
+        count = n * width
+        values = np.frombuffer(data, dtype, count, offset=start)
+        end = start + count * values.itemsize + 1
+    else:
+        end = data.index(b"\n)", start) + 2
+        values = ascii_numbers(data[start : end - 1], dtype)
+    if width > 1:
+        values = values.reshape(n, width)
+    return values, end
+
+
+def read_mesh_file(case_path: str, name: str) -> Tuple[bytes, dict, int]:
+    filename = os.path.join(case_path, "constant", "polyMesh", name)
+    with open(filename, "rb") as f:
+        data = f.read()
+    header, pos = read_header(data)
+    return data, header, pos
+
+
+def read_points(case_path: str) -> np.ndarray:
+    data, header, pos = read_mesh_file(case_path, "points")
+    _, scalar = header_dtypes(header)
+    binary = header.get("format") == "binary"
+    return read_list_at(data, pos, binary, scalar, 3)[0].astype(np.float64)
+
+
+def read_labels(case_path: str, name: str) -> np.ndarray:
+    data, header, pos = read_mesh_file(case_path, name)
+    label, _ = header_dtypes(header)
+    binary = header.get("format") == "binary"
+    return read_list_at(data, pos, binary, label)[0].astype(np.int64)
+
+
+def read_faces(case_path: str) -> Tuple[np.ndarray, np.ndarray]:
+    data, header, pos = read_mesh_file(case_path, "faces")
+    label, _ = header_dtypes(header)
+    if header.get("format") == "binary":
+        offsets, pos = read_list_at(data, pos, True, label)
+        values, _ = read_list_at(data, pos, True, label)
+        return offsets.astype(np.int64), values.astype(np.int64)
+    tokens, _ = read_list_at(data, pos, False, np.int64)
+    if len(tokens) and np.all(tokens[::4] == 3):
+        values = tokens.reshape(-1, 4)[:, 1:].reshape(-1)
+        offsets = np.arange(0, len(values) + 1, 3)
+        return offsets, values
+    sizes, values, i = [], [], 0
+    while i < len(tokens):
+        sizes.append(tokens[i])
+        values.append(tokens[i + 1 : i + 1 + tokens[i]])
+        i += tokens[i] + 1
+    offsets = np.concatenate(([0], np.cumsum(sizes)))
+    return offsets, np.concatenate(values)
+
+
+def face_centres(
+    points: np.ndarray, offsets: np.ndarray, values: np.ndarray
+) -> np.ndarray:
+    sums = np.add.reduceat(points[values], offsets[:-1], axis=0)
+    return sums / np.diff(offsets)[:, None]
+
+
+def face_area_vectors(
+    points: np.ndarray, offsets: np.ndarray, values: np.ndarray
+) -> np.ndarray:
+    centres = face_centres(points, offsets, values)
+    following = np.arange(1, len(values) + 1)
+    following[offsets[1:] - 1] = offsets[:-1]
+    relative = points[values] - np.repeat(centres, np.diff(offsets), axis=0)
+    crosses = np.cross(relative, relative[following])
+    return 0.5 * np.add.reduceat(crosses, offsets[:-1], axis=0)
+
+
+def cell_volumes(
+    centres: np.ndarray,
+    areas: np.ndarray,
+    owner: np.ndarray,
+    neighbour: np.ndarray,
+) -> np.ndarray:
+    flux = np.einsum("ij,ij->i", centres, areas) / 3
+    n_cells = int(max(owner.max(), neighbour.max(initial=0))) + 1
+    return np.bincount(owner, flux[: len(owner)], n_cells) - np.bincount(
+        neighbour, flux[: len(neighbour)], n_cells
+    )
+
+
+def face_average(
+    centres: np.ndarray, owner: np.ndarray, neighbour: np.ndarray
+) -> np.ndarray:
+    cells = np.concatenate((owner, neighbour))
+    centres = np.concatenate(
+        (centres[: len(owner)], centres[: len(neighbour)])
+    )
+    n_cells = int(cells.max()) + 1
+    counts = np.bincount(cells, minlength=n_cells)
+    return (
+        np.stack(
+            [
+                np.bincount(cells, weights=centres[:, i], minlength=n_cells)
+                for i in range(3)
+            ],
+            axis=1,
+        )
+        / counts[:, None]
+    )
+
+
+def cell_centres(case_path: str) -> np.ndarray:
+    centres = face_centres(read_points(case_path), *read_faces(case_path))
+    owner = read_labels(case_path, "owner")
+    neighbour = read_labels(case_path, "neighbour")
+    return face_average(centres, owner, neighbour)
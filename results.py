@@ -0,0 +1,207 @@
+import glob
+import itertools
+import mmap
+import os
+from collections import namedtuple
+from typing import Dict, Iterator, Sequence, Tuple, Union
+
+import numpy as np
+
+import foam_dict
+from openfoam_writer import SAMPLE_FUNCTION
+
+FieldData = namedtuple(
+    typename="FieldData",
+    field_names=("name", "time", "field_class", "internal", "boundary"),
+)
+
+
+SAMPLES_FILE = "samples.npz"
+
+SurfaceSample = namedtuple(
+    typename="SurfaceSample",
+    field_names=("surface", "time", "points", "values"),
+)
+
+
+def map_file(filename: str) -> mmap.mmap:
+    with open(filename, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def field_array(value) -> Union[np.ndarray, None]:
+    if isinstance(value, foam_dict.Field):
+        return np.asarray(value.value)
+    return None
+
+
+def field_data(
+    foam_file: foam_dict.FoamFile, filename: str, time: float = None
+) -> FieldData:
+    field_class = foam_file.header.get("class", "")
+    if not field_class.startswith("vol"):
+        raise foam_dict.FoamDictError(
+            f"{filename} is not a volume field: {field_class}"
+        )
+    boundary = foam_file.entries.get("boundaryField", {})
+    return FieldData(
+        name=os.path.basename(filename),
+        time=time,
+        field_class=field_class,
+        internal=field_array(foam_file.entries.get("internalField")),
+        boundary={
+            patch: field_array(entries.get("value"))
+            for patch, entries in boundary.items()
+            if isinstance(entries, dict)
+        },
+    )
+
+
+def read_field(filename: str, time: float = None) -> FieldData:
+    return field_data(
+        foam_dict.parse_buffer(map_file(filename)), filename, time
+    )
+
+
+def time_directories(case_path: str) -> Tuple[Tuple[float, str], ...]:
+    def time_gen() -> Iterator[Tuple[float, str]]:
+        for name in os.listdir(case_path):
+            path = os.path.join(case_path, name)
+            try:
+                time = float(name)
+            except ValueError:
+                continue
+            if os.path.isdir(path):
+                yield time, path
+
+    return tuple(sorted(time_gen()))
+
+
+def iter_field(
+    case_path: str, name: str, start: float = None, end: float = None
+) -> Iterator[FieldData]:
+    for time, path in time_directories(case_path):
+        filename = os.path.join(path, name)
+        if start is not None and time < start:
+            continue
+        if end is not None and time > end:
+            break
+        if os.path.isfile(filename):
+            yield read_field(filename, time)
+
+
+def read_fields(
+    case_path: str, names: Tuple[str, ...], time: float
+) -> Dict[str, FieldData]:
+    path = next(p for t, p in time_directories(case_path) if t == time)
+    return {name: read_field(os.path.join(path, name), time) for name in names}
+
+
+def post_processing_directories(
+    case_path: str, function: str
+) -> Tuple[Tuple[float, str], ...]:
+    path = os.path.join(case_path, "postProcessing", function)
+    if not os.path.isdir(path):
+        return ()
+    return time_directories(path)
+
+
+def read_raw(filename: str) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    with open(filename) as f:
+        columns = []
+        for line in f:
+            if not line.startswith("#"):
+                break
+            columns = line[1:].split()
+        else:
+            line = ""
+        data = np.loadtxt(itertools.chain((line,), f), ndmin=2, comments="#")
+    data = data.reshape(-1, max(len(columns), 3))
+    return data[:, :3], {
+        name: data[:, i] for i, name in enumerate(columns[3:], 3)
+    }
+
+
+def read_surface(filename: str, time: float = None) -> SurfaceSample:
+    points, values = read_raw(filename)
+    return SurfaceSample(
+        surface=os.path.splitext(os.path.basename(filename))[0],
+        time=time,
+        points=points,
+        values=values,
+    )
+
+
+def iter_surfaces(
+    case_path: str, surface: str = None, function: str = SAMPLE_FUNCTION
+) -> Iterator[SurfaceSample]:
+    for time, path in post_processing_directories(case_path, function):
+        for filename in sorted(glob.glob(os.path.join(path, "*.raw"))):
+            sample = read_surface(filename, time)
+            if surface is None or sample.surface == surface:
+                yield sample
+
+
+def read_surfaces(
+    case_path: str, function: str = SAMPLE_FUNCTION
+) -> Dict[str, Tuple[SurfaceSample, ...]]:
+    samples = {}
+    for sample in iter_surfaces(case_path, function=function):
+        samples.setdefault(sample.surface, []).append(sample)
+    return {surface: tuple(s) for surface, s in samples.items()}
+
+
+def read_function(case_path: str, function: str) -> np.ndarray:
+    chunks = []
+    for _, path in post_processing_directories(case_path, function):
+        for filename in sorted(glob.glob(os.path.join(path, "*.dat"))):
+            data = np.loadtxt(filename, ndmin=2, comments="#")
+            if chunks and len(data):
+                chunks[-1] = chunks[-1][chunks[-1][:, 0] < data[0, 0]]
+            chunks.append(data)
+    if not chunks:
+        return np.empty((0, 2))
+    return np.concatenate(chunks)
+
+
+def surface_arrays(
+    surface: str, samples: Sequence[SurfaceSample]
+) -> Dict[str, np.ndarray]:
+    if len({s.points.shape for s in samples}) != 1:
+        return {}
+    arrays = {
+        f"{surface}/time": np.array([s.time for s in samples]),
+        f"{surface}/points": samples[-1].points,
+    }
+    for field in samples[0].values:
+        arrays[f"{surface}/{field}"] = np.stack(
+            [s.values[field] for s in samples]
+        )
+    return arrays
+
+
+def sample_arrays(case_path: str) -> Dict[str, np.ndarray]:
+    path = os.path.join(case_path, "postProcessing")
+    if not os.path.isdir(path):
+        return {}
+    arrays = {}
+    for function in sorted(os.listdir(path)):
+        if function == SAMPLE_FUNCTION:
+            for surface, samples in read_surfaces(case_path).items():
+                arrays.update(surface_arrays(surface, samples))
+            continue
+        values = read_function(case_path, function)
+        if len(values):
+            arrays[function] = values
+    return arrays
+
+
+def write_samples(case_path: str) -> str:
+    filename = os.path.join(case_path, SAMPLES_FILE)
+    np.savez_compressed(filename, **sample_arrays(case_path))
+    return filename
+
+
+def read_samples(case_path: str) -> Dict[str, np.ndarray]:
+    with np.load(os.path.join(case_path, SAMPLES_FILE)) as samples:
+        return dict(samples)
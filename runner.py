@@ -1,44 +1,333 @@
+import asyncio
 import os
+import signal
 import subprocess
-from time import sleep
+from contextlib import contextmanager
+from typing import Iterator, Optional, Sequence, Union
 
 import script_writer
 import config
+from design import MeshSettings
+from instrumentation import report_name
+from polymesh import polymesh_name
+from scratch import KeepPolicy, ScratchDirectory, move_into_place
 
 
-def create_mesh(
+class MeshingError(Exception):
+    returncode: int
+    stdout: str
+    stderr: str
+    scratch_path: str
+
+    def __init__(
+        self,
+        message: str,
+        returncode: int = None,
+        stdout: str = "",
+        stderr: str = "",
+    ):
+        super().__init__(message)
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.scratch_path = None
+
+
+class MeshingTimeout(MeshingError):
+    pass
+
+
+def mesh_save_name(
     lattice_structure,
     channel_spacing,
     channel_width,
     channel_height,
-):
+    mesh_path: str = None,
+    settings: MeshSettings = None,
+) -> str:
     mesh_structure_string = "-".join(str(layer) for layer in lattice_structure)
-
-    save_name = os.path.join(
-        config.MESH_PATH,
+    settings_string = ""
+    if settings is not None and settings != MeshSettings():
+        settings_string = "_" + "_".join(str(s) for s in settings)
+    return os.path.join(
+        mesh_path or config.MESH_PATH,
         f"{mesh_structure_string}"
         f"_{channel_spacing}"
         f"_{channel_width}"
         f"_{channel_height}"
+        f"{settings_string}"
         f".unv",
     )
-    mesh_variables = dict(
-        path_name=f'r"{config.PATH_NAME}"',
-        lattice_structure=lattice_structure,
-        channel_spacing=channel_spacing,
-        channel_width=channel_width,
-        channel_height=channel_height,
-        save_name=f'r"{save_name}"',
+
+
+def decode(output) -> str:
+    if isinstance(output, bytes):
+        return output.decode(errors="replace")
+    return output or ""
+
+
+def salome_args(script_path: str, command: Sequence[str] = None):
+    return list(command or config.SALOME_COMMAND) + [script_path]
+
+
+def salome_timeout(e: subprocess.TimeoutExpired) -> MeshingTimeout:
+    return MeshingTimeout(
+        f"SALOME did not finish within {e.timeout} s",
+        stdout=decode(e.stdout),
+        stderr=decode(e.stderr),
+    )
+
+
+def check_salome(
+    result: subprocess.CompletedProcess,
+) -> subprocess.CompletedProcess:
+    if result.returncode != 0:
+        raise MeshingError(
+            f"SALOME exited with status {result.returncode}",
+            returncode=result.returncode,
+            stdout=result.stdout,
+            stderr=result.stderr,
+        )
+    return result
+
+
+def run_salome(
+    script_path: str,
+    timeout: float = None,
+    command: Sequence[str] = None,
+) -> subprocess.CompletedProcess:
+    try:
+        result = run(
+            salome_args(script_path, command),
+            timeout=timeout or config.SALOME_TIMEOUT,
+        )
+    except subprocess.TimeoutExpired as e:
+        raise salome_timeout(e)
+    except OSError as e:
+        raise MeshingError(f"Could not start SALOME: {e}")
+    return check_salome(result)
+
+
+def signal_group(
+    process: Union[asyncio.subprocess.Process, subprocess.Popen], signum: int
+):
+    try:
+        if hasattr(os, "killpg"):
+            os.killpg(process.pid, signum)
+        elif process.returncode is None:
+            process.kill()
+    except ProcessLookupError:
+        pass
+
+
+async def terminate(process: asyncio.subprocess.Process, grace: float = None):
+    signal_group(process, signal.SIGTERM)
+    try:
+        await asyncio.wait_for(
+            process.wait(), config.KILL_GRACE if grace is None else grace
+        )
+    except asyncio.TimeoutError:
+        pass
+    signal_group(process, getattr(signal, "SIGKILL", signal.SIGTERM))
+    await process.wait()
+
+
+def terminate_blocking(process: subprocess.Popen, grace: float = None):
+    signal_group(process, signal.SIGTERM)
+    try:
+        process.wait(config.KILL_GRACE if grace is None else grace)
+    except subprocess.TimeoutExpired:
+        pass
+    signal_group(process, getattr(signal, "SIGKILL", signal.SIGTERM))
+    process.wait()
+
+
+def run(
+    args: Sequence[str], cwd: str = None, timeout: float = None
+) -> subprocess.CompletedProcess:
+    process = subprocess.Popen(
+        args,
+        cwd=cwd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        start_new_session=True,
+    )
+    try:
+        stdout, stderr = process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        terminate_blocking(process)
+        stdout, stderr = process.communicate()
+        raise subprocess.TimeoutExpired(args, timeout, stdout, stderr)
+    return subprocess.CompletedProcess(
+        args, process.returncode, decode(stdout), decode(stderr)
     )
-    script_writer.write_script(
-        template_path=os.path.join(
-            config.TEMPLATE_PATH, "salome_script.py.template"
-        ),
-        variables=mesh_variables,
-        temp_dir_path=config.TEMP_DIR_PATH,
+
+
+async def run_async(
+    args: Sequence[str], cwd: str = None, timeout: float = None
+) -> subprocess.CompletedProcess:
+    process = await asyncio.create_subprocess_exec(
+        *args,
+        cwd=cwd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        start_new_session=True,
     )
-    subprocess.run(
-        ["run_salome.bat", "-t", "tmp/script.py"],
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+    except asyncio.TimeoutError:
+        await terminate(process)
+        stdout, stderr = await process.communicate()
+        raise subprocess.TimeoutExpired(args, timeout, stdout, stderr)
+    return subprocess.CompletedProcess(
+        args, process.returncode, decode(stdout), decode(stderr)
     )
-    while not os.path.exists(save_name):
-        sleep(1)
+
+
+async def run_salome_async(
+    script_path: str,
+    timeout: float = None,
+    command: Sequence[str] = None,
+) -> subprocess.CompletedProcess:
+    try:
+        result = await run_async(
+            salome_args(script_path, command),
+            timeout=timeout or config.SALOME_TIMEOUT,
+        )
+    except subprocess.TimeoutExpired as e:
+        raise salome_timeout(e)
+    except OSError as e:
+        raise MeshingError(f"Could not start SALOME: {e}")
+    return check_salome(result)
+
+
+class MeshJob:
+    save_name: str
+    script_path: str
+    scratch_save_name: str
+    result: Optional[subprocess.CompletedProcess]
+
+    def __init__(self, save_name: str, scratch: ScratchDirectory):
+        self.save_name = save_name
+        self.script_path = scratch.join("script.py")
+        self.scratch_save_name = scratch.join(os.path.basename(save_name))
+        self.result = None
+
+
+@contextmanager
+def mesh_job(
+    lattice_structure,
+    channel_spacing,
+    channel_width,
+    channel_height,
+    mesh_path: str = None,
+    keep: KeepPolicy = None,
+    settings: MeshSettings = None,
+    polymesh: bool = None,
+) -> Iterator[MeshJob]:
+    settings = settings or MeshSettings()
+    polymesh = config.POLYMESH_EXPORT if polymesh is None else polymesh
+    save_name = mesh_save_name(
+        lattice_structure,
+        channel_spacing,
+        channel_width,
+        channel_height,
+        mesh_path,
+        settings,
+    )
+    with ScratchDirectory(prefix="mesh_", keep=keep) as scratch:
+        job = MeshJob(save_name, scratch)
+        mesh_variables = dict(
+            path_name=f'r"{config.PATH_NAME}"',
+            lattice_structure=lattice_structure,
+            channel_spacing=channel_spacing,
+            channel_width=channel_width,
+            channel_height=channel_height,
+            save_name=f'r"{job.scratch_save_name}"',
+            mesh_settings=repr(settings),
+            polymesh=repr(polymesh),
+        )
+        script_writer.write_script(
+            template_path=os.path.join(
+                config.TEMPLATE_PATH, "salome_script.py.template"
+            ),
+            variables=mesh_variables,
+            temp_dir_path=scratch.path,
+        )
+        try:
+            yield job
+            scratch.write_log("salome.out", job.result.stdout)
+            scratch.write_log("salome.err", job.result.stderr)
+            if not os.path.exists(job.scratch_save_name):
+                raise MeshingError(
+                    "SALOME exited without writing a mesh",
+                    returncode=job.result.returncode,
+                    stdout=job.result.stdout,
+                    stderr=job.result.stderr,
+                )
+        except MeshingError as e:
+            scratch.write_log("salome.out", e.stdout)
+            scratch.write_log("salome.err", e.stderr)
+            e.scratch_path = scratch.path
+            raise
+        if os.path.exists(report_name(job.scratch_save_name)):
+            move_into_place(
+                report_name(job.scratch_save_name), report_name(save_name)
+            )
+        if os.path.exists(polymesh_name(job.scratch_save_name)):
+            move_into_place(
+                polymesh_name(job.scratch_save_name), polymesh_name(save_name)
+            )
+        move_into_place(job.scratch_save_name, save_name)
+
+
+def create_mesh(
+    lattice_structure,
+    channel_spacing,
+    channel_width,
+    channel_height,
+    timeout: float = None,
+    command: Sequence[str] = None,
+    mesh_path: str = None,
+    keep: KeepPolicy = None,
+    settings: MeshSettings = None,
+    polymesh: bool = None,
+):
+    with mesh_job(
+        lattice_structure,
+        channel_spacing,
+        channel_width,
+        channel_height,
+        mesh_path,
+        keep,
+        settings,
+        polymesh,
+    ) as job:
+        job.result = run_salome(job.script_path, timeout, command)
+    return job.save_name
+
+
+async def create_mesh_async(
+    lattice_structure,
+    channel_spacing,
+    channel_width,
+    channel_height,
+    timeout: float = None,
+    command: Sequence[str] = None,
+    mesh_path: str = None,
+    keep: KeepPolicy = None,
+    settings: MeshSettings = None,
+    polymesh: bool = None,
+):
+    with mesh_job(
+        lattice_structure,
+        channel_spacing,
+        channel_width,
+        channel_height,
+        mesh_path,
+        keep,
+        settings,
+        polymesh,
+    ) as job:
+        job.result = await run_salome_async(job.script_path, timeout, command)
+    return job.save_name
@@ -1,10 +1,16 @@
-from typing import List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional
 
+import medcoupling
+import numpy as np
 import SMESH
 from salome.geom import geomBuilder
 from salome.smesh import smeshBuilder
 
+import config
+from design import MeshSettings
 from design_interface import DesignInterface
+from instrumentation import CallRecorder, InstrumentedBuilder, report_name
+from polymesh import PolyMesh, export_polymesh, polymesh_name
 
 from geometry import (
     Line,
@@ -18,6 +24,11 @@ from geometry import (
 )
 
 
+def connectivity(mesh: object, n_nodes: int) -> np.ndarray:
+    cells = medcoupling.MEDCoupling1SGTUMesh.New(mesh)
+    return cells.getNodalConnectivity().toNumPyArray().reshape(-1, n_nodes)
+
+
 class SalomeVertex:
     obj: object
     point: Point
@@ -80,8 +91,16 @@ class SalomeInterface(DesignInterface):
     aqueous_group: object
 
     def __init__(self):
-        self.builder = geomBuilder.New()
-        self.mesh_builder = smeshBuilder.New()
+        self.recorder = CallRecorder()
+        self.builder = InstrumentedBuilder(
+            geomBuilder.New(), self.recorder, "geom"
+        )
+        self.mesh_builder = InstrumentedBuilder(
+            smeshBuilder.New(),
+            self.recorder,
+            "smesh",
+            wrap_results={"Mesh": "mesh"},
+        )
         self.vertices: List[SalomeVertex] = []
         self.lines: List[SalomeLine] = []
         self.faces: List[SalomeFace] = []
@@ -103,20 +122,20 @@ class SalomeInterface(DesignInterface):
         self.extrude(extrusion_height)
         self.create_groups_old()
 
-    def build_hypothesis(self):
+    def build_hypothesis(self, settings: MeshSettings = MeshSettings()):
         self.mesh_parameters = self.mesh_builder.CreateHypothesis(
             "NETGEN_Parameters", "NETGENEngine"
         )
         self.mesh_parameters.SetSecondOrder(0)
-        self.mesh_parameters.SetOptimize(1)
-        self.mesh_parameters.SetFineness(3)
+        self.mesh_parameters.SetOptimize(settings.optimize)
+        self.mesh_parameters.SetFineness(settings.fineness)
         self.mesh_parameters.SetChordalError(-1)
         self.mesh_parameters.SetChordalErrorEnabled(0)
         self.mesh_parameters.SetUseSurfaceCurvature(1)
         self.mesh_parameters.SetFuseEdges(1)
         self.mesh_parameters.SetQuadAllowed(0)
-        self.mesh_parameters.SetMaxSize(0.2)
-        self.mesh_parameters.SetMinSize(0.1)
+        self.mesh_parameters.SetMaxSize(settings.max_size)
+        self.mesh_parameters.SetMinSize(settings.min_size)
         self.mesh_parameters.SetCheckChartBoundary(176)
 
     @staticmethod
@@ -144,10 +163,39 @@ class SalomeInterface(DesignInterface):
 
     def export_mesh(self, filename):
         self.mesh.ExportUNV(filename)
+        self.recorder.write_report(
+            report_name(filename),
+            nodes=self.mesh.NbNodes(),
+            cells=self.mesh.NbVolumes(),
+        )
+
+    def face_groups(self, mesh: object) -> Dict[str, np.ndarray]:
+        faces = connectivity(mesh[-1], 3)
+        return {
+            name: faces[mesh.getGroupArr(-1, name).toNumPyArray()]
+            for name in mesh.getGroupsOnSpecifiedLev(-1)
+        }
+
+    def export_polymesh(self, case_path: str, scale: float = 1) -> PolyMesh:
+        mesh = self.mesh.ExportMEDCoupling(auto_groups=False).getMeshes()[0]
+        return export_polymesh(
+            points=mesh.getCoords().toNumPyArray(),
+            tets=connectivity(mesh[0], 4),
+            groups=self.face_groups(mesh),
+            case_path=case_path,
+            scale=scale,
+        )
 
-    def create_mesh(self, save_name: str):
-        self.build_hypothesis()
+    def create_mesh(
+        self,
+        save_name: str,
+        settings: MeshSettings = MeshSettings(),
+        polymesh: bool = False,
+    ):
+        self.build_hypothesis(settings)
         self.build_mesh_old()
+        if polymesh:
+            self.export_polymesh(polymesh_name(save_name), config.MESH_SCALE)
         self.export_mesh(save_name)
 
     def add_point(self, point: Point):
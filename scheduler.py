@@ -0,0 +1,145 @@
+import asyncio
+import os
+from collections import namedtuple
+from contextlib import asynccontextmanager
+from time import perf_counter
+from typing import AsyncIterator, List, Optional, Tuple
+
+import config
+
+Resources = namedtuple(typename="Resources", field_names=("cores", "memory"))
+
+SchedulerStats = namedtuple(
+    typename="SchedulerStats",
+    field_names=(
+        "cores",
+        "wall_seconds",
+        "busy_core_seconds",
+        "idle_core_seconds",
+        "utilization",
+        "peak_cores",
+        "peak_memory",
+    ),
+)
+
+
+def machine_memory() -> Optional[int]:
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def machine_resources() -> Resources:
+    return Resources(
+        cores=config.SCHEDULER_CORES or os.cpu_count() or 1,
+        memory=config.SCHEDULER_MEMORY or machine_memory(),
+    )
+
+
+class ResourceScheduler:
+    total: Resources
+    used: Resources
+
+    def __init__(self, cores: int = None, memory: int = None):
+        machine = machine_resources()
+        self.total = Resources(
+            cores=cores or machine.cores, memory=memory or machine.memory
+        )
+        self.used = Resources(0, 0)
+        self.waiters: List[Tuple[Resources, asyncio.Future]] = []
+        self.started = perf_counter()
+        self.changed = self.started
+        self.busy_core_seconds = 0.0
+        self.peak = Resources(0, 0)
+
+    def clamp(self, request: Resources) -> Resources:
+        return Resources(
+            cores=max(1, min(request.cores, self.total.cores)),
+            memory=(
+                min(request.memory, self.total.memory)
+                if self.total.memory
+                else 0
+            ),
+        )
+
+    def fits(self, request: Resources) -> bool:
+        cores_free = self.used.cores + request.cores <= self.total.cores
+        memory_free = (
+            not self.total.memory
+            or self.used.memory + request.memory <= self.total.memory
+        )
+        return cores_free and memory_free
+
+    def account(self):
+        now = perf_counter()
+        self.busy_core_seconds += self.used.cores * (now - self.changed)
+        self.changed = now
+
+    def acquire(self, request: Resources):
+        self.account()
+        self.used = Resources(
+            self.used.cores + request.cores,
+            self.used.memory + request.memory,
+        )
+        self.peak = Resources(*map(max, self.peak, self.used))
+
+    def release(self, request: Resources):
+        self.account()
+        self.used = Resources(
+            self.used.cores - request.cores,
+            self.used.memory - request.memory,
+        )
+        self.dispatch()
+
+    def dispatch(self):
+        for waiter in tuple(self.waiters):
+            request, future = waiter
+            if future.done():
+                self.waiters.remove(waiter)
+            elif self.fits(request):
+                self.waiters.remove(waiter)
+                self.acquire(request)
+                future.set_result(request)
+
+    def solve_cores(self, requested: int = None) -> int:
+        return self.clamp(Resources(requested or config.SOLVE_CORES, 0)).cores
+
+    @asynccontextmanager
+    async def reserve(
+        self, cores: int, memory: int = 0
+    ) -> AsyncIterator[Resources]:
+        request = self.clamp(Resources(cores, memory))
+        if not self.waiters and self.fits(request):
+            self.acquire(request)
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self.waiters.append((request, future))
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    self.release(request)
+                raise
+        try:
+            yield request
+        finally:
+            self.release(request)
+
+    def stats(self) -> SchedulerStats:
+        self.account()
+        wall_seconds = self.changed - self.started
+        capacity = self.total.cores * wall_seconds
+        return SchedulerStats(
+            cores=self.total.cores,
+            wall_seconds=round(wall_seconds, 6),
+            busy_core_seconds=round(self.busy_core_seconds, 6),
+            idle_core_seconds=round(capacity - self.busy_core_seconds, 6),
+            utilization=(
+                round(self.busy_core_seconds / capacity, 4)
+                if capacity > 0
+                else 0.0
+            ),
+            peak_cores=self.peak.cores,
+            peak_memory=self.peak.memory,
+        )
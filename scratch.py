@@ -0,0 +1,77 @@
+import os
+import shutil
+import tempfile
+from enum import Enum
+from typing import Union
+
+import config
+
+
+class KeepPolicy(str, Enum):
+    ALWAYS = "always"
+    ON_FAILURE = "on_failure"
+    NEVER = "never"
+
+    def __str__(self):
+        return str.__str__(self)
+
+
+class ScratchDirectory:
+    path: str
+    failed: bool
+
+    def __init__(
+        self,
+        prefix: str = "job_",
+        root: str = None,
+        keep: Union[str, KeepPolicy] = None,
+    ):
+        self.prefix = prefix
+        self.root = root or config.SCRATCH_PATH or tempfile.gettempdir()
+        self.keep = KeepPolicy(keep or config.KEEP_SCRATCH)
+        self.path = None
+        self.failed = False
+
+    def __enter__(self):
+        os.makedirs(self.root, exist_ok=True)
+        self.path = tempfile.mkdtemp(prefix=self.prefix, dir=self.root)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.failed = self.failed or exc_type is not None
+        if self.should_remove():
+            shutil.rmtree(self.path, ignore_errors=True)
+
+    def should_remove(self) -> bool:
+        match self.keep:
+            case KeepPolicy.ALWAYS:
+                return False
+            case KeepPolicy.ON_FAILURE:
+                return not self.failed
+            case _:
+                return True
+
+    def join(self, *names: str) -> str:
+        return os.path.join(self.path, *names)
+
+    def write_log(self, name: str, text: str) -> str:
+        log_path = self.join(name)
+        with open(log_path, "w") as f:
+            f.write(text or "")
+        return log_path
+
+
+def move_into_place(source: str, destination: str):
+    try:
+        os.replace(source, destination)
+    except OSError:
+        stem, ext = os.path.splitext(destination)
+        staging = f"{stem}.partial{ext}"
+        if os.path.isdir(source):
+            shutil.copytree(source, staging)
+            os.replace(staging, destination)
+            shutil.rmtree(source)
+            return
+        shutil.copyfile(source, staging)
+        os.replace(staging, destination)
+        os.remove(source)
@@ -0,0 +1,436 @@
+import asyncio
+import json
+import math
+import os
+import random
+import sqlite3
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager
+from enum import Enum
+from math import exp, log
+from time import time
+from typing import (
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+)
+
+import config
+from design import Design
+from geometry import random_layer_sequence
+from log_monitor import (
+    MonitorAction,
+    OutletSample,
+    OutletTracker,
+    SteadyCriterion,
+    Verdict,
+)
+from mesh_store import MeshStore
+from mixing import mixing_index, segregation
+from pipeline import Job, Stage, default_stages, run_pipeline
+from scheduler import ResourceScheduler
+
+FloatRange = namedtuple(
+    typename="FloatRange",
+    field_names=("low", "high", "log"),
+    defaults=(False,),
+)
+
+IntRange = namedtuple(typename="IntRange", field_names=("low", "high"))
+
+Choice = namedtuple(typename="Choice", field_names=("options",))
+
+LayerSequence = namedtuple(
+    typename="LayerSequence",
+    field_names=("inlets", "n_layers", "max_width", "max_layer_difference"),
+    defaults=((2, 3), 10, 3, 1),
+)
+
+
+DESIGN_SPACE = dict(
+    lattice_structure=LayerSequence(),
+    channel_spacing=FloatRange(2.5, 5),
+    channel_width=FloatRange(0.3, 0.6),
+    channel_height=FloatRange(0.3, 0.6),
+    aqueous_flow_rate=FloatRange(5, 30),
+    organic_flow_rate=FloatRange(1, 10),
+)
+
+
+class TrialState(str, Enum):
+    RUNNING = "running"
+    COMPLETE = "complete"
+    PRUNED = "pruned"
+    FAIL = "fail"
+
+    def __str__(self):
+        return str.__str__(self)
+
+
+class TrialPruned(Exception):
+    pass
+
+
+def sample_value(spec, rng: random.Random):
+    match type(spec).__name__:
+        case "FloatRange":
+            if spec.log:
+                return exp(rng.uniform(log(spec.low), log(spec.high)))
+            return rng.uniform(spec.low, spec.high)
+        case "IntRange":
+            return rng.randint(spec.low, spec.high)
+        case "Choice":
+            return rng.choice(spec.options)
+        case "LayerSequence":
+            return (rng.choice(spec.inlets),) + random_layer_sequence(
+                spec.n_layers,
+                spec.max_width,
+                spec.max_layer_difference,
+                rng,
+            )
+        case _:
+            raise ValueError(f"Unknown parameter specification {spec!r}")
+
+
+def sample(space: Mapping[str, object], rng: random.Random) -> dict:
+    return {name: sample_value(spec, rng) for name, spec in space.items()}
+
+
+def param_value(value, digits: int):
+    match value:
+        case float():
+            return round(value, digits)
+        case list():
+            return tuple(value)
+        case _:
+            return value
+
+
+def params_design(params: Mapping[str, object], digits: int = 3) -> Design:
+    return Design(
+        **{name: param_value(value, digits) for name, value in params.items()}
+    )
+
+
+class Trial:
+    number: int
+    params: dict
+    state: TrialState
+    value: Optional[float]
+    intermediate: Dict[int, float]
+
+    def __init__(self, study: "Study", number: int, params: dict):
+        self.study = study
+        self.number = number
+        self.params = params
+        self.state = TrialState.RUNNING
+        self.value = None
+        self.intermediate = {}
+
+    def report(self, step: int, value: float):
+        self.intermediate[step] = value
+        self.study.storage.save(self)
+
+    def should_prune(self) -> bool:
+        return self.study.pruner.should_prune(self.study, self)
+
+    def check_prune(self, step: int, value: float):
+        self.report(step, value)
+        if self.should_prune():
+            raise TrialPruned(f"Trial {self.number} pruned at step {step}")
+
+
+class BestTrialPruner:
+    def __init__(self, tolerance: float = 0.2, warmup_steps: int = 0):
+        self.tolerance = tolerance
+        self.warmup_steps = warmup_steps
+
+    def should_prune(self, study: "Study", trial: Trial) -> bool:
+        if not trial.intermediate:
+            return False
+        step = max(trial.intermediate)
+        if step < self.warmup_steps:
+            return False
+        best = study.best_trial
+        if best is None:
+            return False
+        reached = tuple(s for s in best.intermediate if s <= step)
+        if not reached:
+            return False
+        reference = best.intermediate[max(reached)]
+        margin = self.tolerance * abs(reference)
+        value = trial.intermediate[step]
+        if study.direction == "minimize":
+            return value > reference + margin
+        return value < reference - margin
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trials (
+    number INTEGER PRIMARY KEY,
+    params TEXT NOT NULL,
+    state TEXT NOT NULL,
+    value REAL,
+    intermediate TEXT NOT NULL,
+    started REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS trials_state ON trials (state, value);
+"""
+
+
+class StudyStorage:
+    path: str
+
+    def __init__(self, path: str = None):
+        self.path = path or config.STUDY_PATH
+        self.lock = threading.Lock()
+        with self.connect() as conn:
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        with closing(sqlite3.connect(self.path, timeout=30)) as conn:
+            with conn:
+                yield conn
+
+    def save(self, trial: Trial):
+        now = time()
+        with self.lock, self.connect() as conn:
+            conn.execute(
+                "INSERT INTO trials VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (number) DO UPDATE SET state = excluded.state, "
+                "value = excluded.value, "
+                "intermediate = excluded.intermediate, "
+                "updated = excluded.updated",
+                (
+                    trial.number,
+                    json.dumps(trial.params),
+                    trial.state,
+                    trial.value,
+                    json.dumps(trial.intermediate),
+                    now,
+                    now,
+                ),
+            )
+
+    def load(self, study: "Study") -> List[Trial]:
+        with self.connect() as conn:
+            rows = conn.execute(
+                "SELECT number, params, state, value, intermediate "
+                "FROM trials ORDER BY number"
+            ).fetchall()
+
+        def trial_gen() -> Iterator[Trial]:
+            for number, params, state, value, intermediate in rows:
+                trial = Trial(study, number, json.loads(params))
+                trial.state = TrialState(state)
+                trial.value = value
+                trial.intermediate = {
+                    int(step): v
+                    for step, v in json.loads(intermediate).items()
+                }
+                if trial.state == TrialState.RUNNING:
+                    trial.state = TrialState.FAIL
+                    self.save(trial)
+                yield trial
+
+        return list(trial_gen())
+
+
+class Study:
+    direction: str
+    trials: List[Trial]
+
+    def __init__(
+        self,
+        space: Mapping[str, object] = None,
+        direction: str = "maximize",
+        storage: StudyStorage = None,
+        pruner: BestTrialPruner = None,
+        seed: int = None,
+    ):
+        if direction not in ("minimize", "maximize"):
+            raise ValueError(f"Unknown direction {direction}")
+        self.space = space or DESIGN_SPACE
+        self.direction = direction
+        self.storage = storage or StudyStorage()
+        self.pruner = pruner or BestTrialPruner()
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.trials = self.storage.load(self)
+
+    @property
+    def completed_trials(self) -> List[Trial]:
+        return [t for t in self.trials if t.state == TrialState.COMPLETE]
+
+    @property
+    def best_trial(self) -> Optional[Trial]:
+        completed = self.completed_trials
+        if not completed:
+            return None
+        if self.direction == "minimize":
+            return min(completed, key=lambda t: t.value)
+        return max(completed, key=lambda t: t.value)
+
+    def ask(self) -> Trial:
+        with self.lock:
+            trial = Trial(self, len(self.trials), sample(self.space, self.rng))
+            self.trials.append(trial)
+        self.storage.save(trial)
+        return trial
+
+    def tell(self, trial: Trial, state: TrialState, value: float = None):
+        trial.state = state
+        trial.value = value
+        self.storage.save(trial)
+
+    def run_trial(self, objective: Callable[[Trial], float]) -> Trial:
+        trial = self.ask()
+        try:
+            value = objective(trial)
+        except TrialPruned:
+            self.tell(trial, TrialState.PRUNED)
+        except Exception:
+            self.tell(trial, TrialState.FAIL)
+        else:
+            self.tell(trial, TrialState.COMPLETE, float(value))
+        return trial
+
+    def optimize(
+        self,
+        objective: Callable[[Trial], float],
+        n_trials: int,
+        workers: int = 1,
+    ) -> Optional[Trial]:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            tuple(
+                pool.map(lambda _: self.run_trial(objective), range(n_trials))
+            )
+        return self.best_trial
+
+
+class TrialTracker(OutletTracker):
+    trial: Trial
+    interval: float
+    pruned: Optional[TrialPruned]
+
+    def __init__(
+        self,
+        trial: Trial,
+        case_path: str,
+        criterion: SteadyCriterion = None,
+        interval: float = None,
+    ):
+        super().__init__(case_path, criterion)
+        self.trial = trial
+        self.interval = interval or config.STUDY_REPORT_INTERVAL
+        self.step = -1
+        self.pruned = None
+
+    def add(self, sample: OutletSample):
+        super().add(sample)
+        step = round(sample.time / self.interval)
+        if not self.armed or self.pruned is not None or step <= self.step:
+            return
+        value = mixing_index(segregation(sample.mean, sample.variance))
+        if math.isnan(value):
+            return
+        self.step = step
+        try:
+            self.trial.check_prune(step, value)
+        except TrialPruned as e:
+            self.pruned = e
+
+    def poll(self) -> Optional[Verdict]:
+        super().poll()
+        if self.pruned is None:
+            return None
+        return Verdict(
+            MonitorAction.ABORT, str(self.pruned), self.samples[-1].time
+        )
+
+
+def job_value(job: Job) -> float:
+    mixing = job.artifacts["mixing"]
+    if math.isnan(mixing["outlet_segregation"]):
+        return mixing_index(mixing["segregation"])
+    return mixing_index(mixing["outlet_segregation"])
+
+
+class PipelineObjective:
+    scheduler: ResourceScheduler
+    stages: Callable[..., Tuple[Stage, ...]]
+
+    def __init__(
+        self,
+        concurrency: Mapping[str, int] = None,
+        scheduler: ResourceScheduler = None,
+        stages: Callable[..., Tuple[Stage, ...]] = None,
+        store: MeshStore = None,
+    ):
+        self.concurrency = concurrency
+        self.scheduler = scheduler or ResourceScheduler()
+        self.stages = stages or default_stages
+        self.store = store or MeshStore()
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(
+            target=self.loop.run_forever, daemon=True
+        )
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        if self.loop.is_closed():
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+    def __call__(self, trial: Trial) -> float:
+        trackers = []
+
+        def trial_trackers(job: Job) -> Tuple[TrialTracker]:
+            trackers.append(TrialTracker(trial, job.artifacts["case"]))
+            return tuple(trackers[-1:])
+
+        stages = self.stages(
+            self.concurrency, self.scheduler, trial_trackers, self.store
+        )
+        (job,), _ = asyncio.run_coroutine_threadsafe(
+            run_pipeline(
+                (params_design(trial.params),), stages, store=self.store
+            ),
+            self.loop,
+        ).result()
+        for tracker in trackers:
+            if tracker.pruned is not None:
+                raise tracker.pruned
+        if job.failed:
+            raise job.error
+        return job_value(job)
+
+
+def pipeline_objective(
+    concurrency: Mapping[str, int] = None,
+    scheduler: ResourceScheduler = None,
+    store: MeshStore = None,
+) -> PipelineObjective:
+    return PipelineObjective(concurrency, scheduler, store=store)
+
+
+def load_study(path: str, **kwargs) -> Study:
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    return Study(storage=StudyStorage(path), **kwargs)
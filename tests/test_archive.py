@@ -0,0 +1,139 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import archive
+import mixing
+import polymesh
+import results
+from tests.test_polymesh import boundary_triangles, kuhn_tets
+from tests.test_results import write_field, write_raw
+
+TIMES = ("0", "0.01", "0.02", "0.03", "0.04")
+
+POLICY = archive.RetentionPolicy(
+    times=2, processors=False, compression="deflated"
+)
+
+
+class ArchiveTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.case_path = os.path.join(self.tmp.name, "case")
+        points, tets = kuhn_tets(4, 2, 2)
+        outlet = boundary_triangles(points, tets, 0, 4)
+        mesh = polymesh.build_polymesh(points, tets, dict(outlet=outlet))
+        polymesh.write_polymesh(mesh, self.case_path)
+        self.alpha = np.linspace(0, 1, len(tets))
+        for time in TIMES:
+            write_field(
+                os.path.join(self.case_path, time, "alpha.organic"),
+                self.alpha * float(time),
+                dict(outlet=0.0, defaultFaces=0.0),
+            )
+        os.makedirs(os.path.join(self.case_path, "system"))
+        with open(
+            os.path.join(self.case_path, "system", "controlDict"), "w"
+        ) as f:
+            f.write("application interFoam;\n")
+        with open(os.path.join(self.case_path, "log.interFoam"), "w") as f:
+            f.write("End\n" * 100)
+        post = os.path.join(self.case_path, "postProcessing")
+        for time in TIMES[1:]:
+            write_raw(
+                os.path.join(post, "samples", time, "layer0.raw"),
+                np.arange(6.0).reshape(2, 3),
+                {"alpha.organic": np.full(2, float(time))},
+            )
+        os.makedirs(os.path.join(post, "outletAverage", "0"))
+        with open(
+            os.path.join(post, "outletAverage", "0", "surfaceFieldValue.dat"),
+            "w",
+        ) as f:
+            f.write("# Time areaAverage(alpha.organic)\n")
+            f.writelines(f"{t}\t0.5\n" for t in TIMES[1:])
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def write_processor(self, *times: str):
+        for time in times:
+            path = os.path.join(self.case_path, "processor0", time)
+            os.makedirs(path)
+            with open(os.path.join(path, "alpha.organic"), "w") as f:
+                f.write("processor\n")
+
+    def test_retained_times(self):
+        times = (0, 1, 2, 3, 4, 5, 6)
+        self.assertEqual({6}, archive.retained_times(times, 1))
+        self.assertEqual({0, 6}, archive.retained_times(times, 2))
+        self.assertEqual({0, 3, 6}, archive.retained_times(times, 3))
+        self.assertEqual(set(times[:2]), archive.retained_times(times[:2], 3))
+
+    def test_compact_case(self):
+        self.write_processor("0", "0.04")
+        report = archive.compact_case(self.case_path, POLICY)
+        self.assertEqual(
+            {"case.zip", "mixing.csv", "samples.npz"},
+            set(os.listdir(self.case_path)),
+        )
+        self.assertEqual(
+            [os.path.basename(self.case_path)],
+            os.listdir(os.path.dirname(self.case_path)),
+        )
+        self.assertEqual(
+            ("0.01", "0.02", "0.03", "processor0"), report.removed
+        )
+        self.assertLess(report.bytes_after, report.bytes_before)
+        self.assertEqual(5, len(mixing.read_metrics(self.case_path)))
+        samples = results.read_samples(self.case_path)
+        self.assertEqual((4, 2), samples["layer0/alpha.organic"].shape)
+        np.testing.assert_allclose(
+            [0.01, 0.02, 0.03, 0.04], samples["outletAverage"][:, 0]
+        )
+        with archive.CaseArchive(self.case_path) as case_archive:
+            self.assertEqual(("0", "0.04"), case_archive.times())
+            names = case_archive.names()
+            self.assertFalse(any(n.endswith(".tmp") for n in names))
+            self.assertIn("constant/polyMesh/points", names)
+            self.assertIn("log.interFoam", names)
+            self.assertIn("postProcessing/samples/0.03/layer0.raw", names)
+            self.assertFalse(any(n.startswith("processor") for n in names))
+            field = case_archive.read_field("alpha.organic", "0.04")
+            self.assertEqual(
+                b"application interFoam;\n",
+                case_archive.read("system/controlDict"),
+            )
+            self.assertEqual(
+                ["times", "processors", "compression"],
+                list(case_archive.manifest()["policy"]),
+            )
+        self.assertEqual(0.04, field.time)
+        np.testing.assert_allclose(self.alpha * 0.04, field.internal)
+        self.assertEqual(
+            b"End\n" * 100,
+            archive.read_archived(self.case_path, "log.interFoam"),
+        )
+
+    def test_unreconstructed_processors_are_archived(self):
+        self.write_processor("0", "0.05")
+        archive.compact_case(self.case_path, POLICY)
+        with archive.CaseArchive(self.case_path) as case_archive:
+            self.assertEqual(
+                b"processor\n",
+                case_archive.read("processor0/0.05/alpha.organic"),
+            )
+
+    def test_interrupted_compaction_resumes(self):
+        report = archive.compact_case(self.case_path, POLICY)
+        os.makedirs(os.path.join(self.case_path, "0.04"))
+        resumed = archive.compact_case(self.case_path, POLICY)
+        self.assertFalse(os.path.exists(os.path.join(self.case_path, "0.04")))
+        self.assertEqual(report.removed, resumed.removed)
+        self.assertEqual(report.archived, resumed.archived)
+
+
+if __name__ == "__main__":
+    unittest.main()
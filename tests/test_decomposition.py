@@ -0,0 +1,79 @@
+import os
+import tempfile
+import unittest
+
+import decomposition
+import openfoam_writer
+from design import Design, design_case
+
+
+class DecompositionTestCase(unittest.TestCase):
+    design = Design((2, 1, 2, 3, 2, 1, 2, 3, 2, 1, 1), 5, 0.5, 0.56, 15, 3)
+
+    def test_lattice_extent(self):
+        lx, ly, lz = decomposition.lattice_extent(self.design)
+        self.assertGreater(ly, lx)
+        self.assertEqual(0.56, lz)
+
+    def test_small_mesh_runs_serial(self):
+        chosen = decomposition.choose_decomposition(self.design, cells=20000)
+        self.assertEqual(1, chosen.subdomains)
+        self.assertEqual("simple", chosen.method)
+        self.assertEqual((1, 1, 1), chosen.n)
+
+    def test_subdomains_follow_cell_count(self):
+        chosen = decomposition.choose_decomposition(
+            self.design, cells=200000, max_cores=16, cells_per_core=50000
+        )
+        self.assertEqual(4, chosen.subdomains)
+        capped = decomposition.choose_decomposition(
+            self.design, cells=10**7, max_cores=8
+        )
+        self.assertEqual(8, capped.subdomains)
+
+    def test_split_follows_aspect_ratio(self):
+        self.assertEqual(
+            (2, 4, 1), decomposition.split_counts(8, (10, 25, 0.5))
+        )
+        self.assertEqual(
+            (4, 2, 1), decomposition.split_counts(8, (25, 10, 0.5))
+        )
+        chosen = decomposition.choose_decomposition(
+            self.design, cells=350000, max_cores=8
+        )
+        self.assertEqual(7, chosen.subdomains)
+        self.assertEqual("scotch", chosen.method)
+
+    def test_estimate_cells(self):
+        cells = decomposition.estimate_cells(self.design)
+        wider = decomposition.estimate_cells(
+            self.design._replace(channel_width=1)
+        )
+        self.assertGreater(cells, 0)
+        self.assertGreater(wider, cells)
+
+    def test_apply_decomposition(self):
+        chosen = decomposition.choose_decomposition(
+            self.design, cells=600000, max_cores=6
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            case_path = openfoam_writer.create_case(
+                design_case(self.design), cases_path=tmp
+            )
+            decomposition.apply_decomposition(case_path, chosen)
+            with open(
+                os.path.join(case_path, "system", "decomposeParDict")
+            ) as f:
+                text = f.read()
+            self.assertEqual(
+                chosen, decomposition.read_decomposition(case_path)
+            )
+        self.assertIn("numberOfSubdomains 6;", text)
+        self.assertIn(f"method          {chosen.method};", text)
+        self.assertIn(
+            f"n               ({' '.join(map(str, chosen.n))});", text
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
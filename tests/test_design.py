@@ -0,0 +1,106 @@
+import os
+import tempfile
+import unittest
+
+import design
+import foam_dict
+import openfoam_writer
+
+
+class DesignTestCase(unittest.TestCase):
+    two_inlet = design.Design(
+        lattice_structure=(2, 1, 2, 3, 2, 1, 2, 3, 2, 1, 1),
+        channel_spacing=5,
+        channel_width=0.5,
+        channel_height=0.56,
+        aqueous_flow_rate=15,
+        organic_flow_rate=3,
+    )
+    three_inlet = two_inlet._replace(
+        lattice_structure=(3, 1, 1, 2, 3, 2, 1, 2, 3, 2, 1, 1)
+    )
+
+    def test_design_name(self):
+        self.assertEqual(
+            "2-1-2-3-2-1-2-3-2-1-1_5_0.5_0.56_15_3",
+            design.design_name(self.two_inlet),
+        )
+
+    def test_variable_names(self):
+        expected = (
+            ("walls", "aqueous_inlet_1", "organic_inlet", "outlet"),
+            (
+                "walls",
+                "aqueous_inlet_1",
+                "organic_inlet",
+                "aqueous_inlet_2",
+                "outlet",
+            ),
+        )
+        for names, d in zip(expected, (self.two_inlet, self.three_inlet)):
+            variables = design.design_variables(d)
+            self.assertEqual(names, tuple(v.name for v in variables))
+
+    def test_inlet_angles(self):
+        variables = design.design_variables(self.three_inlet)
+        angles = tuple(round(v.fields.U.channel_angle) for v in variables[1:4])
+        self.assertEqual((45, 90, 135), angles)
+
+    def test_organic_box(self):
+        organic = design.design_variables(self.three_inlet)[2]
+        box = organic.fields.field_box
+        self.assertTrue(box.x1 < 0 < box.x2)
+        self.assertTrue(box.y1 < 0 < box.y2)
+        self.assertEqual(0.00056, box.z2)
+        self.assertEqual(design.ORGANIC.rho, organic.fields.rho)
+
+    def test_replace_variables(self):
+        case = design.design_case(self.three_inlet)
+        lines = openfoam_writer.replace_variables("U", case.variables)
+        self.assertEqual(47, len(lines))
+
+    def test_sample_planes(self):
+        planes = design.sample_planes(self.two_inlet)
+        self.assertEqual(10, len(planes))
+        self.assertEqual("layer0", planes[0].name)
+        self.assertEqual((0, 0.00125, 0.00028), planes[0].point)
+        self.assertEqual((0, 1, 0), planes[0].normal)
+
+    def test_reduced_output(self):
+        case = design.design_case(
+            self.two_inlet, controls=dict(endTime=0.02), reduced=True
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            case_path = openfoam_writer.create_case(case, cases_path=tmp)
+            entries = foam_dict.load(
+                os.path.join(case_path, "system", "controlDict")
+            ).entries
+        self.assertEqual(0.02, entries["endTime"])
+        self.assertEqual(0.02, entries["writeInterval"])
+        functions = entries["functions"]
+        self.assertEqual(
+            {"outletAverage", "outletCoV", "samples"}, set(functions)
+        )
+        surfaces = functions["samples"]["surfaces"]
+        self.assertEqual(
+            ("layer0", "layer9", "outlet"),
+            (surfaces[0], surfaces[-4], surfaces[-2]),
+        )
+        self.assertEqual([0, 1, 0], surfaces[1]["normal"])
+        self.assertEqual(["outlet"], surfaces[-1]["patches"])
+
+    def test_full_output(self):
+        self.assertIsNone(design.design_case(self.two_inlet).controls)
+        controls = design.case_controls(steady=False, reduced=False)
+        self.assertIsNone(controls)
+        controls = design.case_controls(
+            dict(endTime=0.05), steady=False, reduced=True
+        )
+        self.assertEqual(0.05, controls["writeInterval"])
+        self.assertEqual(
+            ["outlet"], controls["functions/samples"]["surfaces"][::2]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
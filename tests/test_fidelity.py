@@ -0,0 +1,159 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from math import isnan
+
+import fidelity
+import openfoam_runner
+from design import Design, residence_time
+
+
+def designs(n: int):
+    return tuple(
+        Design((2, 1, 2, 3, 2, 1, 1), 2.5 + i / 10, 0.5, 0.56, 15, 3)
+        for i in range(n)
+    )
+
+
+def synthetic(
+    name: str,
+    noise: float,
+    calls: list,
+    cost: float = 1,
+    direction: str = "maximize",
+):
+    async def evaluate(design: Design) -> float:
+        calls.append(design)
+        await asyncio.sleep(0)
+        if design.channel_spacing == 4.0 and name == "fine":
+            raise RuntimeError("solver diverged")
+        sign = 1 if round(design.channel_spacing * 10) % 2 else -1
+        score = design.channel_spacing + sign * noise
+        return score if direction == "maximize" else -score
+
+    return fidelity.Fidelity(
+        name=name,
+        evaluate=evaluate,
+        core_hours=cost,
+        promote=0.5,
+        direction=direction,
+    )
+
+
+class FidelityTestCase(unittest.TestCase):
+    def test_network_estimate(self):
+        slow = designs(1)[0]
+        fast = slow._replace(aqueous_flow_rate=30)
+        self.assertGreater(fidelity.network_estimate(slow), 0)
+        self.assertGreater(
+            fidelity.network_estimate(slow), fidelity.network_estimate(fast)
+        )
+
+    def test_simulation_case_matches_cores(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for cores in (2, 8):
+                case_path = fidelity.simulation_case(
+                    designs(1)[0], "coarse", cores=cores, cases_path=tmp
+                )
+                self.assertEqual(
+                    cores, openfoam_runner.case_subdomains(case_path)
+                )
+
+    def test_coarse_end_time_follows_residence_time(self):
+        slow = designs(1)[0]
+        fast = slow._replace(aqueous_flow_rate=30)
+        for design in (slow, fast):
+            controls = fidelity.simulation_controls(
+                design, dict(writeInterval=1), residence_times=2
+            )
+            self.assertAlmostEqual(
+                2 * residence_time(design), controls["endTime"]
+            )
+            self.assertEqual(1, controls["writeInterval"])
+        self.assertEqual({}, fidelity.simulation_controls(slow))
+
+    def test_spearman(self):
+        self.assertAlmostEqual(1, fidelity.spearman((1, 2, 3), (10, 20, 30)))
+        self.assertAlmostEqual(-1, fidelity.spearman((1, 2, 3), (3, 2, 1)))
+        self.assertAlmostEqual(
+            0.316, fidelity.spearman((1, 2, 3, 4), (1, 3, 2, 2)), places=3
+        )
+        self.assertEqual([1.5, 1.5, 3], fidelity.ranks((5, 5, 7)))
+        self.assertTrue(isnan(fidelity.spearman((1,), (1,))))
+
+    def test_successive_halving(self):
+        calls = dict(estimate=[], coarse=[], fine=[])
+        ladder = (
+            synthetic("estimate", 0.5, calls["estimate"], cost=0),
+            synthetic("coarse", 0.02, calls["coarse"]),
+            synthetic("fine", 0, calls["fine"]),
+        )
+        report = asyncio.run(
+            fidelity.run_ladder(
+                designs(16), ladder, budgets=dict(coarse=None, fine=None)
+            )
+        )
+        self.assertEqual((16, 8, 4), tuple(len(c) for c in calls.values()))
+        self.assertEqual(3, len(report.ranked))
+        spacings = tuple(d.channel_spacing for d in report.ranked)
+        self.assertEqual(tuple(sorted(spacings, reverse=True)), spacings)
+        self.assertEqual(28, len(report.results))
+        self.assertEqual(
+            {"estimate:coarse", "estimate:fine", "coarse:fine"},
+            set(report.correlations),
+        )
+        self.assertAlmostEqual(1, report.correlations["coarse:fine"])
+        failed = tuple(r for r in report.results if r.error is not None)
+        self.assertEqual(1, len(failed))
+        self.assertEqual("fine", failed[0].fidelity)
+
+    def test_levels_rank_in_their_own_direction(self):
+        calls = dict(estimate=[], coarse=[], fine=[])
+        ladder = (
+            synthetic("estimate", 0.5, calls["estimate"], cost=0),
+            synthetic("coarse", 0.02, calls["coarse"], direction="minimize"),
+            synthetic("fine", 0, calls["fine"], direction="minimize"),
+        )
+        report = asyncio.run(
+            fidelity.run_ladder(
+                designs(16), ladder, budgets=dict(coarse=None, fine=None)
+            )
+        )
+        self.assertEqual((16, 8, 4), tuple(len(c) for c in calls.values()))
+        spacings = tuple(d.channel_spacing for d in report.ranked)
+        self.assertEqual(3, len(spacings))
+        self.assertEqual(tuple(sorted(spacings, reverse=True)), spacings)
+        self.assertAlmostEqual(1, report.correlations["coarse:fine"])
+        self.assertGreater(report.correlations["estimate:coarse"], 0)
+
+    def test_budget_limits_evaluations(self):
+        calls = dict(estimate=[], coarse=[])
+        ladder = (
+            synthetic("estimate", 0, calls["estimate"], cost=0),
+            synthetic("coarse", 0, calls["coarse"], cost=2),
+        )
+        report = asyncio.run(
+            fidelity.run_ladder(designs(16), ladder, budgets=dict(coarse=5))
+        )
+        self.assertEqual(2, len(calls["coarse"]))
+        self.assertEqual(
+            tuple(d.channel_spacing for d in calls["coarse"]),
+            tuple(d.channel_spacing for d in report.ranked),
+        )
+
+    def test_write_results(self):
+        ladder = (synthetic("estimate", 0, [], cost=0),)
+        report = asyncio.run(fidelity.run_ladder(designs(3), ladder))
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, "ladder.json")
+            fidelity.write_results(report, filename)
+            with open(filename) as f:
+                saved = json.load(f)
+        self.assertEqual(3, len(saved["results"]))
+        self.assertEqual("estimate", saved["results"][0]["fidelity"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import fields
+import openfoam_runner
+import openfoam_writer
+import polymesh
+from design import Design, design_case
+from tests.test_polymesh import kuhn_tets
+
+BOX = openfoam_writer.BoundingBox(
+    x1=-0.5, y1=-0.5, z1=-0.5, x2=1.5, y2=2.5, z2=2.5
+)
+
+
+def binary_header(cls: str, obj: str) -> bytes:
+    return (
+        "FoamFile\n{\n    format      binary;\n"
+        f"    class       {cls};\n"
+        '    arch        "LSB;label=32;scalar=64";\n'
+        f"    object      {obj};\n}}\n\n"
+    ).encode()
+
+
+def write_binary_polymesh(mesh: polymesh.PolyMesh, case_path: str):
+    mesh_path = os.path.join(case_path, "constant", "polyMesh")
+    os.makedirs(mesh_path, exist_ok=True)
+    offsets = np.arange(0, mesh.faces.size + 1, 3, dtype=np.int32)
+    contents = dict(
+        points=binary_header("vectorField", "points")
+        + polymesh.binary_list(mesh.points),
+        faces=binary_header("faceCompactList", "faces")
+        + polymesh.binary_list(offsets)
+        + polymesh.binary_list(mesh.faces.reshape(-1).astype(np.int32)),
+        owner=binary_header("labelList", "owner")
+        + polymesh.binary_list(mesh.owner.astype(np.int32)),
+        neighbour=binary_header("labelList", "neighbour")
+        + polymesh.binary_list(mesh.neighbour.astype(np.int32)),
+    )
+    for name, data in contents.items():
+        with open(os.path.join(mesh_path, name), "wb") as f:
+            f.write(data)
+
+
+class FieldsTestCase(unittest.TestCase):
+    design = Design((2, 1, 2, 3, 2, 1, 1), 5, 0.5, 0.56, 15, 3)
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.case_path = openfoam_writer.create_case(
+            design_case(self.design), cases_path=self.tmp.name
+        )
+        self.points, self.tets = kuhn_tets(3, 3, 2)
+        self.mesh = polymesh.build_polymesh(self.points, self.tets)
+        self.centres = self.points[self.tets].mean(axis=1)
+        variable = openfoam_writer.ExperimentVariable(
+            type="$inlet",
+            name="organic_inlet",
+            fields=openfoam_writer.VariableFields(
+                U=None, alpha=0, p_rgh=None, field_box=BOX, nu=None, rho=None
+            ),
+        )
+        set_fields_dict = os.path.join(
+            self.case_path, "system", "setFieldsDict"
+        )
+        with open(set_fields_dict, "w") as f:
+            f.write(openfoam_writer.render("setFieldsDict", (variable,)))
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_read_set_fields(self):
+        set_fields = fields.read_set_fields(self.case_path)
+        self.assertEqual((1, 0), set_fields[:2])
+        self.assertEqual((BOX,), set_fields.boxes)
+
+    def test_design_set_fields(self):
+        case_path = openfoam_writer.create_case(
+            design_case(self.design._replace(channel_spacing=4)),
+            cases_path=self.tmp.name,
+        )
+        set_fields = fields.read_set_fields(case_path)
+        self.assertEqual(1, len(set_fields.boxes))
+        self.assertEqual(0.0, set_fields.boxes[0].z1)
+
+    def test_cell_centres(self):
+        polymesh.write_polymesh(self.mesh, self.case_path)
+        np.testing.assert_allclose(
+            self.centres, polymesh.cell_centres(self.case_path)
+        )
+
+    def test_binary_cell_centres(self):
+        write_binary_polymesh(self.mesh, self.case_path)
+        np.testing.assert_allclose(
+            self.centres, polymesh.cell_centres(self.case_path)
+        )
+
+    def test_paint_alpha_ascii(self):
+        polymesh.write_polymesh(self.mesh, self.case_path)
+        values = fields.paint_alpha(self.case_path, binary=False)
+        inside = np.all(
+            (self.centres >= (-0.5, -0.5, -0.5))
+            & (self.centres <= (1.5, 2.5, 2.5)),
+            axis=1,
+        )
+        np.testing.assert_array_equal(np.where(inside, 0, 1), values)
+        self.assertTrue(0 < inside.sum() < len(inside))
+        with open(os.path.join(self.case_path, "0", "alpha.organic")) as f:
+            text = f.read()
+        self.assertIn(
+            f"internalField   nonuniform List<scalar> {len(values)}\n(\n",
+            text,
+        )
+        self.assertIn("boundaryField", text)
+        self.assertIn("format      ascii;", text)
+
+    def test_paint_alpha_binary(self):
+        write_binary_polymesh(self.mesh, self.case_path)
+        values = fields.paint_alpha(self.case_path)
+        alpha = os.path.join(self.case_path, "0", "alpha.organic")
+        with open(alpha, "rb") as f:
+            data = f.read()
+        header, pos = polymesh.read_header(data)
+        self.assertEqual("binary", header["format"])
+        written, end = polymesh.read_list_at(data, pos, True, np.float64)
+        np.testing.assert_array_equal(values, written)
+        self.assertIn(b"boundaryField", data[end:])
+
+    def test_solve_commands(self):
+        names = tuple(
+            name for name, _ in openfoam_runner.solve_commands("m.unv", 4)
+        )
+        self.assertEqual(
+            (
+                "ideasUnvToFoam",
+                "transformPoints",
+                "setFields",
+                "decomposePar",
+                "interFoam",
+                "reconstructPar",
+            ),
+            names,
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,194 @@
+import io
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+import foam_dict
+import polymesh
+from config import TEMPLATE_PATH
+
+TEMPLATE = os.path.join(TEMPLATE_PATH, "interFoam")
+
+SCHEMES = b"""
+/* block
+   comment */
+divSchemes
+{
+    default         none; // trailing comment
+    div(rhoPhi,U)   Gauss linearUpwind grad(U);
+    div(((rho*nuEff)*dev2(T(grad(U))))) Gauss linear;
+}
+"""
+
+
+def template_files():
+    for root, _, files in os.walk(TEMPLATE):
+        for name in sorted(files):
+            yield os.path.join(root, name)
+
+
+class FoamDictTestCase(unittest.TestCase):
+    def test_template_round_trip(self):
+        for filename in template_files():
+            with self.subTest(filename=filename):
+                parsed = foam_dict.load(filename)
+                self.assertEqual(
+                    parsed, foam_dict.loads(foam_dict.dumps(parsed))
+                )
+
+    def test_templates(self):
+        fv_solution = foam_dict.load(
+            os.path.join(TEMPLATE, "system", "fvSolution")
+        )
+        self.assertEqual("fvSolution", fv_solution.header["object"])
+        solvers = fv_solution.entries["solvers"]
+        self.assertIsInstance(next(iter(solvers)), foam_dict.Quoted)
+        self.assertEqual({"$p_rgh": None, "relTol": 0}, solvers["p_rghFinal"])
+        self.assertIsInstance(
+            next(iter(solvers["p_rghFinal"])), foam_dict.Macro
+        )
+        p_rgh = foam_dict.load(os.path.join(TEMPLATE, "0", "p_rgh"))
+        self.assertEqual((1, -1, -2, 0, 0, 0, 0), p_rgh.entries["dimensions"])
+        self.assertIsInstance(
+            p_rgh.entries["dimensions"], foam_dict.Dimensions
+        )
+        self.assertEqual(
+            foam_dict.Field("uniform", 0), p_rgh.entries["internalField"]
+        )
+
+    def test_words_and_comments(self):
+        entries = foam_dict.loads(SCHEMES).entries["divSchemes"]
+        self.assertEqual("none", entries["default"])
+        self.assertEqual(
+            ("Gauss", "linearUpwind", "grad(U)"), entries["div(rhoPhi,U)"]
+        )
+        self.assertIn("div(((rho*nuEff)*dev2(T(grad(U)))))", entries)
+
+    def test_nested_lists(self):
+        entries = foam_dict.loads(
+            "regions ( boxToCell { box (0 0 0) (1 2 3); } );"
+        ).entries
+        name, region = entries["regions"]
+        self.assertEqual("boxToCell", name)
+        self.assertEqual(([0, 0, 0], [1, 2, 3]), region["box"])
+
+    def test_ascii_field(self):
+        vectors = np.arange(12.0).reshape(4, 3)
+        foam_file = foam_dict.FoamFile(
+            dict(format="ascii", object="U"),
+            dict(
+                internalField=foam_dict.Field(
+                    "nonuniform", vectors, "List<vector>"
+                ),
+                boundaryField=dict(
+                    outlet=dict(
+                        type="fixedValue",
+                        value=foam_dict.Field("uniform", [0, 0, 1]),
+                    )
+                ),
+            ),
+        )
+        parsed = foam_dict.loads(foam_dict.dumps(foam_file))
+        field = parsed.entries["internalField"]
+        self.assertEqual("List<vector>", field.type)
+        np.testing.assert_array_equal(vectors, field.value)
+        self.assertEqual(
+            [0, 0, 1],
+            parsed.entries["boundaryField"]["outlet"]["value"].value,
+        )
+
+    def test_binary_field(self):
+        scalars = np.linspace(0, 1, 1000)
+        foam_file = foam_dict.FoamFile(
+            dict(format="binary", object="alpha"),
+            dict(
+                internalField=foam_dict.Field(
+                    "nonuniform", scalars, "List<scalar>"
+                )
+            ),
+        )
+        data = foam_dict.dumps(foam_file)
+        self.assertIn(scalars.tobytes(), data)
+        parsed = foam_dict.parse(io.BytesIO(data), chunk_size=64)
+        np.testing.assert_array_equal(
+            scalars, parsed.entries["internalField"].value
+        )
+
+    def test_parse_scales_linearly(self):
+        def parse_seconds(n: int, file_format: str) -> float:
+            vectors = np.random.default_rng(0).random((n, 3))
+            data = foam_dict.dumps(
+                foam_dict.FoamFile(
+                    dict(format=file_format, object="U"),
+                    dict(
+                        internalField=foam_dict.Field(
+                            "nonuniform", vectors, "List<vector>"
+                        )
+                    ),
+                )
+            )
+
+            def seconds() -> float:
+                start = time.perf_counter()
+                parsed = foam_dict.parse(io.BytesIO(data), chunk_size=4096)
+                elapsed = time.perf_counter() - start
+                self.assertEqual(
+                    (n, 3), parsed.entries["internalField"].value.shape
+                )
+                return elapsed
+
+            return min(seconds() for _ in range(3))
+
+        for file_format in "binary", "ascii":
+            with self.subTest(format=file_format):
+                small = parse_seconds(50000, file_format)
+                large = parse_seconds(200000, file_format)
+                self.assertLess(large, 10 * max(small, 1e-3))
+
+    def test_small_chunks(self):
+        for filename in template_files():
+            with self.subTest(filename=filename), open(filename, "rb") as f:
+                self.assertEqual(
+                    foam_dict.load(filename), foam_dict.parse(f, chunk_size=7)
+                )
+
+    def test_update_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            target = os.path.join(tmp, "decomposeParDict")
+            shutil.copy(
+                os.path.join(TEMPLATE, "system", "decomposeParDict"), target
+            )
+            foam_dict.update_file(
+                target, {"numberOfSubdomains": 4, "simpleCoeffs/n": [2, 2, 1]}
+            )
+            entries = foam_dict.load(target).entries
+        self.assertEqual(4, entries["numberOfSubdomains"])
+        self.assertEqual([2, 2, 1], entries["simpleCoeffs"]["n"])
+        self.assertEqual("simple", entries["method"])
+
+    def test_boundary_list(self):
+        text = polymesh.foam_header("polyBoundaryMesh", "boundary")
+        text += polymesh.boundary_string(
+            (
+                polymesh.Patch("walls", "wall", 4, 10),
+                polymesh.Patch("outlet", "patch", 2, 14),
+            )
+        )
+        parsed = foam_dict.loads(text)
+        self.assertEqual(["walls", "outlet"], parsed.entries[::2])
+        self.assertEqual(14, parsed.entries[3]["startFace"])
+        data = foam_dict.dumps(parsed)
+        self.assertIn(b"\n2\n(\n", data)
+        self.assertEqual(parsed, foam_dict.loads(data))
+
+    def test_unbalanced(self):
+        with self.assertRaises(foam_dict.FoamDictError):
+            foam_dict.loads("a { b 1;")
+
+
+if __name__ == "__main__":
+    unittest.main()
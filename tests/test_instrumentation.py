@@ -0,0 +1,193 @@
+import importlib
+import json
+import os
+import sys
+import tempfile
+import types
+import unittest
+from unittest import mock
+
+import geometry
+import instrumentation
+
+
+class RecordingMesh:
+    def __init__(self):
+        self.computed = False
+
+    def Compute(self):
+        self.computed = True
+        return True
+
+
+class RecordingBuilder:
+    ShapeType = {"VERTEX": 7, "FACE": 4}
+
+    def __init__(self):
+        self.received = []
+
+    def MakeVertex(self, x, y, z):
+        return (x, y, z)
+
+    def MakeLineTwoPnt(self, start, end):
+        return start, end
+
+    def Mesh(self, shape):
+        return RecordingMesh()
+
+    def SetName(self, obj, name):
+        self.received.append(obj)
+
+
+class FakeGeomBuilder(RecordingBuilder):
+    def __init__(self):
+        super().__init__()
+        self.ids = {}
+
+    def MakeFaceWires(self, lines, is_planar):
+        return frozenset(point for line in lines for point in line)
+
+    def MakeFuseList(self, faces, check_self_inte, rm_extra_edges):
+        return frozenset().union(*faces)
+
+    def SubShapeAllSortedCentres(self, shape, shape_type):
+        if shape_type == self.ShapeType["VERTEX"]:
+            return sorted(shape)
+        return []
+
+    def GetSubShapeID(self, shape, sub_shape):
+        return self.ids.setdefault(sub_shape, len(self.ids) + 1)
+
+    def GetVertexNearPoint(self, shape, point):
+        return min(
+            shape, key=lambda v: sum((a - b) ** 2 for a, b in zip(v, point))
+        )
+
+    def GetFaceByPoints(self, shape, *points):
+        return frozenset(points)
+
+    def MakeFillet2D(self, shape, radius, vertices):
+        return shape
+
+    def MakePrismDXDYDZ(self, shape, dx, dy, dz):
+        return shape
+
+    def CreateGroup(self, shape, shape_type):
+        return []
+
+    def AddObject(self, group, sub_shape_id):
+        group.append(sub_shape_id)
+
+    def RemoveObject(self, group, sub_shape_id):
+        if sub_shape_id in group:
+            group.remove(sub_shape_id)
+
+    def addToStudy(self, obj, name):
+        pass
+
+
+def fake_salome(geom: FakeGeomBuilder) -> dict:
+    geom_builder = types.SimpleNamespace(New=lambda: geom)
+    smesh_builder = types.SimpleNamespace(
+        New=RecordingBuilder, Mesh=RecordingMesh
+    )
+    return {
+        "SMESH": types.SimpleNamespace(FACE=4, VOLUME=5),
+        "medcoupling": types.SimpleNamespace(),
+        "salome": types.SimpleNamespace(),
+        "salome.geom": types.SimpleNamespace(geomBuilder=geom_builder),
+        "salome.geom.geomBuilder": geom_builder,
+        "salome.smesh": types.SimpleNamespace(smeshBuilder=smesh_builder),
+        "salome.smesh.smeshBuilder": smesh_builder,
+    }
+
+
+class InstrumentationTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.recorder = instrumentation.CallRecorder()
+        self.builder = instrumentation.InstrumentedBuilder(
+            RecordingBuilder(),
+            self.recorder,
+            "geom",
+            wrap_results={"Mesh": "mesh"},
+        )
+
+    def test_counts_calls(self):
+        for i in range(5):
+            self.builder.MakeVertex(i, 0, 0)
+        self.assertEqual(5, self.recorder.calls("geom.MakeVertex"))
+        self.assertEqual(0, self.recorder.calls("geom.MakeLineTwoPnt"))
+        self.assertTrue(self.recorder.seconds("geom.MakeVertex") >= 0)
+
+    def test_attributes_pass_through(self):
+        self.assertEqual(7, self.builder.ShapeType["VERTEX"])
+        self.assertEqual(0, self.recorder.total_calls)
+
+    def test_wraps_results(self):
+        mesh = self.builder.Mesh(None)
+        mesh.Compute()
+        self.assertEqual(1, self.recorder.calls("geom.Mesh"))
+        self.assertEqual(1, self.recorder.calls("mesh.Compute"))
+        self.assertTrue(mesh.wrapped.computed)
+
+    def test_unwraps_arguments(self):
+        mesh = self.builder.Mesh(None)
+        self.builder.SetName(mesh, "mesh")
+        received = self.builder.wrapped.received[0]
+        self.assertIsInstance(received, RecordingMesh)
+
+    def test_call_budget_is_linear(self):
+        small = geometry.create_lattice((2, 1, 2, 1, 1), 5, 0.5)
+        large = geometry.create_lattice(
+            (2, 1, 2, 3, 2, 1, 2, 3, 2, 1, 1), 5, 0.5
+        )
+        with mock.patch.dict(sys.modules, fake_salome(FakeGeomBuilder())):
+            sys.modules.pop("salome_interface", None)
+            salome_interface = importlib.import_module("salome_interface")
+            for lattice in small, large:
+                interface = salome_interface.SalomeInterface()
+                interface.create_geometry(lattice, 0.5)
+                points = len(geometry.lattice_point_set(lattice))
+                faces = len(interface.named_faces(lattice))
+                budgets = {
+                    "geom.MakeVertex": points + 12 * faces,
+                    "geom.MakeLineTwoPnt": len(
+                        geometry.lattice_lines(lattice)
+                    ),
+                    "geom.MakeFaceWires": len(
+                        tuple(geometry.lattice_channel_gen(lattice))
+                    ),
+                    "geom.GetSubShapeID": points + 16 * faces,
+                    "geom.GetFaceByPoints": 2 * faces,
+                    "geom.MakeFuseList": 1,
+                    "geom.MakeFillet2D": 1,
+                }
+                self.assertEqual(
+                    {},
+                    instrumentation.over_budget(interface.recorder, budgets),
+                )
+        self.assertEqual(
+            {"geom.MakeVertex": interface.recorder.calls("geom.MakeVertex")},
+            instrumentation.over_budget(
+                interface.recorder, {"geom.MakeVertex": points}
+            ),
+        )
+
+    def test_write_report(self):
+        self.builder.MakeVertex(0, 0, 0)
+        with tempfile.TemporaryDirectory() as tmp:
+            mesh_name = os.path.join(tmp, "design.unv")
+            filename = self.recorder.write_report(
+                instrumentation.report_name(mesh_name), design="design"
+            )
+            self.assertEqual(
+                os.path.join(tmp, "design.profile.json"), filename
+            )
+            with open(filename) as f:
+                report = json.load(f)
+        self.assertEqual("design", report["design"])
+        self.assertEqual(1, report["calls"]["geom.MakeVertex"]["calls"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import tempfile
+import unittest
+from time import sleep
+
+import ledger
+from design import Design, design_name
+
+
+def designs(n: int):
+    return tuple(
+        Design((2, 1, 2, 3, 2, 1, 1), i + 1, 0.5, 0.56, 15, 3)
+        for i in range(n)
+    )
+
+
+class LedgerTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.ledger = ledger.Ledger(
+            os.path.join(self.tmp.name, "ledger.sqlite"), stale_after=0.05
+        )
+        self.designs = designs(3)
+        self.ledger.add(self.designs)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_add_is_idempotent(self):
+        self.assertEqual(0, self.ledger.add(self.designs))
+        self.assertEqual(1, self.ledger.add(designs(4)))
+        self.assertEqual({"pending": 4}, self.ledger.status_counts())
+
+    def test_claim_is_exclusive(self):
+        claimed = tuple(self.ledger.claim(f"w{i}") for i in range(4))
+        ids = tuple(c.design_id for c in claimed[:3])
+        self.assertEqual(3, len(set(ids)))
+        self.assertIsNone(claimed[3])
+        self.assertEqual(self.designs[0], claimed[0].design)
+
+    def test_stale_claim_is_reclaimed(self):
+        first = self.ledger.claim("a")
+        for _ in range(2):
+            self.ledger.claim("b")
+        self.assertIsNone(self.ledger.claim("b"))
+        sleep(0.1)
+        self.assertEqual(1, self.ledger.heartbeat((first.design_id,), "a"))
+        reclaimed = self.ledger.claim("b")
+        self.assertNotEqual(first.design_id, reclaimed.design_id)
+        self.assertFalse(self.ledger.finish(reclaimed.design_id, "a"))
+
+    def test_resume_from_completed_stage(self):
+        claimed = self.ledger.claim("a")
+        self.assertTrue(
+            self.ledger.complete_stage(
+                claimed.design_id, "a", "mesh", 0, 1.5, {"mesh": "m.unv"}
+            )
+        )
+        self.assertEqual({"mesh": 1, None: 2}, self.ledger.stage_counts())
+        sleep(0.1)
+        resumed = self.ledger.claim("b")
+        self.assertEqual(claimed.design_id, resumed.design_id)
+        self.assertEqual(("mesh",), resumed.completed_stages)
+        self.assertEqual({"mesh": "m.unv"}, resumed.artifacts)
+        self.assertFalse(
+            self.ledger.complete_stage(claimed.design_id, "a", "case", 0, 1)
+        )
+
+    def test_finish_and_fail(self):
+        first = self.ledger.claim("a")
+        second = self.ledger.claim("a")
+        self.assertTrue(self.ledger.finish(first.design_id, "a"))
+        self.assertTrue(self.ledger.fail(second.design_id, "a", "error"))
+        self.assertEqual(
+            {"done": 1, "failed": 1, "pending": 1},
+            self.ledger.status_counts(),
+        )
+        self.assertEqual(1, self.ledger.retry_failed())
+        self.assertEqual("pending", self.ledger.status(second.design_id))
+        self.assertEqual(
+            "done", self.ledger.status(design_name(self.designs[0]))
+        )
+
+    def test_unserializable_artifacts_are_dropped(self):
+        claimed = self.ledger.claim("a")
+        self.ledger.complete_stage(
+            claimed.design_id, "a", "lattice", 0, 0, {"lattice": object()}
+        )
+        self.assertEqual(
+            {}, self.ledger.transitions(claimed.design_id)[0].artifacts
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,398 @@
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+import design
+import foam_dict
+import log_monitor
+import openfoam_runner
+import openfoam_writer
+from config import TEMPLATE_PATH
+
+RULES = log_monitor.MonitorRules(
+    max_courant=50,
+    min_delta_t=1e-12,
+    delta_t_collapse=1e-4,
+    max_residual=1e3,
+    steady_residual=None,
+    steady_steps=3,
+)
+
+
+def step_log(
+    time: float,
+    delta_t: float = 1e-5,
+    courant: float = 0.5,
+    residual: float = 1e-3,
+) -> str:
+    return (
+        f"Courant Number mean: {courant / 10} max: {courant}\n"
+        f"Interface Courant Number mean: 0 max: {courant / 2}\n"
+        f"deltaT = {delta_t}\n"
+        f"Time = {time}\n\n"
+        "PIMPLE: iteration 1\n"
+        "smoothSolver:  Solving for alpha.organic, Initial residual = "
+        f"{residual}, Final residual = 1e-9, No Iterations 1\n"
+        "DICPCG:  Solving for p_rgh, Initial residual = "
+        f"{residual * 2}, Final residual = 1e-9, No Iterations 12\n"
+        "DICPCG:  Solving for p_rgh, Initial residual = "
+        f"{residual / 2}, Final residual = 1e-9, No Iterations 3\n"
+        f"ExecutionTime = {time * 100} s  ClockTime = 1 s\n\n"
+    )
+
+
+def solver_script(steps: str, sleep: float) -> str:
+    return (
+        "import sys, time\n"
+        f"sys.stdout.write({steps!r})\n"
+        "sys.stdout.flush()\n"
+        f"time.sleep({sleep})\n"
+    )
+
+
+class LogMonitorTestCase(unittest.TestCase):
+    def test_parse_steps(self):
+        parser = log_monitor.LogParser()
+        data = (step_log(1e-5) + step_log(2e-5, courant=0.7)).encode()
+        samples = parser.feed(data[:100]) + parser.feed(data[100:])
+        self.assertEqual((1e-5, 2e-5), tuple(s.time for s in samples))
+        self.assertEqual(0.7, samples[1].courant_max)
+        self.assertEqual(0.35, samples[1].interface_courant_max)
+        self.assertEqual(1e-5, samples[0].delta_t)
+        self.assertEqual(
+            {"alpha.organic": 1e-3, "p_rgh": 2e-3}, samples[0].residuals
+        )
+
+    def test_ring_buffer(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "log.interFoam")
+            monitor = log_monitor.LogMonitor(path, RULES, capacity=4)
+            self.assertEqual([], monitor.poll())
+            with open(path, "w") as f:
+                f.write("".join(step_log(i * 1e-5) for i in range(1, 7)))
+                f.write("Courant Number mean: 0.05 max: 0.5\n")
+            self.assertEqual(6, len(monitor.poll()))
+            with open(path, "a") as f:
+                f.write(step_log(7e-5).split("\n", 1)[1])
+            self.assertEqual(1, len(monitor.poll()))
+        self.assertEqual(4, len(monitor.samples))
+        self.assertEqual(7, monitor.steps)
+        self.assertEqual(7e-5, monitor.latest.time)
+        self.assertIsNone(monitor.verdict)
+
+    def check(self, *logs: str, rules=RULES) -> log_monitor.Verdict:
+        monitor = log_monitor.LogMonitor("log", rules)
+        for sample in log_monitor.LogParser().feed("".join(logs).encode()):
+            monitor.add(sample)
+        return monitor.verdict
+
+    def test_divergence_rules(self):
+        self.assertIsNone(self.check(step_log(1e-5), step_log(2e-5)))
+        courant = self.check(step_log(1e-5), step_log(2e-5, courant=80))
+        self.assertEqual(log_monitor.MonitorAction.ABORT, courant.action)
+        self.assertIn("Courant", courant.reason)
+        collapse = self.check(step_log(1e-5), step_log(2e-5, delta_t=1e-10))
+        self.assertIn("deltaT", collapse.reason)
+        nan = self.check(step_log(1e-5, residual=float("nan")))
+        self.assertIn("non-finite", nan.reason)
+        residual = self.check(step_log(1e-5, residual=1e4))
+        self.assertIn("residual", residual.reason)
+
+    def test_steady_rule(self):
+        rules = RULES._replace(steady_residual=1e-4)
+        logs = [step_log(i * 1e-5, residual=1e-6) for i in range(1, 4)]
+        self.assertIsNone(self.check(*logs[:2], rules=rules))
+        verdict = self.check(step_log(0), *logs, rules=rules)
+        self.assertEqual(log_monitor.MonitorAction.STOP, verdict.action)
+
+    def test_request_stop(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            os.makedirs(os.path.join(tmp, "system"))
+            control_dict = os.path.join(tmp, "system", "controlDict")
+            with open(
+                os.path.join(
+                    TEMPLATE_PATH, "interFoam", "system", "controlDict"
+                )
+            ) as f, open(control_dict, "w") as g:
+                g.write(f.read())
+            log_monitor.request_stop(tmp)
+            entries = foam_dict.load(control_dict).entries
+        self.assertEqual("writeNow", entries["stopAt"])
+        self.assertEqual(0.1, entries["endTime"])
+
+    def run_solver(self, steps: str, sleep: float):
+        with tempfile.TemporaryDirectory() as tmp:
+            monitor = log_monitor.LogMonitor(
+                os.path.join(tmp, "log.interFoam"), RULES, interval=0.05
+            )
+            args = (sys.executable, "-c", solver_script(steps, sleep))
+            asyncio.run(
+                openfoam_runner.run_monitored("interFoam", args, tmp, monitor)
+            )
+        return monitor
+
+    def test_run_monitored(self):
+        monitor = self.run_solver(step_log(1e-5) + step_log(2e-5), 0)
+        self.assertEqual(2, monitor.steps)
+        self.assertIsNone(monitor.summary()["reason"])
+
+    def test_divergent_run_is_killed(self):
+        started = time.perf_counter()
+        with self.assertRaises(openfoam_runner.SolverAborted) as caught:
+            self.run_solver(step_log(1e-5) + step_log(2e-5, courant=1e3), 30)
+        self.assertLess(time.perf_counter() - started, 10)
+        self.assertIn("Courant", str(caught.exception))
+
+    @unittest.skipUnless(hasattr(os, "killpg"), "needs process groups")
+    def test_abort_kills_process_group(self):
+        steps = step_log(1e-5) + step_log(2e-5, courant=1e3)
+        script = (
+            "import signal, subprocess, sys, time\n"
+            "signal.signal(signal.SIGTERM, signal.SIG_IGN)\n"
+            "child = subprocess.Popen("
+            "[sys.executable, '-c', 'import time; time.sleep(60)'])\n"
+            "open('child.pid', 'w').write(str(child.pid))\n"
+            f"sys.stdout.write({steps!r})\n"
+            "sys.stdout.flush()\n"
+            "time.sleep(60)\n"
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            monitor = log_monitor.LogMonitor(
+                os.path.join(tmp, "log.interFoam"),
+                RULES,
+                interval=0.05,
+                grace=0.2,
+            )
+            started = time.perf_counter()
+            with self.assertRaises(openfoam_runner.SolverAborted):
+                asyncio.run(
+                    openfoam_runner.run_monitored(
+                        "interFoam",
+                        (sys.executable, "-c", script),
+                        tmp,
+                        monitor,
+                    )
+                )
+            with open(os.path.join(tmp, "child.pid")) as f:
+                child = int(f.read())
+        self.assertLess(time.perf_counter() - started, 10)
+        for _ in range(50):
+            if not running(child):
+                break
+            time.sleep(0.05)
+        self.assertFalse(running(child))
+
+    @unittest.skipUnless(hasattr(os, "killpg"), "needs process groups")
+    def test_cancel_kills_solver(self):
+        script = (
+            "import os, time\n"
+            "open('solver.pid', 'w').write(str(os.getpid()))\n"
+            "time.sleep(60)\n"
+        )
+
+        async def cancel(tmp: str):
+            monitor = log_monitor.LogMonitor(
+                os.path.join(tmp, "log.interFoam"),
+                RULES,
+                interval=0.05,
+                grace=0.2,
+            )
+            task = asyncio.ensure_future(
+                openfoam_runner.run_monitored(
+                    "interFoam", (sys.executable, "-c", script), tmp, monitor
+                )
+            )
+            pid_file = os.path.join(tmp, "solver.pid")
+            while not os.path.exists(pid_file) or not os.path.getsize(
+                pid_file
+            ):
+                await asyncio.sleep(0.05)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            with open(pid_file) as f:
+                return int(f.read())
+
+        with tempfile.TemporaryDirectory() as tmp:
+            solver = asyncio.run(cancel(tmp))
+        self.assertFalse(running(solver))
+
+
+def running(pid: int) -> bool:
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] not in "ZX"
+    except FileNotFoundError:
+        return False
+
+
+def write_outlet(case_path: str, rows, names=None):
+    for name, column in zip(names or OUTLET_NAMES, (1, 2)):
+        if name is None:
+            continue
+        path = os.path.join(case_path, "postProcessing", name, "0")
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, "surfaceFieldValue.dat"), "a") as f:
+            f.write(f"# Time {name}\n")
+            f.writelines(f"{row[0]}\t{row[column]}\n" for row in rows)
+
+
+def outlet_rows(times, mean, cov):
+    return [(t, mean(t), cov(t)) for t in times]
+
+
+OUTLET_NAMES = tuple(openfoam_writer.OUTLET_FUNCTIONS)
+
+CRITERION = log_monitor.SteadyCriterion(
+    window=0.01, tolerance=1e-3, min_time=0.01
+)
+
+
+class SteadyStopTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.case_path = self.tmp.name
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_case_controls(self):
+        controls = design.case_controls(
+            dict(endTime=0.02), steady=True, reduced=False
+        )
+        self.assertEqual(0.02, controls["endTime"])
+        average = controls["functions/outletAverage"]
+        self.assertEqual("areaAverage", average["operation"])
+        self.assertEqual(["alpha.organic"], average["fields"])
+        self.assertIsNone(design.case_controls(steady=False, reduced=False))
+
+    def test_unsteady_outlet(self):
+        tracker = log_monitor.OutletTracker(self.case_path, CRITERION)
+        self.assertIsNone(tracker.poll())
+        times = [i * 0.001 for i in range(40)]
+        write_outlet(
+            self.case_path, outlet_rows(times, lambda t: 0.5 + t, lambda t: 1)
+        )
+        self.assertIsNone(tracker.poll())
+        self.assertEqual(0.039, tracker.samples[-1].time)
+        self.assertLess(len(tracker.samples), 15)
+
+    def test_steady_outlet(self):
+        tracker = log_monitor.OutletTracker(self.case_path, CRITERION)
+        early = [i * 0.001 for i in range(20)]
+        late = [i * 0.001 for i in range(20, 40)]
+        write_outlet(
+            self.case_path,
+            outlet_rows(early, lambda t: 10 * t, lambda t: 2.0),
+        )
+        self.assertIsNone(tracker.poll())
+        write_outlet(
+            self.case_path,
+            outlet_rows(late, lambda t: 0.4 + 1e-5 * t, lambda t: 0.5),
+        )
+        verdict = tracker.poll()
+        self.assertEqual(log_monitor.MonitorAction.STOP, verdict.action)
+        self.assertEqual(0.039, verdict.time)
+        sample = tracker.samples[-1]
+        self.assertAlmostEqual(0.04, sample.variance, places=4)
+
+    def test_initial_plateau(self):
+        tracker = log_monitor.OutletTracker(self.case_path, CRITERION)
+        plateau = [i * 0.001 for i in range(30)]
+        write_outlet(
+            self.case_path, outlet_rows(plateau, lambda t: 1, lambda t: 0)
+        )
+        self.assertIsNone(tracker.poll())
+        self.assertFalse(tracker.armed)
+        transient = [i * 0.001 for i in range(30, 45)]
+        write_outlet(
+            self.case_path,
+            outlet_rows(
+                transient, lambda t: 1 - 20 * (t - 0.029), lambda t: t
+            ),
+        )
+        self.assertIsNone(tracker.poll())
+        self.assertTrue(tracker.armed)
+        self.assertGreaterEqual(tracker.samples[0].time, 0.03)
+        steady = [i * 0.001 for i in range(45, 60)]
+        write_outlet(
+            self.case_path,
+            outlet_rows(steady, lambda t: 0.6, lambda t: 0.1),
+        )
+        verdict = tracker.poll()
+        self.assertEqual(log_monitor.MonitorAction.STOP, verdict.action)
+        self.assertAlmostEqual(0.059, verdict.time)
+
+    def test_residence_time_delays_stop(self):
+        monitor = log_monitor.case_monitor(
+            self.case_path, steady=True, min_time=0.05
+        )
+        self.assertEqual(0.05, monitor.trackers[0].criterion.min_time)
+        self.assertEqual((), log_monitor.case_monitor(self.case_path).trackers)
+
+    def test_partial_rows_wait_for_both_functions(self):
+        tracker = log_monitor.OutletTracker(self.case_path, CRITERION)
+        write_outlet(
+            self.case_path,
+            outlet_rows([0.001], lambda t: 0.5, lambda t: 0.1),
+            names=OUTLET_NAMES[:1],
+        )
+        tracker.poll()
+        self.assertEqual(0, len(tracker.samples))
+        write_outlet(
+            self.case_path,
+            outlet_rows([0.001], lambda t: 0.5, lambda t: 0.1),
+            names=(None, OUTLET_NAMES[1]),
+        )
+        tracker.poll()
+        self.assertEqual(1, len(tracker.samples))
+
+    def test_clean_stop(self):
+        system = os.path.join(self.case_path, "system")
+        os.makedirs(system)
+        shutil.copy(
+            os.path.join(TEMPLATE_PATH, "interFoam", "system", "controlDict"),
+            system,
+        )
+        write_outlet(
+            self.case_path,
+            outlet_rows(
+                [i * 0.001 for i in range(30)],
+                lambda t: 1.0 if t < 0.005 else 0.3,
+                lambda t: 0.0 if t < 0.005 else 0.2,
+            ),
+        )
+        script = (
+            "import time\n"
+            "for _ in range(600):\n"
+            "    if 'writeNow' in open('system/controlDict').read():\n"
+            "        break\n"
+            "    time.sleep(0.05)\n"
+        )
+        monitor = log_monitor.LogMonitor(
+            os.path.join(self.case_path, "log.interFoam"),
+            RULES,
+            interval=0.05,
+            trackers=(log_monitor.OutletTracker(self.case_path, CRITERION),),
+        )
+        started = time.perf_counter()
+        asyncio.run(
+            openfoam_runner.run_monitored(
+                "interFoam",
+                (sys.executable, "-c", script),
+                self.case_path,
+                monitor,
+            )
+        )
+        self.assertLess(time.perf_counter() - started, 10)
+        summary = monitor.summary()
+        self.assertEqual("stop", summary["action"])
+        self.assertEqual(0.029, summary["stop_time"])
+
+
+if __name__ == "__main__":
+    unittest.main()
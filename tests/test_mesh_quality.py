@@ -0,0 +1,98 @@
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import mesh_quality
+import polymesh
+from design import MeshSettings
+from tests.test_polymesh import kuhn_tets
+from tests.test_unv import write_unv
+
+
+def sliver_points(points: np.ndarray) -> np.ndarray:
+    points = points.copy()
+    points[np.all(points == (1, 1, 1), axis=1)] = (1, 1, 1.9999)
+    return points
+
+
+class MeshQualityTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.points, self.tets = kuhn_tets(3, 2, 2)
+
+    def test_regular_mesh(self):
+        quality = mesh_quality.tet_quality(self.points, self.tets)
+        np.testing.assert_allclose(1 / 6, quality.volume)
+        self.assertTrue(np.all(quality.aspect_ratio < 2))
+        self.assertTrue(np.all(quality.skewness <= 0.25 + 1e-9))
+        self.assertAlmostEqual(
+            np.degrees(np.arccos(np.sqrt(2 / 3))),
+            quality.non_orthogonality.max(),
+        )
+        report = mesh_quality.quality_report(quality, bins=5, worst=3)
+        self.assertTrue(report.passed)
+        self.assertEqual(len(self.tets), report.cells)
+        self.assertEqual({}, mesh_quality.failures(report))
+        for summary in report.metrics.values():
+            self.assertEqual(len(self.tets), sum(summary.counts))
+            self.assertEqual(6, len(summary.edges))
+            self.assertEqual(3, len(summary.worst))
+        json.dumps(mesh_quality.report_dict(report))
+
+    def test_sliver(self):
+        points = sliver_points(self.points)
+        moved = np.flatnonzero(np.all(self.points == (1, 1, 1), axis=1))[0]
+        report = mesh_quality.quality_report(
+            mesh_quality.tet_quality(points, self.tets)
+        )
+        self.assertFalse(report.passed)
+        failures = mesh_quality.failures(report)
+        self.assertIn("volume", failures)
+        self.assertIn("aspect_ratio", failures)
+        for name in ("volume", "aspect_ratio"):
+            worst = report.metrics[name].worst[: failures[name]]
+            self.assertTrue(all(moved in self.tets[i] for i in worst))
+        self.assertIn("aspect_ratio", mesh_quality.failure_message(report))
+        relaxed = mesh_quality.QualityThresholds(
+            min_volume_ratio=0,
+            max_aspect_ratio=np.inf,
+            max_skewness=np.inf,
+            max_non_orthogonality=90,
+        )
+        self.assertTrue(
+            mesh_quality.quality_report(
+                mesh_quality.tet_quality(points, self.tets), relaxed
+            ).passed
+        )
+
+    def test_unv_and_case(self):
+        points = sliver_points(self.points)
+        expected = mesh_quality.tet_quality(points * 1e-3, self.tets)
+        with tempfile.TemporaryDirectory() as tmp:
+            mesh_file = write_unv(
+                os.path.join(tmp, "mesh.unv"), points, {111: self.tets + 1}
+            )
+            from_unv = mesh_quality.unv_quality(mesh_file)
+            mesh = polymesh.build_polymesh(points, self.tets)
+            polymesh.write_polymesh(mesh, tmp, scale=1e-3)
+            from_case = mesh_quality.case_quality(tmp)
+            self.assertEqual(
+                mesh_quality.failures(mesh_quality.check_mesh(mesh_file)),
+                mesh_quality.failures(mesh_quality.check_case(tmp)),
+            )
+        for quality in from_unv, from_case:
+            for name in mesh_quality.METRICS:
+                np.testing.assert_allclose(
+                    getattr(expected, name), getattr(quality, name)
+                )
+
+    def test_remesh_settings(self):
+        settings = mesh_quality.remesh_settings(MeshSettings(optimize=0))
+        self.assertEqual(MeshSettings(fineness=4, optimize=1), settings)
+        self.assertIsNone(mesh_quality.remesh_settings(settings))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,225 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from time import sleep
+from typing import Tuple
+
+import mesh_store
+import openfoam_runner
+from design import MeshSettings
+from instrumentation import report_name
+from polymesh import polymesh_name, read_points
+from tests.test_polymesh import kuhn_tets
+from tests.test_runner import FAKE_SALOME
+from tests.test_unv import write_unv
+
+
+class MeshStoreTestCase(unittest.TestCase):
+    geometry = mesh_store.MeshGeometry(
+        lattice_structure=(2, 1, 2, 3, 2, 1, 1),
+        channel_spacing=5,
+        channel_width=0.5,
+        channel_height=0.56,
+    )
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = mesh_store.MeshStore(
+            root=os.path.join(self.tmp.name, "store"),
+            quota_bytes=25,
+            polymesh=False,
+        )
+        self.fake_salome = os.path.join(self.tmp.name, "fake_salome.py")
+        with open(self.fake_salome, "w") as f:
+            f.write(FAKE_SALOME)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def mesh_file(self, name: str, size: int = 10, cells: int = None) -> str:
+        filename = os.path.join(self.tmp.name, f"{name}.unv")
+        with open(filename, "w") as f:
+            f.write("x" * size)
+        if cells is not None:
+            with open(report_name(filename), "w") as f:
+                json.dump(dict(cells=cells), f)
+        return filename
+
+    def test_mesh_key(self):
+        key = mesh_store.mesh_key(self.geometry)
+        listed = self.geometry._replace(
+            lattice_structure=list(self.geometry.lattice_structure)
+        )
+        self.assertEqual(key, mesh_store.mesh_key(listed))
+        self.assertEqual(
+            key, mesh_store.mesh_key(self.geometry, MeshSettings())
+        )
+        self.assertNotEqual(
+            key, mesh_store.mesh_key(self.geometry, MeshSettings(fineness=1))
+        )
+        self.assertNotEqual(
+            key,
+            mesh_store.mesh_key(self.geometry._replace(channel_height=0.5)),
+        )
+
+    def test_put_and_get(self):
+        self.assertIsNone(self.store.get("a"))
+        filename = self.store.put("a", self.mesh_file("a", cells=120))
+        self.assertEqual(filename, self.store.get("a"))
+        record = self.store.record("a")
+        self.assertEqual((10, 120), (record.size, record.cells))
+        self.assertTrue(os.path.exists(report_name(filename)))
+
+    def test_cells_from_unv(self):
+        points, tets = kuhn_tets(2, 2, 2)
+        filename = write_unv(
+            os.path.join(self.tmp.name, "a.unv"), points, {111: tets + 1}
+        )
+        self.assertEqual(len(tets), mesh_store.report_cells(filename))
+        self.assertIsNone(mesh_store.report_cells(self.mesh_file("b")))
+
+    def test_polymesh_export(self):
+        points, tets = kuhn_tets(2, 2, 2)
+        store = mesh_store.MeshStore(
+            root=self.store.root, quota_bytes=1 << 30, polymesh=True
+        )
+        filename = store.put(
+            "a",
+            write_unv(
+                os.path.join(self.tmp.name, "a.unv"), points, {111: tets + 1}
+            ),
+        )
+        self.assertTrue(os.path.isdir(polymesh_name(filename)))
+        self.assertGreater(store.record("a").size, os.path.getsize(filename))
+        case_path = os.path.join(self.tmp.name, "case")
+        self.assertTrue(openfoam_runner.copy_polymesh(filename, case_path))
+        self.assertEqual(len(points), len(read_points(case_path)))
+        store.remove("a")
+        self.assertFalse(os.path.exists(polymesh_name(filename)))
+        self.assertFalse(openfoam_runner.copy_polymesh(filename, case_path))
+
+    def test_keeps_exported_polymesh(self):
+        store = mesh_store.MeshStore(
+            root=self.store.root, quota_bytes=1 << 30, polymesh=True
+        )
+        mesh_file = self.mesh_file("a")
+        exported = os.path.join(polymesh_name(mesh_file), "constant")
+        os.makedirs(os.path.join(exported, "polyMesh"))
+        filename = store.put("a", mesh_file)
+        self.assertTrue(
+            os.path.isdir(
+                os.path.join(polymesh_name(filename), "constant", "polyMesh")
+            )
+        )
+        self.assertFalse(os.path.exists(polymesh_name(mesh_file)))
+
+    def test_missing_file_is_a_miss(self):
+        filename = self.store.put("a", self.mesh_file("a"))
+        os.remove(filename)
+        self.assertIsNone(self.store.get("a"))
+        self.assertIsNone(self.store.record("a"))
+
+    def test_evicts_least_recently_used(self):
+        self.store.put("a", self.mesh_file("a"))
+        sleep(0.01)
+        self.store.put("b", self.mesh_file("b"))
+        sleep(0.01)
+        self.store.get("a")
+        sleep(0.01)
+        self.store.put("c", self.mesh_file("c"))
+        self.assertEqual(
+            ("a", "c"), tuple(sorted(r.key for r in self.store.records()))
+        )
+        self.assertIsNone(self.store.get("b"))
+        self.assertEqual(20, self.store.total_size)
+
+    def test_pinned_meshes_are_not_evicted(self):
+        self.store.put("a", self.mesh_file("a"))
+        self.store.pin("a", "job-1")
+        sleep(0.01)
+        self.store.put("b", self.mesh_file("b"))
+        sleep(0.01)
+        self.store.put("c", self.mesh_file("c"))
+        self.assertEqual({"a"}, self.store.pinned())
+        self.assertEqual(
+            ("a", "c"), tuple(sorted(r.key for r in self.store.records()))
+        )
+        self.store.release("job-1")
+        self.assertEqual(set(), self.store.pinned())
+        self.store.put("d", self.mesh_file("d"))
+        self.assertIsNone(self.store.get("a"))
+
+    def counting_command(self) -> Tuple[str, ...]:
+        script = os.path.join(self.tmp.name, "counting_salome.py")
+        with open(script, "w") as f:
+            f.write(
+                "import time\n"
+                f"open({self.count_file!r}, 'a').write('x')\n"
+                "time.sleep(0.3)\n" + FAKE_SALOME
+            )
+        return sys.executable, script
+
+    @property
+    def count_file(self) -> str:
+        return os.path.join(self.tmp.name, "count")
+
+    def meshing_runs(self) -> int:
+        with open(self.count_file) as f:
+            return len(f.read())
+
+    def test_concurrent_misses_mesh_once(self):
+        command = self.counting_command()
+
+        async def create_all():
+            return await asyncio.gather(
+                *(
+                    self.store.get_or_create_async(
+                        self.geometry,
+                        command=command,
+                        keep="never",
+                        holder=f"job-{i}",
+                    )
+                    for i in range(3)
+                )
+            )
+
+        filenames = asyncio.run(create_all())
+        self.assertEqual(1, len(set(filenames)))
+        self.assertEqual(1, self.meshing_runs())
+        self.assertEqual(
+            {mesh_store.mesh_key(self.geometry)}, self.store.pinned()
+        )
+
+    def test_concurrent_threads_mesh_once(self):
+        command = self.counting_command()
+        geometry = self.geometry._replace(channel_spacing=4)
+        with ThreadPoolExecutor(3) as pool:
+            filenames = tuple(
+                pool.map(
+                    lambda _: self.store.get_or_create(
+                        geometry, command=command, keep="never"
+                    ),
+                    range(3),
+                )
+            )
+        self.assertEqual(1, len(set(filenames)))
+        self.assertEqual(1, self.meshing_runs())
+
+    def test_get_or_create(self):
+        command = (sys.executable, self.fake_salome)
+        first = self.store.get_or_create(
+            self.geometry, command=command, keep="never"
+        )
+        second = self.store.get_or_create(
+            self.geometry, command=command + ("fail",), keep="never"
+        )
+        self.assertEqual(first, second)
+        self.assertEqual(1, len(self.store.records()))
+
+
+if __name__ == "__main__":
+    unittest.main()
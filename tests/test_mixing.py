@@ -0,0 +1,84 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import mixing
+import polymesh
+from tests.test_polymesh import boundary_triangles, kuhn_tets
+from tests.test_results import write_field
+
+
+class MixingTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.case_path = self.tmp.name
+        points, tets = kuhn_tets(4, 2, 2)
+        outlet = boundary_triangles(points, tets, 0, 4)
+        self.mesh = polymesh.build_polymesh(points, tets, dict(outlet=outlet))
+        polymesh.write_polymesh(self.mesh, self.case_path)
+        centres = points[tets].mean(axis=1)
+        self.segregated = np.where(centres[:, 0] < 2, 1.0, 0.0)
+        self.mixed = np.full(len(tets), 0.5)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def write_times(self, case_path: str, *fields: np.ndarray):
+        for time, alpha in zip(("0", "0.1", "0.2"), fields):
+            write_field(
+                os.path.join(case_path, time, "alpha.organic"),
+                alpha,
+                dict(outlet=0.0, defaultFaces=0.0),
+            )
+
+    def test_case_mesh(self):
+        mesh = mixing.read_case_mesh(self.case_path)
+        self.assertAlmostEqual(16, mesh.volumes.sum())
+        self.assertEqual(8, len(mesh.areas[mesh.patches["outlet"]]))
+        np.testing.assert_allclose(
+            4, np.linalg.norm(mesh.areas[mesh.patches["outlet"]], axis=1).sum()
+        )
+
+    def test_metrics(self):
+        self.write_times(self.case_path, self.segregated, self.mixed)
+        segregated, mixed = mixing.case_metrics(self.case_path)
+        self.assertEqual((0, 0.1), (segregated.time, mixed.time))
+        self.assertAlmostEqual(0.5, segregated.mean)
+        self.assertAlmostEqual(1, segregated.segregation)
+        self.assertAlmostEqual(0, segregated.mixing_index)
+        self.assertAlmostEqual(4, segregated.interface_area, delta=1)
+        self.assertAlmostEqual(0, segregated.outlet_mean)
+        self.assertAlmostEqual(0, mixed.segregation)
+        self.assertAlmostEqual(1, mixed.mixing_index)
+        self.assertAlmostEqual(0, mixed.interface_area)
+        self.assertAlmostEqual(0.5, mixed.outlet_mean)
+
+    def test_uniform_outlet_uses_owner_cells(self):
+        alpha = np.where(self.segregated > 0, 0.0, 1.0)
+        self.write_times(self.case_path, alpha)
+        metrics = mixing.case_metrics(self.case_path)[0]
+        self.assertAlmostEqual(1, metrics.outlet_mean)
+        self.assertAlmostEqual(1, metrics.outlet_segregation)
+
+    def test_single_phase_is_segregated(self):
+        self.assertEqual(1, mixing.segregation(0, 0))
+        self.assertEqual(1, mixing.segregation(1, 0))
+        self.assertTrue(np.isnan(mixing.segregation(float("nan"), 0)))
+        self.write_times(self.case_path, np.zeros_like(self.mixed))
+        self.assertEqual(1, mixing.mixing_objective(self.case_path))
+
+    def test_analyze_cases(self):
+        other = os.path.join(self.case_path, "other")
+        polymesh.write_polymesh(self.mesh, other)
+        self.write_times(self.case_path, self.segregated, self.mixed)
+        self.write_times(other, self.mixed, self.segregated, self.mixed)
+        analyzed = mixing.analyze_cases((self.case_path, other), workers=2)
+        self.assertEqual((2, 3), tuple(map(len, analyzed.values())))
+        self.assertEqual(analyzed[other], mixing.read_metrics(other))
+        self.assertAlmostEqual(0, mixing.mixing_objective(other))
+
+
+if __name__ == "__main__":
+    unittest.main()
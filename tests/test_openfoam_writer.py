@@ -1,4 +1,8 @@
+import os
+import shutil
+import tempfile
 import unittest
+import foam_dict
 import openfoam_writer
 
 
@@ -109,8 +113,13 @@ class MyTestCase(unittest.TestCase):
             openfoam_writer.parse_template_components("U")
         )
         self.assertEqual(3, len(template_components))
-        self.assertTrue(
-            all(map(lambda x: x.lines[-1] == "}\n", template_components))
+        self.assertEqual(
+            ("$walls_U", "$inlet_U", "$outlet_U"),
+            tuple(c.component_name for c in template_components),
+        )
+        self.assertEqual(
+            dict(type="fixedValue", value="$inlet_value"),
+            template_components[1].entries,
         )
 
     def test_parse_component_variables(self):
@@ -142,10 +151,10 @@ class MyTestCase(unittest.TestCase):
             ),
         )
         component = openfoam_writer.insert_experiment_variable("U", variable)
-        self.assertEqual("aqueous_inlet_1\n", component.lines[0])
+        self.assertEqual("aqueous_inlet_1", component.component_name)
         self.assertEqual(
-            "    value           uniform (1.2627 1.2627 0);\n",
-            component.lines[3],
+            "uniform (1.2627 1.2627 0)",
+            foam_dict.format_inline(component.entries["value"]),
         )
 
     def test_insert_experiment_variable_walls(self):
@@ -162,14 +171,19 @@ class MyTestCase(unittest.TestCase):
             ),
         )
         component = openfoam_writer.insert_experiment_variable("U", variable)
-        self.assertEqual("walls\n", component.lines[0])
+        self.assertEqual("walls", component.component_name)
+        self.assertEqual(dict(type="noSlip"), component.entries)
 
     def test_insert_experiment_variables_transport(self):
         variable = self.experiment_variables[1]
         component = openfoam_writer.insert_experiment_variable(
             "transportProperties", variable
         )
-        self.assertEqual("aqueous\n", component.lines[0])
+        self.assertEqual("aqueous", component.component_name)
+        self.assertEqual(
+            "[0 2 -1 0 0 0 0] 8.926e-07",
+            foam_dict.format_inline(component.entries["nu"]),
+        )
 
     def test_components_start(self):
         template = openfoam_writer.get_template("U")
@@ -180,12 +194,200 @@ class MyTestCase(unittest.TestCase):
         res = openfoam_writer.replace_variables("U", self.experiment_variables)
         self.assertEqual(47, len(res))
 
+    def test_combine_entries_dedup(self):
+        variables = self.experiment_variables[1:3] * 20
+        components = tuple(
+            openfoam_writer.insert_experiment_variable("U", v)
+            for v in variables
+        )
+        entries = openfoam_writer.combine_entries(components)
+        self.assertEqual(["aqueous_inlet_1", "aqueous_inlet_2"], list(entries))
+
+    def test_render(self):
+        text = openfoam_writer.render("U", self.experiment_variables)
+        self.assertEqual(
+            "".join(
+                openfoam_writer.replace_variables(
+                    "U", self.experiment_variables
+                )
+            ),
+            text,
+        )
+        self.assertNotIn("$components", text)
+
     def test_create_case(self):
         case = openfoam_writer.Case(
             "test_case", "interFoam", self.experiment_variables
         )
         openfoam_writer.create_case(case, True)
 
+    def test_create_cases(self):
+        cases = tuple(
+            openfoam_writer.Case(
+                f"case_{i}", "interFoam", self.experiment_variables
+            )
+            for i in range(6)
+        ) + (
+            openfoam_writer.Case(
+                "missing_solver", "noSuchFoam", self.experiment_variables
+            ),
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            results = openfoam_writer.create_cases(
+                cases, workers=3, cases_path=tmp
+            )
+            self.assertEqual(
+                tuple(c.case_name for c in cases),
+                tuple(r.case_name for r in results),
+            )
+            self.assertTrue(all(r.error is None for r in results[:-1]))
+            self.assertIsInstance(results[-1].error, FileNotFoundError)
+            self.assertEqual(
+                sorted(f"case_{i}" for i in range(6)), sorted(os.listdir(tmp))
+            )
+            with open(os.path.join(results[0].path, "0", "U")) as f:
+                self.assertNotIn("$components", f.read())
+
+    def test_create_case_overwrite(self):
+        case = openfoam_writer.Case(
+            "test_case", "interFoam", self.experiment_variables
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            case_path = openfoam_writer.create_case(case, cases_path=tmp)
+            marker = os.path.join(case_path, "marker")
+            open(marker, "w").close()
+            openfoam_writer.create_case(case, cases_path=tmp)
+            self.assertTrue(os.path.exists(marker))
+            openfoam_writer.create_case(case, True, cases_path=tmp)
+            self.assertFalse(os.path.exists(marker))
+            self.assertEqual(["test_case"], os.listdir(tmp))
+
+    def test_linked_cases(self):
+        case = openfoam_writer.Case(
+            "test_case",
+            "interFoam",
+            self.experiment_variables,
+            controls=dict(endTime=0.02),
+        )
+        base = os.path.join(openfoam_writer.TEMPLATE_PATH, "interFoam")
+        with tempfile.TemporaryDirectory() as tmp:
+            hardlinked = openfoam_writer.create_case(
+                case, cases_path=os.path.join(tmp, "hard"), link="hardlink"
+            )
+            symlinked = openfoam_writer.create_case(
+                case, cases_path=os.path.join(tmp, "sym"), link="symlink"
+            )
+            copied = openfoam_writer.create_case(
+                case, cases_path=os.path.join(tmp, "copy")
+            )
+            for shared in ("system/fvSchemes", "constant/g"):
+                self.assertTrue(
+                    os.path.samefile(
+                        os.path.join(base, shared),
+                        os.path.join(hardlinked, shared),
+                    )
+                )
+                self.assertTrue(
+                    os.path.islink(os.path.join(symlinked, shared))
+                )
+            for private in (
+                "system/controlDict",
+                "system/decomposeParDict",
+                "0/U",
+                "0/p_rgh",
+                "constant/transportProperties",
+            ):
+                for case_path in hardlinked, symlinked:
+                    path = os.path.join(case_path, private)
+                    self.assertFalse(os.path.islink(path))
+                    self.assertFalse(
+                        os.path.samefile(os.path.join(base, private), path)
+                    )
+            for case_path in hardlinked, symlinked:
+                for path in openfoam_writer.iter_dir(copied):
+                    relative_path = os.path.relpath(path, copied)
+                    with open(path) as a, open(
+                        os.path.join(case_path, relative_path)
+                    ) as b:
+                        self.assertEqual(a.read(), b.read())
+        with open(os.path.join(base, "system", "controlDict")) as f:
+            self.assertIn("endTime         0.1;\n", f.readlines())
+
+    def test_write_controls(self):
+        template = os.path.join(openfoam_writer.TEMPLATE_PATH, "interFoam")
+        with tempfile.TemporaryDirectory() as tmp:
+            shutil.copytree(
+                os.path.join(template, "system"), os.path.join(tmp, "system")
+            )
+            openfoam_writer.write_controls(
+                tmp, dict(endTime=0.02, maxCo=0.5, graphFormat="raw")
+            )
+            with open(os.path.join(tmp, "system", "controlDict")) as f:
+                lines = f.readlines()
+            entries = foam_dict.load(
+                os.path.join(tmp, "system", "controlDict")
+            ).entries
+        self.assertIn("endTime         0.02;\n", lines)
+        self.assertIn("maxCo           0.5;\n", lines)
+        self.assertIn("graphFormat     raw;\n", lines)
+        self.assertNotIn("endTime         0.1;\n", lines)
+        self.assertEqual("interFoam", entries["application"])
+        self.assertEqual("raw", entries["graphFormat"])
+
+    def test_create_case_controls(self):
+        case = openfoam_writer.Case(
+            "test_case",
+            "interFoam",
+            self.experiment_variables,
+            controls=dict(endTime=0.02),
+        )
+        openfoam_writer.create_case(case, True)
+        control_dict = os.path.join(
+            openfoam_writer.CASES_PATH, "test_case", "system", "controlDict"
+        )
+        with open(control_dict) as f:
+            self.assertIn("endTime         0.02;\n", f.readlines())
+
+    def test_write_decomposition(self):
+        case = openfoam_writer.Case(
+            "test_case", "interFoam", self.experiment_variables
+        )
+        openfoam_writer.create_case(case, True)
+        case_path = os.path.join(openfoam_writer.CASES_PATH, "test_case")
+        openfoam_writer.write_decomposition(case_path, 6)
+        with open(os.path.join(case_path, "system", "decomposeParDict")) as f:
+            text = f.read()
+        self.assertIn("numberOfSubdomains 6;", text)
+        self.assertIn("n               (3 2 1);", text)
+        self.assertIn("n               (1 1 1);", text)
+
+    def test_simple_coefficients(self):
+        self.assertEqual((1, 1, 1), openfoam_writer.simple_coefficients(1))
+        self.assertEqual((2, 2, 1), openfoam_writer.simple_coefficients(4))
+        self.assertEqual((7, 1, 1), openfoam_writer.simple_coefficients(7))
+        self.assertEqual((4, 3, 1), openfoam_writer.simple_coefficients(12))
+
+    def test_template_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in ("U.template", "U_components.template"):
+                shutil.copy(
+                    os.path.join(openfoam_writer.TEMPLATE_PATH, name), tmp
+                )
+            cache = openfoam_writer.TemplateCache(tmp)
+            compiled = cache.get("U")
+            self.assertIs(compiled, cache.get("U"))
+            self.assertEqual(22, compiled.start)
+            self.assertEqual(
+                ("inlet_value",), compiled.by_name["$inlet_U"].variables
+            )
+            template_file = os.path.join(tmp, "U.template")
+            with open(template_file, "a") as f:
+                f.write("// edited\n")
+            os.utime(template_file, ns=(0, compiled.mtimes[0] + 10**9))
+            recompiled = cache.get("U")
+            self.assertIsNot(compiled, recompiled)
+            self.assertEqual("// edited\n", recompiled.lines[-1])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,206 @@
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+from time import sleep
+from unittest import mock
+
+import numpy as np
+
+import mesh_quality
+import pipeline
+from design import Design, MeshSettings
+from ledger import Ledger
+from mesh_store import MeshStore, mesh_key
+from tests.test_mesh_quality import sliver_points
+from tests.test_polymesh import kuhn_tets
+from tests.test_unv import write_unv
+
+COPY_SALOME = """
+import re
+import shutil
+import sys
+
+with open(sys.argv[-1]) as f:
+    script = f.read()
+shutil.copyfile(sys.argv[1], re.findall(r'r"(.*\\.unv)"', script)[0])
+"""
+
+
+class ConcurrencyProbe:
+    def __init__(self, delay: float, fail_on: int = None):
+        self.delay = delay
+        self.fail_on = fail_on
+        self.active = 0
+        self.max_active = 0
+
+    async def __call__(self, job: pipeline.Job):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            if job.design.channel_spacing == self.fail_on:
+                raise RuntimeError("stage failed")
+            job.artifacts[id(self)] = job.design.channel_spacing
+        finally:
+            self.active -= 1
+
+
+def designs(n: int):
+    return tuple(
+        Design((2, 1, 2, 3, 2, 1, 1), i, 0.5, 0.56, 15, 3) for i in range(n)
+    )
+
+
+class PipelineTestCase(unittest.TestCase):
+    def run_probes(self, probes, limits, n=12):
+        stages = tuple(
+            pipeline.Stage(name=f"stage_{i}", func=probe, concurrency=limit)
+            for i, (probe, limit) in enumerate(zip(probes, limits))
+        )
+        return asyncio.run(pipeline.run_pipeline(designs(n), stages))
+
+    def test_concurrency_limits(self):
+        probes = tuple(ConcurrencyProbe(0.01) for _ in range(3))
+        jobs, report = self.run_probes(probes, (4, 2, 8))
+        self.assertEqual((4, 2), tuple(p.max_active for p in probes[:2]))
+        self.assertTrue(probes[2].max_active <= 8)
+        self.assertEqual(12, report.completed)
+        self.assertTrue(all(len(job.artifacts) == 3 for job in jobs))
+
+    def test_stages_overlap(self):
+        probes = tuple(ConcurrencyProbe(0.02) for _ in range(3))
+        _, report = self.run_probes(probes, (1, 1, 1), n=6)
+        self.assertTrue(report.wall_seconds < 6 * 3 * 0.02)
+        self.assertTrue(report.throughput > 0)
+
+    def test_failed_job_skips_later_stages(self):
+        probes = (ConcurrencyProbe(0, fail_on=3), ConcurrencyProbe(0))
+        jobs, report = self.run_probes(probes, (2, 2), n=5)
+        failed = tuple(job for job in jobs if job.failed)
+        self.assertEqual(1, len(failed))
+        self.assertEqual("stage_0", failed[0].failed_stage)
+        self.assertEqual({}, failed[0].artifacts)
+        self.assertEqual((4, 1), (report.completed, report.failed))
+        self.assertEqual(1, report.stages[0].failed)
+        self.assertEqual(4, report.stages[1].completed)
+
+    def test_run_ledger_resumes(self):
+        probes = tuple(ConcurrencyProbe(0) for _ in range(2))
+        stages = tuple(
+            pipeline.Stage(name=f"stage_{i}", func=probe, concurrency=2)
+            for i, probe in enumerate(probes)
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            ledger = Ledger(os.path.join(tmp, "ledger.sqlite"), 0.05)
+            ledger.add(designs(4)[1:])
+            interrupted = ledger.claim("crashed")
+            ledger.complete_stage(
+                interrupted.design_id, "crashed", "stage_0", 0, 0
+            )
+            sleep(0.1)
+            jobs, report = asyncio.run(
+                pipeline.run_ledger(ledger, stages, "worker")
+            )
+            self.assertEqual({"done": 3}, ledger.status_counts())
+            self.assertEqual({"stage_1": 3}, ledger.stage_counts())
+        self.assertEqual(3, report.completed)
+        self.assertEqual((2, 3), tuple(s.completed for s in report.stages))
+
+    def test_releases_pins_in_stage_store(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = MeshStore(root=tmp)
+
+            async def mesh(job: pipeline.Job):
+                store.pin(job.design_id, job.design_id)
+                job.artifacts["mesh"] = store.path(job.design_id)
+
+            stages = (pipeline.Stage(name="mesh", func=mesh, concurrency=2),)
+            asyncio.run(pipeline.run_pipeline(designs(3), stages, store=store))
+            self.assertEqual(set(), store.pinned())
+
+    def test_default_stages(self):
+        stages = pipeline.default_stages(dict(mesh=1))
+        self.assertEqual(
+            (
+                "lattice",
+                "mesh",
+                "quality",
+                "case",
+                "solve",
+                "analysis",
+                "compaction",
+            ),
+            tuple(s.name for s in stages),
+        )
+        self.assertEqual(1, stages[1].concurrency)
+
+    def test_lattice_stage(self):
+        job = pipeline.Job(designs(6)[5])
+        asyncio.run(pipeline.lattice_stage(job))
+        self.assertEqual(6, len(job.artifacts["lattice"].channel_layers))
+
+    def test_quality_stage(self):
+        job = pipeline.Job(designs(1)[0])
+        with tempfile.TemporaryDirectory() as tmp:
+            points, tets = kuhn_tets(2, 2, 2)
+            job.artifacts["mesh"] = write_unv(
+                os.path.join(tmp, "mesh.unv"), points, {111: tets + 1}
+            )
+            with mock.patch.object(pipeline, "MeshStore") as store:
+                asyncio.run(pipeline.quality_stage(job))
+        store.assert_not_called()
+        self.assertTrue(job.artifacts["quality"]["passed"])
+        self.assertEqual(len(tets), job.artifacts["quality"]["cells"])
+
+    def run_quality(self, remeshed_points: np.ndarray) -> pipeline.Job:
+        job = pipeline.Job(designs(1)[0])
+        points, tets = kuhn_tets(3, 2, 2)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        job.artifacts["mesh"] = write_unv(
+            os.path.join(tmp.name, "mesh.unv"),
+            sliver_points(points),
+            {111: tets + 1},
+        )
+        remeshed = write_unv(
+            os.path.join(tmp.name, "remeshed.unv"),
+            remeshed_points,
+            {111: tets + 1},
+        )
+        fake_salome = os.path.join(tmp.name, "fake_salome.py")
+        with open(fake_salome, "w") as f:
+            f.write(COPY_SALOME)
+        self.store = MeshStore(root=os.path.join(tmp.name, "store"))
+        try:
+            asyncio.run(
+                pipeline.quality_stage(
+                    job,
+                    store=self.store,
+                    command=(sys.executable, fake_salome, remeshed),
+                )
+            )
+        except mesh_quality.MeshQualityError as e:
+            job.error = e
+        settings = mesh_quality.remesh_settings(MeshSettings())
+        key = mesh_key(pipeline.design_geometry(job.design), settings)
+        self.assertEqual(self.store.path(key), job.artifacts["mesh"])
+        self.assertEqual(settings._asdict(), job.artifacts["mesh_settings"])
+        self.assertIn(key, self.store.pinned())
+        return job
+
+    def test_quality_stage_remeshes(self):
+        job = self.run_quality(kuhn_tets(3, 2, 2)[0])
+        self.assertIsNone(job.error)
+        self.assertTrue(job.artifacts["quality"]["passed"])
+
+    def test_quality_stage_rejects_failed_remesh(self):
+        job = self.run_quality(sliver_points(kuhn_tets(3, 2, 2)[0]))
+        self.assertIsInstance(job.error, mesh_quality.MeshQualityError)
+        self.assertIn("aspect_ratio", str(job.error))
+        self.assertFalse(job.artifacts["quality"]["passed"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+import os
+import tempfile
+import unittest
+from itertools import permutations, product
+
+import numpy as np
+
+import polymesh
+
+
+def kuhn_tets(nx: int, ny: int, nz: int):
+    shape = (nx + 1, ny + 1, nz + 1)
+    points = np.array(list(product(*(range(n) for n in shape))), dtype=float)
+
+    def index(i, j, k):
+        return (i * shape[1] + j) * shape[2] + k
+
+    def tet_gen():
+        for i, j, k in product(range(nx), range(ny), range(nz)):
+            for axes in permutations(range(3)):
+                corner = [i, j, k]
+                tet = [index(*corner)]
+                for axis in axes:
+                    corner[axis] += 1
+                    tet.append(index(*corner))
+                yield tet
+
+    return points, np.array(list(tet_gen()))
+
+
+def boundary_triangles(points, tets, axis, value):
+    faces, _ = polymesh.tet_faces(points, tets)
+    on_plane = np.all(points[faces][:, :, axis] == value, axis=1)
+    return faces[on_plane]
+
+
+class PolyMeshTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.points, self.tets = kuhn_tets(3, 2, 2)
+        self.groups = {
+            "inlet": boundary_triangles(self.points, self.tets, 0, 0),
+            "outlet": boundary_triangles(self.points, self.tets, 0, 3),
+        }
+        self.mesh = polymesh.build_polymesh(
+            self.points, self.tets, self.groups
+        )
+
+    def centres(self):
+        return self.points[self.tets].mean(axis=1)
+
+    def normals(self):
+        corners = self.points[self.mesh.faces]
+        return np.cross(
+            corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0]
+        )
+
+    def test_face_counts(self):
+        n_internal = len(self.mesh.neighbour)
+        n_boundary = len(self.mesh.faces) - n_internal
+        self.assertEqual(4 * len(self.tets), 2 * n_internal + n_boundary)
+        self.assertEqual(2 * 2 * (3 * 2 + 3 * 2 + 2 * 2), n_boundary)
+
+    def test_upper_triangular_order(self):
+        owner = self.mesh.owner[: len(self.mesh.neighbour)]
+        self.assertTrue(np.all(owner < self.mesh.neighbour))
+        keys = owner * len(self.tets) + self.mesh.neighbour
+        self.assertTrue(np.all(np.diff(keys) > 0))
+
+    def test_normals_point_out_of_owner(self):
+        centres = self.centres()
+        normals = self.normals()
+        n_internal = len(self.mesh.neighbour)
+        to_neighbour = (
+            centres[self.mesh.neighbour]
+            - centres[self.mesh.owner[:n_internal]]
+        )
+        self.assertTrue(
+            np.all(
+                np.einsum("ij,ij->i", normals[:n_internal], to_neighbour) > 0
+            )
+        )
+        face_centres = self.points[self.mesh.faces].mean(axis=1)
+        outward = (
+            face_centres[n_internal:] - centres[self.mesh.owner[n_internal:]]
+        )
+        self.assertTrue(
+            np.all(np.einsum("ij,ij->i", normals[n_internal:], outward) > 0)
+        )
+
+    def test_cells_are_closed(self):
+        normals = self.normals()
+        n_internal = len(self.mesh.neighbour)
+        total = np.zeros((len(self.tets), 3))
+        np.add.at(total, self.mesh.owner, normals)
+        np.subtract.at(total, self.mesh.neighbour, normals[:n_internal])
+        self.assertTrue(np.allclose(total, 0))
+
+    def test_patches(self):
+        patches = {p.name: p for p in self.mesh.patches}
+        self.assertEqual(
+            ("inlet", "outlet", polymesh.DEFAULT_PATCH),
+            tuple(p.name for p in self.mesh.patches),
+        )
+        self.assertEqual(2 * 2 * 2, patches["inlet"].n_faces)
+        self.assertEqual(2 * 2 * 2, patches["outlet"].n_faces)
+        self.assertEqual(len(self.mesh.neighbour), patches["inlet"].start_face)
+        last = self.mesh.patches[-1]
+        self.assertEqual(len(self.mesh.faces), last.start_face + last.n_faces)
+
+    def test_wall_patch_type(self):
+        self.assertEqual("wall", polymesh.patch_type("walls"))
+        self.assertEqual("patch", polymesh.patch_type("outlet"))
+
+    def test_group_face_not_on_boundary(self):
+        with self.assertRaises(polymesh.PolyMeshError):
+            polymesh.build_polymesh(
+                self.points,
+                self.tets,
+                {"inlet": boundary_triangles(self.points, self.tets, 0, 1)},
+            )
+
+    def test_write_polymesh(self):
+        with tempfile.TemporaryDirectory() as case_path:
+            mesh_path = polymesh.write_polymesh(self.mesh, case_path, 0.001)
+            self.assertEqual(
+                ["boundary", "faces", "neighbour", "owner", "points"],
+                sorted(os.listdir(mesh_path)),
+            )
+            with open(os.path.join(mesh_path, "owner")) as f:
+                owner = f.read()
+            with open(os.path.join(mesh_path, "boundary")) as f:
+                boundary = f.read()
+            with open(os.path.join(mesh_path, "points")) as f:
+                points = f.read()
+        self.assertIn(f"nCells:{len(self.tets)}", owner)
+        self.assertIn("    inlet\n", boundary)
+        self.assertIn("(0.003 0.002 0.002)", points)
+
+
+if __name__ == "__main__":
+    unittest.main()
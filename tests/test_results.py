@@ -0,0 +1,184 @@
+import mmap
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import foam_dict
+import results
+
+ARCH = foam_dict.Quoted("LSB;label=32;scalar=64")
+
+
+def write_field(
+    filename: str,
+    internal: np.ndarray,
+    patches: dict,
+    binary: bool = True,
+):
+    field_class = "volVectorField" if internal.ndim > 1 else "volScalarField"
+    kind = "vector" if internal.ndim > 1 else "scalar"
+    header = dict(format="binary" if binary else "ascii", arch=ARCH)
+    header.update({"class": field_class, "object": os.path.basename(filename)})
+
+    def value(values):
+        if np.ndim(values) == internal.ndim:
+            return foam_dict.Field("nonuniform", values, f"List<{kind}>")
+        return foam_dict.Field("uniform", values)
+
+    entries = dict(
+        dimensions=foam_dict.Dimensions((0, 0, 0, 0, 0, 0, 0)),
+        internalField=value(internal),
+        boundaryField={
+            patch: dict(type="calculated", value=value(values))
+            for patch, values in patches.items()
+        },
+    )
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    foam_dict.dump(foam_dict.FoamFile(header, entries), filename)
+
+
+class ResultsTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.case_path = self.tmp.name
+        self.alpha = np.linspace(0, 1, 50)
+        self.velocity = np.arange(30.0).reshape(10, 3)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_scalar_field(self):
+        filename = os.path.join(self.case_path, "0.1", "alpha.organic")
+        write_field(
+            filename, self.alpha, dict(outlet=self.alpha[:5], walls=0.0)
+        )
+        field = results.read_field(filename, 0.1)
+        self.assertEqual("volScalarField", field.field_class)
+        np.testing.assert_array_equal(self.alpha, field.internal)
+        np.testing.assert_array_equal(self.alpha[:5], field.boundary["outlet"])
+        self.assertEqual(0.0, field.boundary["walls"])
+
+    def test_vector_field_views(self):
+        filename = os.path.join(self.case_path, "0.1", "U")
+        write_field(filename, self.velocity, dict(outlet=self.velocity[:2]))
+        field = results.read_field(filename)
+        self.assertEqual((10, 3), field.internal.shape)
+        np.testing.assert_array_equal(self.velocity, field.internal)
+        self.assertFalse(field.internal.flags.owndata)
+        self.assertFalse(field.internal.flags.writeable)
+        base = field.internal
+        while isinstance(base, np.ndarray):
+            base = base.base
+        self.assertIsInstance(memoryview(base).obj, mmap.mmap)
+
+    def test_ascii_field(self):
+        filename = os.path.join(self.case_path, "0", "alpha.organic")
+        write_field(filename, self.alpha, dict(outlet=1.0), binary=False)
+        field = results.read_field(filename)
+        np.testing.assert_array_equal(self.alpha, field.internal)
+
+    def test_not_a_field(self):
+        filename = os.path.join(self.case_path, "system", "controlDict")
+        os.makedirs(os.path.dirname(filename))
+        foam_dict.dump(
+            foam_dict.FoamFile(
+                {"class": "dictionary"}, dict(application="interFoam")
+            ),
+            filename,
+        )
+        with self.assertRaises(foam_dict.FoamDictError):
+            results.read_field(filename)
+
+    def test_iter_field(self):
+        for time in ("0.2", "0", "0.05", "1e-1"):
+            write_field(
+                os.path.join(self.case_path, time, "alpha.organic"),
+                self.alpha * float(time),
+                dict(outlet=0.0),
+            )
+        os.makedirs(os.path.join(self.case_path, "constant"))
+        os.makedirs(os.path.join(self.case_path, "0.3"))
+        self.assertEqual(
+            (0, 0.05, 0.1, 0.2, 0.3),
+            tuple(t for t, _ in results.time_directories(self.case_path)),
+        )
+        fields = results.iter_field(self.case_path, "alpha.organic", 0.05)
+        first = next(fields)
+        self.assertEqual(0.05, first.time)
+        np.testing.assert_allclose(self.alpha * 0.05, first.internal)
+        self.assertEqual((0.1, 0.2), tuple(f.time for f in fields))
+
+
+def write_raw(filename: str, points: np.ndarray, values: dict):
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    surface = os.path.splitext(os.path.basename(filename))[0]
+    with open(filename, "w") as f:
+        f.write(f"# {surface}  FACE_DATA {len(points)}\n")
+        f.write(f"#  x  y  z  {'  '.join(values)}\n")
+        rows = np.column_stack((points, *values.values()))
+        np.savetxt(f, rows)
+
+
+class SamplesTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.case_path = self.tmp.name
+        self.samples = os.path.join(
+            self.case_path, "postProcessing", "samples"
+        )
+        self.points = np.arange(12.0).reshape(4, 3)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_read_surface(self):
+        filename = os.path.join(self.samples, "0.001", "layer0.raw")
+        alpha = np.array([0, 0.25, 0.5, 1])
+        write_raw(filename, self.points, {"alpha.organic": alpha})
+        sample = results.read_surface(filename, 0.001)
+        self.assertEqual("layer0", sample.surface)
+        np.testing.assert_array_equal(self.points, sample.points)
+        np.testing.assert_array_equal(alpha, sample.values["alpha.organic"])
+
+    def test_read_surfaces(self):
+        for time in ("0.002", "0.001", "0.0015"):
+            for surface, n in (("layer0", 4), ("outlet", 2)):
+                write_raw(
+                    os.path.join(self.samples, time, f"{surface}.raw"),
+                    self.points[:n],
+                    {"alpha.organic": np.full(n, float(time))},
+                )
+        surfaces = results.read_surfaces(self.case_path)
+        self.assertEqual({"layer0", "outlet"}, set(surfaces))
+        self.assertEqual(
+            (0.001, 0.0015, 0.002), tuple(s.time for s in surfaces["outlet"])
+        )
+        self.assertEqual((2, 3), surfaces["outlet"][0].points.shape)
+        outlet = tuple(results.iter_surfaces(self.case_path, "outlet"))
+        self.assertEqual(3, len(outlet))
+        self.assertEqual({}, results.read_surfaces(self.case_path, "missing"))
+
+    def test_read_function(self):
+        path = os.path.join(self.case_path, "postProcessing", "outletAverage")
+        for start, times in (
+            ("0", (0.001, 0.002, 0.003)),
+            ("0.002", (0.002, 0.003)),
+        ):
+            os.makedirs(os.path.join(path, start))
+            with open(
+                os.path.join(path, start, "surfaceFieldValue.dat"), "w"
+            ) as f:
+                f.write("# Time  areaAverage(alpha.organic)\n")
+                f.writelines(f"{t}\t{t * 100 + float(start)}\n" for t in times)
+        values = results.read_function(self.case_path, "outletAverage")
+        np.testing.assert_allclose([0.001, 0.002, 0.003], values[:, 0])
+        np.testing.assert_allclose([0.1, 0.202, 0.302], values[:, 1])
+        self.assertEqual(
+            (0, 2), results.read_function(self.case_path, "missing").shape
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
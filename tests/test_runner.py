@@ -1,5 +1,38 @@
-from unittest import TestCase
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase, skipUnless
 import runner
+from tests.test_log_monitor import running
+
+FAKE_SALOME = """
+import os
+import re
+import subprocess
+import sys
+import time
+
+with open(sys.argv[-1]) as f:
+    script = f.read()
+save_name = re.findall(r'r"(.*\\.unv)"', script)[0]
+if "fail" in sys.argv:
+    print("meshing failed", file=sys.stderr)
+    sys.exit(3)
+if "spawn" in sys.argv:
+    child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+    pid_file = os.path.join(os.path.dirname(sys.argv[0]), "child.pid")
+    with open(pid_file, "w") as f:
+        f.write(str(child.pid))
+if "hang" in sys.argv:
+    time.sleep(10)
+if "silent" not in sys.argv:
+    with open(save_name, "w") as f:
+        f.write("-1\\n")
+"""
 
 
 class RunnerTest(TestCase):
@@ -8,6 +41,29 @@ class RunnerTest(TestCase):
     channel_width = 0.5
     channel_height = 0.56
 
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.fake_salome = os.path.join(self.tmp.name, "fake_salome.py")
+        with open(self.fake_salome, "w") as f:
+            f.write(FAKE_SALOME)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def create_fake_mesh(
+        self, *flags, timeout=None, keep="never", lattice_structure=None
+    ):
+        return runner.create_mesh(
+            lattice_structure=lattice_structure or self.lattice_structure,
+            channel_spacing=self.channel_spacing,
+            channel_width=self.channel_width,
+            channel_height=self.channel_height,
+            timeout=timeout,
+            command=(sys.executable, self.fake_salome) + flags,
+            mesh_path=self.tmp.name,
+            keep=keep,
+        )
+
     def test_create_mesh(self):
         runner.create_mesh(
             lattice_structure=self.lattice_structure,
@@ -15,3 +71,93 @@ class RunnerTest(TestCase):
             channel_width=self.channel_width,
             channel_height=self.channel_height,
         )
+
+    def test_create_mesh_moves_mesh_on_success(self):
+        save_name = self.create_fake_mesh(keep="on_failure")
+        self.assertTrue(os.path.exists(save_name))
+        self.assertEqual(
+            [os.path.basename(save_name)],
+            [
+                name
+                for name in os.listdir(self.tmp.name)
+                if name.endswith(".unv")
+            ],
+        )
+
+    def test_create_mesh_keeps_scratch_on_failure(self):
+        with self.assertRaises(runner.MeshingError) as context:
+            self.create_fake_mesh("fail", keep="on_failure")
+        scratch_path = context.exception.scratch_path
+        try:
+            self.assertTrue(
+                os.path.exists(os.path.join(scratch_path, "script.py"))
+            )
+            with open(os.path.join(scratch_path, "salome.err")) as f:
+                self.assertIn("meshing failed", f.read())
+        finally:
+            shutil.rmtree(scratch_path)
+
+    def test_concurrent_create_mesh(self):
+        structures = ((2, 1, 1), (2, 1, 2, 1, 1), (3, 1, 1), (3, 1, 2, 1, 1))
+        with ThreadPoolExecutor(max_workers=len(structures)) as pool:
+            save_names = tuple(
+                pool.map(
+                    lambda s: self.create_fake_mesh(lattice_structure=s),
+                    structures,
+                )
+            )
+        self.assertEqual(len(structures), len(set(save_names)))
+        self.assertTrue(all(map(os.path.exists, save_names)))
+
+    def test_create_mesh_failure(self):
+        with self.assertRaises(runner.MeshingError) as context:
+            self.create_fake_mesh("fail")
+        self.assertEqual(3, context.exception.returncode)
+        self.assertIn("meshing failed", context.exception.stderr)
+
+    def test_create_mesh_without_output(self):
+        with self.assertRaises(runner.MeshingError):
+            self.create_fake_mesh("silent")
+
+    def test_create_mesh_timeout(self):
+        with self.assertRaises(runner.MeshingTimeout):
+            self.create_fake_mesh("hang", timeout=0.5)
+
+    @skipUnless(hasattr(os, "killpg"), "needs process groups")
+    def test_create_mesh_timeout_kills_process_group(self):
+        started = time.perf_counter()
+        with self.assertRaises(runner.MeshingTimeout):
+            self.create_fake_mesh("spawn", "hang", timeout=0.5)
+        self.assertLess(time.perf_counter() - started, 10)
+        with open(os.path.join(self.tmp.name, "child.pid")) as f:
+            child = int(f.read())
+        self.assertFalse(running(child))
+
+    def test_create_mesh_async(self):
+        save_name = asyncio.run(
+            runner.create_mesh_async(
+                lattice_structure=self.lattice_structure,
+                channel_spacing=self.channel_spacing,
+                channel_width=self.channel_width,
+                channel_height=self.channel_height,
+                command=(sys.executable, self.fake_salome),
+                mesh_path=self.tmp.name,
+                keep="never",
+            )
+        )
+        self.assertTrue(os.path.exists(save_name))
+
+    def test_create_mesh_async_timeout(self):
+        with self.assertRaises(runner.MeshingTimeout):
+            asyncio.run(
+                runner.create_mesh_async(
+                    lattice_structure=self.lattice_structure,
+                    channel_spacing=self.channel_spacing,
+                    channel_width=self.channel_width,
+                    channel_height=self.channel_height,
+                    timeout=0.5,
+                    command=(sys.executable, self.fake_salome, "hang"),
+                    mesh_path=self.tmp.name,
+                    keep="never",
+                )
+            )
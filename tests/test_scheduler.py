@@ -0,0 +1,114 @@
+import asyncio
+import unittest
+
+import scheduler
+
+
+class Workload:
+    def __init__(self, resources: scheduler.ResourceScheduler):
+        self.resources = resources
+        self.max_cores = 0
+        self.max_memory = 0
+        self.order = []
+
+    async def run(self, name: str, cores: int, memory: int, delay: float):
+        async with self.resources.reserve(cores, memory) as granted:
+            self.order.append(name)
+            used = self.resources.used
+            self.max_cores = max(self.max_cores, used.cores)
+            self.max_memory = max(self.max_memory, used.memory)
+            await asyncio.sleep(delay)
+        return granted
+
+
+class SchedulerTestCase(unittest.TestCase):
+    def test_machine_resources(self):
+        resources = scheduler.machine_resources()
+        self.assertGreaterEqual(resources.cores, 1)
+
+    def test_no_oversubscription(self):
+        resources = scheduler.ResourceScheduler(cores=8, memory=16)
+        workload = Workload(resources)
+
+        async def main():
+            await asyncio.gather(
+                *(workload.run(f"solve_{i}", 4, 4, 0.02) for i in range(4)),
+                *(workload.run(f"mesh_{i}", 1, 4, 0.01) for i in range(6)),
+            )
+
+        asyncio.run(main())
+        self.assertEqual(8, workload.max_cores)
+        self.assertLessEqual(workload.max_memory, 16)
+        self.assertEqual(10, len(workload.order))
+        self.assertEqual((0, 0), tuple(resources.used))
+        self.assertEqual([], resources.waiters)
+
+    def test_small_jobs_backfill(self):
+        resources = scheduler.ResourceScheduler(cores=4, memory=None)
+        workload = Workload(resources)
+
+        async def main():
+            await asyncio.gather(
+                workload.run("solve_0", 2, 0, 0.05),
+                workload.run("solve_1", 2, 0, 0.01),
+                workload.run("solve_2", 4, 0, 0.01),
+                workload.run("mesh_0", 1, 0, 0.01),
+            )
+
+        asyncio.run(main())
+        self.assertEqual(
+            ["solve_0", "solve_1", "mesh_0", "solve_2"], workload.order
+        )
+        self.assertEqual(4, resources.stats().peak_cores)
+
+    def test_queued_job_is_not_overtaken_on_arrival(self):
+        resources = scheduler.ResourceScheduler(cores=4, memory=None)
+        workload = Workload(resources)
+
+        async def main():
+            first = asyncio.create_task(workload.run("mesh_0", 1, 0, 0.02))
+            await asyncio.sleep(0)
+            large = asyncio.create_task(workload.run("solve_0", 4, 0, 0))
+            await asyncio.sleep(0)
+            await asyncio.gather(first, large, workload.run("mesh_1", 1, 0, 0))
+
+        asyncio.run(main())
+        self.assertEqual(["mesh_0", "solve_0", "mesh_1"], workload.order)
+
+    def test_requests_are_clamped(self):
+        resources = scheduler.ResourceScheduler(cores=2, memory=10)
+        granted = asyncio.run(Workload(resources).run("solve", 16, 100, 0))
+        self.assertEqual(scheduler.Resources(2, 10), granted)
+        self.assertEqual(2, resources.solve_cores(16))
+
+    def test_idle_core_seconds(self):
+        resources = scheduler.ResourceScheduler(cores=4, memory=None)
+        asyncio.run(Workload(resources).run("solve", 2, 0, 0.05))
+        stats = resources.stats()
+        self.assertAlmostEqual(0.1, stats.busy_core_seconds, delta=0.05)
+        self.assertAlmostEqual(
+            stats.cores * stats.wall_seconds,
+            stats.busy_core_seconds + stats.idle_core_seconds,
+            places=4,
+        )
+        self.assertLessEqual(stats.utilization, 0.5)
+
+    def test_cancelled_waiter(self):
+        resources = scheduler.ResourceScheduler(cores=1, memory=None)
+        workload = Workload(resources)
+
+        async def main():
+            first = asyncio.create_task(workload.run("a", 1, 0, 0.02))
+            waiting = asyncio.create_task(workload.run("b", 1, 0, 0))
+            await asyncio.sleep(0.005)
+            waiting.cancel()
+            await first
+            await workload.run("c", 1, 0, 0)
+
+        asyncio.run(main())
+        self.assertEqual(["a", "c"], workload.order)
+        self.assertEqual(0, resources.used.cores)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import scratch
+
+
+class ScratchDirectoryTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def run_job(self, keep: str, fail: bool) -> str:
+        directory = scratch.ScratchDirectory(root=self.tmp.name, keep=keep)
+        try:
+            with directory:
+                directory.write_log("job.log", "output")
+                if fail:
+                    raise RuntimeError("job failed")
+        except RuntimeError:
+            pass
+        return directory.path
+
+    def test_default_root_is_outside_the_repo(self):
+        directory = scratch.ScratchDirectory()
+        self.assertEqual(tempfile.gettempdir(), directory.root)
+
+    def test_unique_directories(self):
+        with scratch.ScratchDirectory(root=self.tmp.name) as first:
+            with scratch.ScratchDirectory(root=self.tmp.name) as second:
+                self.assertNotEqual(first.path, second.path)
+
+    def test_keep_on_failure(self):
+        self.assertFalse(os.path.exists(self.run_job("on_failure", False)))
+        path = self.run_job("on_failure", True)
+        self.assertTrue(os.path.exists(os.path.join(path, "job.log")))
+
+    def test_keep_always(self):
+        self.assertTrue(os.path.exists(self.run_job("always", False)))
+
+    def test_keep_never(self):
+        self.assertFalse(os.path.exists(self.run_job("never", True)))
+
+    def test_move_into_place(self):
+        source = os.path.join(self.tmp.name, "source.unv")
+        destination = os.path.join(self.tmp.name, "destination.unv")
+        with open(source, "w") as f:
+            f.write("mesh")
+        scratch.move_into_place(source, destination)
+        self.assertFalse(os.path.exists(source))
+        with open(destination) as f:
+            self.assertEqual("mesh", f.read())
+
+    def test_move_directory_across_devices(self):
+        source = os.path.join(self.tmp.name, "source.polyMesh")
+        destination = os.path.join(self.tmp.name, "destination.polyMesh")
+        os.makedirs(os.path.join(source, "constant"))
+        with open(os.path.join(source, "constant", "points"), "w") as f:
+            f.write("points")
+        replace = os.replace
+        calls = []
+
+        def cross_device(src, dst):
+            calls.append(src)
+            if len(calls) == 1:
+                raise OSError(18, "Invalid cross-device link")
+            replace(src, dst)
+
+        with mock.patch("os.replace", cross_device):
+            scratch.move_into_place(source, destination)
+        self.assertEqual(2, len(calls))
+        self.assertFalse(os.path.exists(source))
+        with open(os.path.join(destination, "constant", "points")) as f:
+            self.assertEqual("points", f.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
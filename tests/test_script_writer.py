@@ -12,6 +12,8 @@ class ScriptWriterTestCase(unittest.TestCase):
         channel_width=0.5,
         channel_height=0.56,
         save_name='r"test_save.unv"',
+        mesh_settings="MeshSettings()",
+        polymesh="True",
     )
     temp_dir_path = "../tmp"
 
@@ -22,7 +24,7 @@ class ScriptWriterTestCase(unittest.TestCase):
     def test_parse_template_vars(self):
         template = script_writer.get_template(self.template_path)
         template_vars = tuple(script_writer.parse_template_vars(template))
-        self.assertEqual(6, len(template_vars))
+        self.assertEqual(8, len(template_vars))
 
     def test_replace_template_vars(self):
         start_template = script_writer.get_template(self.template_path)
@@ -0,0 +1,285 @@
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+import log_monitor
+import openfoam_runner
+import pipeline
+import study
+from design import Design
+from mesh_store import MeshStore
+from mixing import mixing_index, segregation
+from scheduler import ResourceScheduler
+from tests.test_log_monitor import RULES, outlet_rows, write_outlet
+
+SPACE = dict(x=study.FloatRange(-5, 5), y=study.FloatRange(-5, 5))
+
+
+def quadratic(trial: study.Trial) -> float:
+    x, y = trial.params["x"], trial.params["y"]
+    return (x - 1) ** 2 + (y + 2) ** 2
+
+
+def slow_quadratic(trial: study.Trial) -> float:
+    value = quadratic(trial)
+    for step in range(1, 6):
+        trial.check_prune(step, value * (1 + 1 / step))
+    return value
+
+
+def outlet_segregation(design: Design) -> float:
+    return segregation(0.3, (design.channel_width * 0.3) ** 2)
+
+
+def fake_stages(root: str):
+    def stages(concurrency, scheduler, trackers, store):
+        async def case_stage(job):
+            case_path = os.path.join(root, job.design_id)
+            write_outlet(
+                case_path,
+                outlet_rows(
+                    [i * 0.001 for i in range(30)],
+                    lambda t: 1.0 if t < 0.005 else 0.3,
+                    lambda t: 0.0 if t < 0.005 else job.design.channel_width,
+                ),
+            )
+            job.artifacts["case"] = case_path
+
+        async def solve_stage(job):
+            case_path = job.artifacts["case"]
+            monitor = log_monitor.LogMonitor(
+                os.path.join(case_path, "log.interFoam"),
+                RULES,
+                interval=0.05,
+                trackers=trackers(job),
+            )
+            async with scheduler.reserve(1):
+                await openfoam_runner.run_monitored(
+                    "interFoam",
+                    (sys.executable, "-c", "import time; time.sleep(0.3)"),
+                    case_path,
+                    monitor,
+                )
+
+        async def analysis_stage(job):
+            value = outlet_segregation(job.design)
+            job.artifacts["mixing"] = dict(
+                segregation=value, outlet_segregation=value
+            )
+
+        return tuple(
+            pipeline.Stage(name=name, func=func, concurrency=1)
+            for name, func in (
+                ("case", case_stage),
+                ("solve", solve_stage),
+                ("analysis", analysis_stage),
+            )
+        )
+
+    return stages
+
+
+class StudyTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "study.sqlite")
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def create_study(self, **kwargs) -> study.Study:
+        return study.Study(
+            space=SPACE,
+            direction="minimize",
+            storage=study.StudyStorage(self.path),
+            seed=0,
+            **kwargs,
+        )
+
+    def test_sample_design_space(self):
+        params = study.sample(study.DESIGN_SPACE, random.Random(1))
+        design = study.params_design(params)
+        self.assertIsInstance(design, Design)
+        self.assertIn(design.lattice_structure[0], (2, 3))
+        self.assertEqual(11, len(design.lattice_structure))
+        self.assertTrue(2.5 <= design.channel_spacing <= 5)
+
+    def test_sample_is_reproducible(self):
+        a = study.sample(study.DESIGN_SPACE, random.Random(3))
+        b = study.sample(study.DESIGN_SPACE, random.Random(3))
+        self.assertEqual(a, b)
+
+    def test_log_range(self):
+        rng = random.Random(0)
+        spec = study.FloatRange(1e-3, 1, log=True)
+        values = tuple(study.sample_value(spec, rng) for _ in range(100))
+        self.assertTrue(all(1e-3 <= v <= 1 for v in values))
+
+    def test_finds_minimum(self):
+        best = self.create_study().optimize(quadratic, n_trials=200)
+        self.assertLess(best.value, 0.5)
+        self.assertAlmostEqual(1, best.params["x"], delta=1)
+        self.assertAlmostEqual(-2, best.params["y"], delta=1)
+
+    def test_prunes_worse_trials(self):
+        s = self.create_study()
+        s.optimize(slow_quadratic, n_trials=50)
+        states = tuple(t.state for t in s.trials)
+        self.assertIn(study.TrialState.PRUNED, states)
+        self.assertIn(study.TrialState.COMPLETE, states)
+        for trial in s.trials:
+            if trial.state == study.TrialState.PRUNED:
+                self.assertLess(len(trial.intermediate), 5)
+
+    def test_warmup_disables_pruning(self):
+        s = self.create_study(pruner=study.BestTrialPruner(warmup_steps=10))
+        s.optimize(slow_quadratic, n_trials=20)
+        self.assertEqual(20, len(s.completed_trials))
+
+    def test_failed_objective(self):
+        def objective(trial):
+            raise RuntimeError("solver diverged")
+
+        s = self.create_study()
+        self.assertIsNone(s.optimize(objective, n_trials=3))
+        self.assertTrue(
+            all(t.state == study.TrialState.FAIL for t in s.trials)
+        )
+
+    def test_persists_trials(self):
+        best = self.create_study().optimize(slow_quadratic, n_trials=20)
+        reloaded = study.load_study(
+            self.path, space=SPACE, direction="minimize"
+        )
+        self.assertEqual(20, len(reloaded.trials))
+        self.assertEqual(best.number, reloaded.best_trial.number)
+        self.assertEqual(best.intermediate, reloaded.best_trial.intermediate)
+        reloaded.optimize(quadratic, n_trials=5)
+        self.assertEqual(
+            tuple(range(25)), tuple(t.number for t in reloaded.trials)
+        )
+
+    def test_interrupted_trials_fail_on_load(self):
+        s = self.create_study()
+        trial = s.ask()
+        trial.report(1, 3.0)
+        reloaded = self.create_study()
+        self.assertEqual(study.TrialState.FAIL, reloaded.trials[0].state)
+        self.assertEqual({1: 3.0}, reloaded.trials[0].intermediate)
+
+    def test_missing_study(self):
+        with self.assertRaises(FileNotFoundError):
+            study.load_study(os.path.join(self.tmp.name, "missing.sqlite"))
+
+    def test_parallel_workers(self):
+        barrier = threading.Barrier(4, timeout=5)
+
+        def objective(trial):
+            barrier.wait()
+            return quadratic(trial)
+
+        s = self.create_study()
+        s.optimize(objective, n_trials=8, workers=4)
+        self.assertEqual(8, len(s.completed_trials))
+        self.assertEqual(8, len({t.number for t in s.trials}))
+
+    def test_tracker_prunes_running_solve(self):
+        s = study.Study(
+            space=SPACE, storage=study.StudyStorage(self.path), seed=0
+        )
+        best = s.ask()
+        for step in range(1, 31):
+            best.report(step, 0.9)
+        s.tell(best, study.TrialState.COMPLETE, 0.9)
+        trial = s.ask()
+        case_path = os.path.join(self.tmp.name, "case")
+        write_outlet(
+            case_path,
+            outlet_rows(
+                [i * 0.001 for i in range(30)],
+                lambda t: 1.0 if t < 0.005 else 0.3,
+                lambda t: 0.0 if t < 0.005 else 1.0,
+            ),
+        )
+        tracker = study.TrialTracker(trial, case_path)
+        monitor = log_monitor.LogMonitor(
+            os.path.join(case_path, "log.interFoam"),
+            RULES,
+            interval=0.05,
+            trackers=(tracker,),
+        )
+        started = time.perf_counter()
+        with self.assertRaises(openfoam_runner.SolverAborted):
+            asyncio.run(
+                openfoam_runner.run_monitored(
+                    "interFoam",
+                    (sys.executable, "-c", "import time; time.sleep(60)"),
+                    case_path,
+                    monitor,
+                )
+            )
+        self.assertLess(time.perf_counter() - started, 10)
+        self.assertIsInstance(tracker.pruned, study.TrialPruned)
+        self.assertEqual([5], list(trial.intermediate))
+        self.assertAlmostEqual(1 - (0.3 / 0.7) ** 0.5, trial.intermediate[5])
+
+    def test_tracker_scores_single_phase_outlet(self):
+        s = study.Study(
+            space=SPACE, storage=study.StudyStorage(self.path), seed=0
+        )
+        trial = s.ask()
+        tracker = study.TrialTracker(trial, self.tmp.name)
+        tracker.add(log_monitor.OutletSample(0, 1.0, 0))
+        tracker.add(log_monitor.OutletSample(0.001, float("nan"), 0))
+        tracker.add(log_monitor.OutletSample(0.002, 0.0, 0))
+        self.assertTrue(tracker.armed)
+        self.assertEqual({2: 0}, trial.intermediate)
+
+    def test_pipeline_objective(self):
+        resources = ResourceScheduler(cores=2, memory=None)
+        s = study.Study(storage=study.StudyStorage(self.path), seed=0)
+        with study.PipelineObjective(
+            scheduler=resources,
+            stages=fake_stages(self.tmp.name),
+            store=MeshStore(root=os.path.join(self.tmp.name, "meshes")),
+        ) as objective:
+            best = s.optimize(objective, n_trials=8, workers=4)
+        self.assertEqual(max(t.value for t in s.completed_trials), best.value)
+        self.assertAlmostEqual(
+            mixing_index(outlet_segregation(study.params_design(best.params))),
+            best.value,
+        )
+        for trial in s.trials:
+            self.assertIn(
+                trial.state,
+                (study.TrialState.COMPLETE, study.TrialState.PRUNED),
+            )
+            if trial.state == study.TrialState.PRUNED:
+                last = trial.intermediate[max(trial.intermediate)]
+                self.assertLess(last, best.value)
+        self.assertEqual(2, resources.stats().peak_cores)
+
+    def test_solve_stage_trackers(self):
+        def trackers(job):
+            return ()
+
+        stages = pipeline.default_stages(trackers=trackers)
+        solve = next(stage for stage in stages if stage.name == "solve")
+        self.assertIs(trackers, solve.func.keywords["trackers"])
+
+    def test_invalid_direction(self):
+        with self.assertRaises(ValueError):
+            study.Study(
+                space=SPACE,
+                direction="sideways",
+                storage=study.StudyStorage(self.path),
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,219 @@
+import io
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import polymesh
+import unv
+from tests.test_polymesh import boundary_triangles, kuhn_tets
+
+
+def unv_text(
+    points: np.ndarray,
+    elements: dict,
+    groups: dict = None,
+    exponent: str = "E",
+) -> str:
+    lines = ["    -1", "  2420", "SALOME_MESH", "    -1"]
+    lines += ["    -1", "  2411"]
+    for label, point in enumerate(points, 1):
+        lines.append(f"{label:10d}{1:10d}{1:10d}{11:10d}")
+        lines.append(
+            "".join(f"{x:25.16E}".replace("E", exponent) for x in point)
+        )
+    lines.append("    -1")
+    lines += ["    -1", "  2412"]
+    label = 1
+    if isinstance(elements, dict):
+        elements = elements.items()
+    for element_type, connectivity in elements:
+        for nodes in connectivity:
+            lines.append(
+                f"{label:10d}{element_type:10d}{2:10d}{1:10d}{7:10d}"
+                f"{len(nodes):10d}"
+            )
+            if element_type in unv.BEAM_TYPES:
+                lines.append(f"{0:10d}{0:10d}{0:10d}")
+            for i in range(0, len(nodes), 8):
+                lines.append("".join(f"{n:10d}" for n in nodes[i : i + 8]))
+            label += 1
+    lines.append("    -1")
+    lines += ["    -1", "  2467"]
+    for number, (name, entities) in enumerate((groups or {}).items(), 1):
+        lines.append(f"{number:10d}" + f"{0:10d}" * 6 + f"{len(entities):10d}")
+        lines.append(name)
+        for i in range(0, len(entities), 2):
+            lines.append(
+                "".join(
+                    f"{code:10d}{tag:10d}{0:10d}{0:10d}"
+                    for code, tag in entities[i : i + 2]
+                )
+            )
+    lines.append("    -1")
+    return "\n".join(lines) + "\n"
+
+
+def write_unv(filename: str, *args, **kwargs) -> str:
+    with open(filename, "w") as f:
+        f.write(unv_text(*args, **kwargs))
+    return filename
+
+
+class UnvTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.points, self.tets = kuhn_tets(3, 2, 2)
+        self.triangles = boundary_triangles(self.points, self.tets, 0, 3)
+        self.edges = np.array(((0, 1), (1, 2)))
+        self.elements = {
+            11: self.edges + 1,
+            41: self.triangles + 1,
+            111: self.tets + 1,
+        }
+        n_triangles = len(self.triangles)
+        self.groups = {
+            "outlet": [(8, 3 + i) for i in range(n_triangles)],
+            "corner": [(7, 1), (7, 2), (7, 3)],
+        }
+        self.text = unv_text(self.points, self.elements, self.groups)
+
+    def stream(self, text: str = None) -> io.BytesIO:
+        return io.BytesIO((text or self.text).encode())
+
+    def test_metadata(self):
+        for chunk_size in (7, 64, 1 << 20):
+            metadata = unv.parse_metadata(self.stream(), chunk_size)
+            self.assertEqual(len(self.points), metadata.nodes)
+            self.assertEqual(
+                len(self.edges) + len(self.triangles) + len(self.tets),
+                metadata.elements,
+            )
+            self.assertEqual(len(self.tets), metadata.cells)
+            self.assertEqual(2, metadata.groups)
+            self.assertEqual(
+                {11: 2, 41: len(self.triangles), 111: len(self.tets)},
+                metadata.element_types,
+            )
+            self.assertEqual(
+                {"outlet": len(self.triangles), "corner": 3},
+                metadata.group_sizes,
+            )
+
+    def test_parse(self):
+        for chunk_size in (5, 97, 1 << 20):
+            mesh = unv.parse(self.stream(), chunk_size)
+            np.testing.assert_array_equal(
+                np.arange(1, len(self.points) + 1), mesh.labels
+            )
+            np.testing.assert_allclose(self.points, mesh.points)
+            np.testing.assert_array_equal(
+                self.tets + 1, mesh.elements[111].nodes
+            )
+            np.testing.assert_array_equal(
+                self.edges + 1, mesh.elements[11].nodes
+            )
+            triangles = mesh.elements[41]
+            np.testing.assert_array_equal(
+                np.arange(3, 3 + len(self.triangles)), triangles.labels
+            )
+            np.testing.assert_array_equal(self.tets, unv.tetrahedra(mesh))
+            np.testing.assert_array_equal(
+                triangles.labels, mesh.groups["outlet"].elements
+            )
+            np.testing.assert_array_equal(
+                [1, 2, 3], mesh.groups["corner"].nodes
+            )
+            self.assertEqual(0, len(mesh.groups["corner"].elements))
+
+    def test_face_groups(self):
+        mesh = unv.parse(self.stream())
+        groups = unv.face_groups(mesh)
+        self.assertEqual(["outlet"], list(groups))
+        np.testing.assert_array_equal(self.triangles, groups["outlet"])
+        outlet = mesh.groups["outlet"]
+        mesh.groups["outlet"] = outlet._replace(
+            elements=np.concatenate(([1], outlet.elements[::-1]))
+        )
+        np.testing.assert_array_equal(
+            self.triangles[::-1], unv.face_groups(mesh)["outlet"]
+        )
+
+    def test_fortran_exponents_and_labels(self):
+        points = self.points * 0.5
+        tets = np.array(((4, 2, 3, 10),))
+        text = unv_text(points[:4], {111: tets}, exponent="D")
+        text = text.replace(f"{1:10d}{1:10d}{1:10d}{11:10d}", f"{10:10d}" * 4)
+        self.assertIn("D-01", text)
+        mesh = unv.parse(self.stream(text))
+        np.testing.assert_allclose(points[:4], mesh.points)
+        np.testing.assert_array_equal([[3, 1, 2, 0]], unv.tetrahedra(mesh))
+
+    def test_mixed_runs(self):
+        tets = self.tets + 1
+        elements = (
+            (111, tets[:3]),
+            (41, self.triangles[:2] + 1),
+            (11, self.edges + 1),
+            (111, tets[3:]),
+        )
+        text = unv_text(self.points, elements)
+        for chunk_size in (50, 1 << 20):
+            mesh = unv.parse(self.stream(text), chunk_size)
+            np.testing.assert_array_equal(tets, mesh.elements[111].nodes)
+            np.testing.assert_array_equal(
+                [1, 2, 3, 8, 9, 10], mesh.elements[111].labels[:6]
+            )
+            self.assertEqual(2, len(mesh.elements[41].nodes))
+            metadata = unv.parse_metadata(self.stream(text), chunk_size)
+            self.assertEqual(len(tets), metadata.cells)
+
+    def test_free_format(self):
+        text = "".join(
+            " ".join(line.split()) + "\n" for line in self.text.splitlines()
+        )
+        for chunk_size in (64, 1 << 20):
+            metadata = unv.parse_metadata(self.stream(text), chunk_size)
+            self.assertEqual(len(self.tets), metadata.cells)
+            self.assertEqual(len(self.points), metadata.nodes)
+            mesh = unv.parse(self.stream(text), chunk_size)
+            np.testing.assert_array_equal(self.tets, unv.tetrahedra(mesh))
+
+    def test_truncated(self):
+        with self.assertRaises(unv.UnvError):
+            unv.parse(self.stream(self.text[: self.text.index("  2467")]))
+        text = self.text.replace(self.text.splitlines()[-2] + "\n", "")
+        with self.assertRaises(unv.UnvError):
+            unv.parse(self.stream(text))
+
+    def test_load(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = write_unv(
+                os.path.join(tmp, "mesh.unv"), self.points, self.elements
+            )
+            self.assertEqual(len(self.tets), unv.load_metadata(filename).cells)
+            self.assertEqual(len(self.points), len(unv.load(filename).points))
+
+    def test_unv_polymesh(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = write_unv(
+                os.path.join(tmp, "mesh.unv"),
+                self.points,
+                self.elements,
+                self.groups,
+            )
+            case_path = polymesh.polymesh_name(filename)
+            mesh = polymesh.unv_polymesh(filename, case_path, 0.001)
+            self.assertEqual(os.path.join(tmp, "mesh.polyMesh"), case_path)
+            np.testing.assert_allclose(
+                self.points * 0.001, polymesh.read_points(case_path)
+            )
+        self.assertEqual(
+            ("outlet", polymesh.DEFAULT_PATCH),
+            tuple(p.name for p in mesh.patches),
+        )
+        self.assertEqual(len(self.triangles), mesh.patches[0].n_faces)
+
+
+if __name__ == "__main__":
+    unittest.main()
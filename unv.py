@@ -0,0 +1,453 @@
+import re
+from collections import namedtuple
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+CHUNK_SIZE = 1 << 20
+
+NODES = 2411
+ELEMENTS = 2412
+GROUPS = (2467, 2477)
+
+TRIANGLE = 41
+TETRAHEDRON = 111
+BEAM_TYPES = frozenset((11, 21, 22, 23, 24, 31, 32))
+VOLUME_TYPES = frozenset((111, 112, 115, 116, 118))
+
+HEADER_WIDTH = 60
+HEADER_FIELDS = np.r_[10:20, 50:60]
+
+NODE_ENTITY = 7
+ELEMENT_ENTITY = 8
+
+DELIMITER = re.compile(rb"-1[ \t]*\r?(?:\n|$)")
+
+Tokens = Union[List[bytes], np.ndarray]
+
+ElementRun = namedtuple(
+    typename="ElementRun",
+    field_names=("type", "n_nodes", "start", "stride", "count"),
+)
+
+ElementBlock = namedtuple(
+    typename="ElementBlock", field_names=("labels", "nodes")
+)
+
+UnvGroup = namedtuple(
+    typename="UnvGroup", field_names=("name", "nodes", "elements")
+)
+
+UnvMesh = namedtuple(
+    typename="UnvMesh", field_names=("labels", "points", "elements", "groups")
+)
+
+UnvMetadata = namedtuple(
+    typename="UnvMetadata",
+    field_names=(
+        "nodes",
+        "elements",
+        "cells",
+        "groups",
+        "element_types",
+        "group_sizes",
+    ),
+)
+
+
+class UnvError(Exception):
+    pass
+
+
+class ArrayBuffer:
+    data: np.ndarray
+    size: int
+
+    def __init__(self, dtype, width: int = None, capacity: int = 1024):
+        shape = (capacity,) if width is None else (capacity, width)
+        self.data = np.empty(shape, dtype)
+        self.size = 0
+
+    def extend(self, values: np.ndarray):
+        end = self.size + len(values)
+        if end > len(self.data):
+            grown = np.empty(
+                (max(end, 2 * len(self.data)),) + self.data.shape[1:],
+                self.data.dtype,
+            )
+            grown[: self.size] = self.data[: self.size]
+            self.data = grown
+        self.data[self.size : end] = values
+        self.size = end
+
+    def array(self) -> np.ndarray:
+        return self.data[: self.size]
+
+
+def find_delimiter(data: bytes, pos: int) -> Optional[Tuple[int, int]]:
+    for match in DELIMITER.finditer(data, pos):
+        start = data.rfind(b"\n", pos, match.start()) + 1 or pos
+        if not data[start : match.start()].strip():
+            return start, match.end()
+    return None
+
+
+def dataset_pieces(
+    stream: BinaryIO, chunk_size: int = CHUNK_SIZE
+) -> Iterator[Tuple[int, Optional[bytes]]]:
+    dataset = None
+    inside = header = False
+    pending = b""
+    while True:
+        chunk = stream.read(chunk_size)
+        data = pending + chunk
+        if chunk:
+            cut = data.rfind(b"\n") + 1
+            data, pending = data[:cut], data[cut:]
+        pos = 0
+        while pos < len(data):
+            if header:
+                end = data.find(b"\n", pos)
+                end = len(data) if end < 0 else end
+                line, pos = data[pos:end].split(), end + 1
+                if line:
+                    dataset, header, inside = int(line[0]), False, True
+                continue
+            found = find_delimiter(data, pos)
+            start, end = found or (len(data), len(data))
+            if inside and start > pos:
+                yield dataset, data[pos:start]
+            if found is None:
+                break
+            pos = end
+            if inside:
+                yield dataset, None
+                inside = False
+            else:
+                header = True
+        if not chunk:
+            break
+    if inside or header:
+        raise UnvError(f"Unterminated dataset {dataset}")
+
+
+def element_runs(tokens: Tokens) -> Tuple[List[ElementRun], int]:
+    runs = []
+    start = 0
+    while start + 6 <= len(tokens):
+        element_type, n_nodes = int(tokens[start + 1]), int(tokens[start + 5])
+        stride = 6 + 3 * (element_type in BEAM_TYPES) + n_nodes
+        available = (len(tokens) - start) // stride
+        if available == 0:
+            break
+        count, window = 1, 1
+        while count < available:
+            end = min(count + window, available)
+            first, last = start + count * stride, start + end * stride
+            types = np.asarray(tokens[first + 1 : last : stride], np.int64)
+            sizes = np.asarray(tokens[first + 5 : last : stride], np.int64)
+            same = (types == element_type) & (sizes == n_nodes)
+            if not same.all():
+                count += int(np.argmin(same))
+                break
+            count, window = end, window * 2
+        runs.append(ElementRun(element_type, n_nodes, start, stride, count))
+        start += count * stride
+    return runs, start
+
+
+def header_runs(data: bytes) -> Optional[Tuple[List[ElementRun], int]]:
+    buffer = np.frombuffer(data, np.uint8)
+    ends = np.flatnonzero(buffer == ord("\n"))
+    starts = np.concatenate(([0], ends + 1))[: len(ends)]
+    lengths = ends - starts
+    lengths -= (lengths > 0) & (buffer[ends - 1] == ord("\r"))
+    runs = []
+    line = 0
+    while line < len(starts):
+        if lengths[line] != HEADER_WIDTH:
+            return None
+        head = starts[line]
+        element_type = int(data[head + 10 : head + 20])
+        n_nodes = int(data[head + 50 : head + 60])
+        stride = 1 + (element_type in BEAM_TYPES) + -(-n_nodes // 8)
+        available = (len(starts) - line) // stride
+        if available == 0:
+            break
+        fields = buffer[head + HEADER_FIELDS]
+        count, window = 1, 1
+        while count < available:
+            end = min(count + window, available)
+            heads = slice(line + count * stride, line + end * stride, stride)
+            same = lengths[heads] == HEADER_WIDTH
+            same &= (
+                buffer[starts[heads][:, None] + HEADER_FIELDS] == fields
+            ).all(axis=1)
+            if not same.all():
+                count += int(np.argmin(same))
+                break
+            count, window = end, window * 2
+        runs.append(ElementRun(element_type, n_nodes, line, stride, count))
+        line += count * stride
+    if line < len(starts):
+        return runs, starts[line]
+    return runs, ends[-1] + 1 if len(ends) else 0
+
+
+class NodeReader:
+    metadata: bool
+    lines: int
+
+    def __init__(self, metadata: bool = False):
+        self.metadata = metadata
+        self.lines = 0
+        self.pending = []
+        self.labels = ArrayBuffer(np.int64)
+        self.points = ArrayBuffer(np.float64, 3)
+
+    @property
+    def count(self) -> int:
+        return self.lines // 2 if self.metadata else self.labels.size
+
+    def feed(self, data: bytes):
+        if self.metadata:
+            self.lines += data.count(b"\n")
+            return
+        tokens = self.pending + data.replace(b"D", b"E").split()
+        n = len(tokens) // 7
+        values = np.array(tokens[: n * 7], dtype=np.float64).reshape(n, 7)
+        self.labels.extend(values[:, 0].astype(np.int64))
+        self.points.extend(values[:, 4:])
+        self.pending = tokens[n * 7 :]
+
+    def close(self):
+        if self.pending:
+            raise UnvError("Incomplete node record")
+
+
+class ElementReader:
+    metadata: bool
+    types: Dict[int, int]
+
+    def __init__(self, metadata: bool = False):
+        self.metadata = metadata
+        self.types = {}
+        self.blocks = {}
+        self.pending = b"" if metadata else np.empty(0, np.int64)
+
+    @property
+    def count(self) -> int:
+        return sum(self.types.values())
+
+    def feed(self, data: bytes):
+        if self.metadata:
+            return self.feed_metadata(self.pending + data)
+        tokens = np.concatenate(
+            (self.pending, np.array(data.split(), dtype=np.int64))
+        )
+        runs, end = element_runs(tokens)
+        for run in runs:
+            self.add_count(run)
+            self.add(tokens, run)
+        self.pending = tokens[end:]
+
+    def feed_metadata(self, data: bytes):
+        found = header_runs(data)
+        if found is None:
+            tokens = data.split()
+            runs, end = element_runs(tokens)
+            pending = b" ".join(tokens[end:]) + b"\n"
+        else:
+            runs, end = found
+            pending = data[end:]
+        for run in runs:
+            self.add_count(run)
+        self.pending = pending if pending.strip() else b""
+
+    def add_count(self, run: ElementRun):
+        self.types[run.type] = self.types.get(run.type, 0) + run.count
+
+    def add(self, tokens: np.ndarray, run: ElementRun):
+        block = tokens[run.start : run.start + run.count * run.stride]
+        block = block.reshape(run.count, run.stride)
+        if run.type not in self.blocks:
+            self.blocks[run.type] = (
+                ArrayBuffer(np.int64),
+                ArrayBuffer(np.int64, run.n_nodes),
+            )
+        labels, nodes = self.blocks[run.type]
+        if nodes.data.shape[1] != run.n_nodes:
+            raise UnvError(f"Element type {run.type} changes node count")
+        labels.extend(block[:, 0])
+        nodes.extend(block[:, -run.n_nodes :])
+
+    def close(self):
+        if len(self.pending):
+            raise UnvError("Incomplete element record")
+
+    def elements(self) -> Dict[int, ElementBlock]:
+        return {
+            element_type: ElementBlock(labels.array(), nodes.array())
+            for element_type, (labels, nodes) in self.blocks.items()
+        }
+
+
+class GroupReader:
+    metadata: bool
+    sizes: Dict[str, int]
+    groups: Dict[str, UnvGroup]
+
+    def __init__(self, metadata: bool = False):
+        self.metadata = metadata
+        self.sizes = {}
+        self.groups = {}
+        self.pending = []
+
+    @property
+    def count(self) -> int:
+        return len(self.sizes)
+
+    def feed(self, data: bytes):
+        lines = self.pending + data.splitlines()
+        start = 0
+        while start + 2 <= len(lines):
+            header = lines[start].split()
+            if not header:
+                start += 1
+                continue
+            count = int(header[-1])
+            end = start + 2 + -(-count // 2)
+            if end > len(lines):
+                break
+            name = lines[start + 1].strip().decode(errors="replace")
+            self.sizes[name] = count
+            if not self.metadata:
+                self.add(name, lines[start + 2 : end])
+            start = end
+        self.pending = lines[start:]
+
+    def add(self, name: str, lines: List[bytes]):
+        entities = np.array(b" ".join(lines).split(), dtype=np.int64)
+        entities = entities.reshape(-1, 4)
+        self.groups[name] = UnvGroup(
+            name=name,
+            nodes=entities[entities[:, 0] == NODE_ENTITY, 1],
+            elements=entities[entities[:, 0] == ELEMENT_ENTITY, 1],
+        )
+
+    def close(self):
+        if any(line.strip() for line in self.pending):
+            raise UnvError("Incomplete group record")
+        self.pending = []
+
+
+def dataset_reader(dataset: int):
+    if dataset == NODES:
+        return NodeReader
+    if dataset == ELEMENTS:
+        return ElementReader
+    if dataset in GROUPS:
+        return GroupReader
+    return None
+
+
+def read_datasets(
+    stream: BinaryIO, metadata: bool, chunk_size: int = CHUNK_SIZE
+) -> Dict[type, object]:
+    readers = {}
+    for dataset, data in dataset_pieces(stream, chunk_size):
+        reader_class = dataset_reader(dataset)
+        if reader_class is None:
+            continue
+        if reader_class not in readers:
+            readers[reader_class] = reader_class(metadata)
+        if data is None:
+            readers[reader_class].close()
+        else:
+            readers[reader_class].feed(data)
+    return readers
+
+
+def parse_metadata(
+    stream: BinaryIO, chunk_size: int = CHUNK_SIZE
+) -> UnvMetadata:
+    readers = read_datasets(stream, True, chunk_size)
+    nodes = readers.get(NodeReader, NodeReader(True))
+    elements = readers.get(ElementReader, ElementReader(True))
+    groups = readers.get(GroupReader, GroupReader(True))
+    return UnvMetadata(
+        nodes=nodes.count,
+        elements=elements.count,
+        cells=sum(
+            count
+            for element_type, count in elements.types.items()
+            if element_type in VOLUME_TYPES
+        ),
+        groups=groups.count,
+        element_types=dict(sorted(elements.types.items())),
+        group_sizes=groups.sizes,
+    )
+
+
+def parse(stream: BinaryIO, chunk_size: int = CHUNK_SIZE) -> UnvMesh:
+    readers = read_datasets(stream, False, chunk_size)
+    nodes = readers.get(NodeReader, NodeReader())
+    return UnvMesh(
+        labels=nodes.labels.array(),
+        points=nodes.points.array(),
+        elements=readers.get(ElementReader, ElementReader()).elements(),
+        groups=readers.get(GroupReader, GroupReader()).groups,
+    )
+
+
+def load_metadata(filename: str, chunk_size: int = CHUNK_SIZE) -> UnvMetadata:
+    with open(filename, "rb") as f:
+        return parse_metadata(f, chunk_size)
+
+
+def load(filename: str, chunk_size: int = CHUNK_SIZE) -> UnvMesh:
+    with open(filename, "rb") as f:
+        return parse(f, chunk_size)
+
+
+def node_indices(mesh: UnvMesh, labels: np.ndarray) -> np.ndarray:
+    labels = np.asarray(labels, dtype=np.int64)
+    n = len(mesh.labels)
+    if n and mesh.labels[0] == 1 and mesh.labels[-1] == n:
+        if np.array_equal(mesh.labels, np.arange(1, n + 1)):
+            indices = labels - 1
+            if indices.size and (indices.min() < 0 or indices.max() >= n):
+                raise UnvError("Element references a missing node")
+            return indices
+    order = np.argsort(mesh.labels, kind="stable")
+    positions = np.searchsorted(mesh.labels, labels, sorter=order)
+    indices = order[np.minimum(positions, max(n - 1, 0))] if n else positions
+    if not np.array_equal(mesh.labels[indices], labels):
+        raise UnvError("Element references a missing node")
+    return indices
+
+
+def tetrahedra(mesh: UnvMesh) -> np.ndarray:
+    block = mesh.elements.get(TETRAHEDRON)
+    if block is None:
+        return np.empty((0, 4), dtype=np.int64)
+    return node_indices(mesh, block.nodes)
+
+
+def face_groups(mesh: UnvMesh) -> Dict[str, np.ndarray]:
+    block = mesh.elements.get(TRIANGLE)
+    if block is None or len(block.labels) == 0:
+        return {}
+    order = np.argsort(block.labels, kind="stable")
+
+    def group_faces(labels: np.ndarray) -> np.ndarray:
+        positions = np.searchsorted(block.labels, labels, sorter=order)
+        rows = order[np.minimum(positions, len(order) - 1)]
+        rows = rows[block.labels[rows] == labels]
+        return node_indices(mesh, block.nodes[rows])
+
+    groups = {
+        name: group_faces(group.elements)
+        for name, group in mesh.groups.items()
+    }
+    return {name: faces for name, faces in groups.items() if len(faces)}